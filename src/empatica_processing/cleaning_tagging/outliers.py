@@ -1,6 +1,402 @@
+import numpy as np
 import pandas as pd
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import shutil
+import threading
+from empatica_processing.data_io.empatica_csv import EmpaticaRecording, sample_dtype, read_empatica_csv, iter_empatica_csv, write_empatica_csv, write_empatica_rows
+from empatica_processing.data_io.dataset_index import DatasetIndex
+from empatica_processing.data_io.binary_cache import cache_paths, read_recording, save_binary_cache, load_binary_cache, open_binary_cache, write_cache_header, tag_segments
+from empatica_processing.data_io.metrics import measure, file_size
+
+
+def sample_array(data):
+    """
+    Return a data block as a NumPy array that float32 blocks keep their dtype in (anything else becomes float64),
+    so low-precision recordings are never copied to float64 as a whole.
+    """
+    data = np.asarray(data)
+    return data if data.dtype == np.float32 else np.asarray(data, dtype=np.float64)
+
+
+def column_moments(data, block_rows=1 << 16):
+    """
+    Compute the column means and standard deviations (ddof=1) of a float32 block with float64 accumulators,
+    block by block so no float64 copy of the whole block is made.
+
+    Args:
+        data (np.ndarray): The float32 data block.
+        block_rows (int): The number of rows converted to float64 at once.
+
+    Returns:
+        tuple: The column means and standard deviations.
+    """
+    means = data.mean(axis=0, dtype=np.float64)
+    squared_deviations = np.zeros(data.shape[1])
+    for start in range(0, len(data), block_rows):
+        squared_deviations += np.square(data[start:start + block_rows] - means).sum(axis=0)
+    return means, np.sqrt(squared_deviations / (len(data) - 1))
+
+
+class ColumnStatistics:
+    """
+    The column means, standard deviations and outlier bounds of a recording, computed once per file
+    and shared by the outlier percentage, the SD file and the winsorization.
+    """
+
+    def __init__(self, data, threshold):
+        """
+        Compute the statistics of every column in one pass over the data.
+
+        Args:
+            data (np.ndarray or pd.DataFrame): The 2-D data block (header rows excluded).
+            threshold (float): The threshold for outlier detection based on standard deviations.
+        """
+        data = sample_array(data)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if data.dtype == np.float32:
+                self.set_moments(len(data), *column_moments(data), threshold)
+            else:
+                self.set_moments(len(data), data.mean(axis=0), data.std(axis=0, ddof=1), threshold)
+
+    @classmethod
+    def from_moments(cls, n_rows, means, std_devs, threshold):
+        """
+        Create the statistics from column means and standard deviations computed elsewhere (e.g. chunk by chunk).
+
+        Args:
+            n_rows (int): The number of rows of the recording.
+            means (np.ndarray): The column means.
+            std_devs (np.ndarray): The column standard deviations (ddof=1).
+            threshold (float): The threshold for outlier detection based on standard deviations.
+
+        Returns:
+            ColumnStatistics: The statistics.
+        """
+        stats = cls.__new__(cls)
+        stats.set_moments(n_rows, means, std_devs, threshold)
+        return stats
+
+    def set_moments(self, n_rows, means, std_devs, threshold):
+        self.threshold = threshold
+        self.n_rows = n_rows
+        self.means = means
+        self.std_devs = std_devs
+
+        # The SD file and the winsorization use the statistics rounded to 3 decimals
+        self.rounded_means = self.means.round(3)
+        rounded_std_devs = self.std_devs.round(3)
+        self.upper_bounds = (self.rounded_means + threshold * rounded_std_devs).round(3)
+        self.lower_bounds = (self.rounded_means - threshold * rounded_std_devs).round(3)
+
+    def outlier_percentage(self, data):
+        """
+        Calculate the mean percentage of values outside the (unrounded) bounds across all columns.
+
+        Args:
+            data (np.ndarray or pd.DataFrame): The data block the statistics were computed from.
+
+        Returns:
+            float: The mean percentage of outliers across all columns.
+        """
+        return self.percentage(self.outlier_counts(data))
+
+    def outlier_counts(self, data):
+        """
+        Count the values outside the (unrounded) bounds in every column of a data block.
+        """
+        data = sample_array(data)
+        upper_bounds = self.means + self.threshold * self.std_devs
+        lower_bounds = self.means - self.threshold * self.std_devs
+        return ((data > upper_bounds) | (data < lower_bounds)).sum(axis=0)
+
+    def percentage(self, outlier_counts):
+        """
+        Turn the outlier counts of the whole recording into the mean percentage of outliers across all columns.
+        """
+        return ((outlier_counts / self.n_rows) * 100).mean()
+
+    def sd_frame(self):
+        """
+        Return the rounded mean and bounds of every column, as saved in the SD file.
+        """
+        return pd.DataFrame({
+            'mean': self.rounded_means,
+            f'-{self.threshold}SD': self.lower_bounds,
+            f'+{self.threshold}SD': self.upper_bounds
+        })
+
+    def winsorize(self, data):
+        """
+        Clip every column of a 2-D block to its rounded bounds (columns without bounds are left as they are).
+
+        Args:
+            data (np.ndarray): The data block.
+
+        Returns:
+            np.ndarray: The winsorized data.
+        """
+        data = sample_array(data)
+        return np.clip(data, np.nan_to_num(self.lower_bounds, nan=-np.inf), np.nan_to_num(self.upper_bounds, nan=np.inf), out=np.empty_like(data))
+
+
+class RunningColumnStatistics:
+    """
+    Accumulates the count, mean and sum of squared deviations of every column chunk by chunk
+    (Welford's algorithm in the pairwise form of Chan et al.) in float64, ignoring missing values.
+    """
+
+    def __init__(self, n_columns):
+        """
+        Args:
+            n_columns (int): The number of columns of the recording.
+        """
+        self.n_rows = 0
+        self.counts = np.zeros(n_columns, dtype=np.int64)
+        self.means = np.zeros(n_columns)
+        self.squared_deviations = np.zeros(n_columns)
+
+    def update(self, block):
+        """
+        Merge the statistics of a 2-D data block into the running statistics.
+
+        Args:
+            block (np.ndarray): The data block (header rows excluded).
+        """
+        self.n_rows += len(block)
+        missing = np.isnan(block)
+        if missing.any():
+            block = np.where(missing, 0.0, block)
+        counts = len(block) - missing.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = block.sum(axis=0, dtype=np.float64) / counts
+            for column in np.flatnonzero(missing.any(axis=0)): # Sum each column on its own like np.nanmean
+                means[column] = block[:, column].sum(dtype=np.float64) / counts[column]
+            squared_deviations = (np.where(missing, 0.0, block - means) ** 2).sum(axis=0)
+
+            totals = self.counts + counts
+            delta = means - self.means
+            merged = counts > 0  # Columns without any value in this block keep their statistics
+            self.means = np.where(merged, self.means + delta * (counts / totals), self.means)
+            self.squared_deviations = np.where(merged, self.squared_deviations + squared_deviations
+                                               + delta ** 2 * (self.counts * counts / totals), self.squared_deviations)
+        self.counts = totals
+
+    @property
+    def missing(self):
+        """The number of missing values of every column."""
+        return self.n_rows - self.counts
+
+    def column_means(self):
+        """Return the mean of every column (NaN for columns without any values)."""
+        return np.where(self.counts > 0, self.means, np.nan)
+
+    def statistics(self, threshold):
+        """
+        Return the statistics of the recording once its missing values are filled with the column means
+        (which leaves the means and the squared deviations unchanged).
+
+        Args:
+            threshold (float): The threshold for outlier detection based on standard deviations.
+
+        Returns:
+            ColumnStatistics: The statistics.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = self.column_means()
+            std_devs = np.sqrt(np.where(self.counts > 0, self.squared_deviations, np.nan) / (self.n_rows - 1))
+        return ColumnStatistics.from_moments(self.n_rows, means, std_devs, threshold)
+
+
+class RollingColumnStatistics:
+    """
+    The mean and standard deviation of every column over a window centered on each sample (shrinking at the edges),
+    computed for the whole 2-D block in O(n) from cumulative sums, and the local outlier bounds they give.
+    """
+
+    def __init__(self, data, window, threshold):
+        """
+        Args:
+            data (np.ndarray): The 2-D data block without missing values (header rows excluded).
+            window (int): The window length in samples (at least 2).
+            threshold (float): The threshold for outlier detection based on standard deviations.
+        """
+        data = sample_array(data)
+        self.window = window
+        self.threshold = threshold
+        self.n_rows = len(data)
+
+        # Cumulative sums of the deviations from the global means, which keeps the variances accurate on long recordings
+        self.offsets = data.mean(axis=0, dtype=np.float64) if len(data) else np.zeros(data.shape[1])
+        deviations = data - self.offsets
+        self.sums = np.zeros((self.n_rows + 1, data.shape[1]))
+        self.squares = np.zeros((self.n_rows + 1, data.shape[1]))
+        np.cumsum(deviations, axis=0, out=self.sums[1:])
+        np.cumsum(np.square(deviations, out=deviations), axis=0, out=self.squares[1:])
+
+        samples = np.arange(self.n_rows)
+        counts = np.minimum(samples - window // 2 + window, self.n_rows) - np.maximum(samples - window // 2, 0)
+        self.means, self.std_devs = self.moments(self.centered_totals(self.sums), self.centered_totals(self.squares), counts)
+
+        # The local outlier bounds, used both for counting and for clipping
+        spreads = threshold * self.std_devs
+        self.upper_bounds = self.means + spreads
+        self.lower_bounds = self.means - spreads
+
+    def centered_totals(self, cumulative):
+        """
+        Return the totals of a cumulative sum over the window centered on every sample, using slices only.
+        """
+        n_rows, half = self.n_rows, self.window // 2
+        totals = np.empty((n_rows, cumulative.shape[1]))
+        inside = max(0, min(n_rows, n_rows - self.window + half + 1))  # The windows that end inside the recording
+        totals[:inside] = cumulative[self.window - half:self.window - half + inside]
+        totals[inside:] = cumulative[n_rows]
+        if half < n_rows: # The windows of the first samples start at the first sample (cumulative[0] is 0)
+            totals[half:] -= cumulative[:n_rows - half]
+        return totals
+
+    def window_totals(self, cumulative, starts, ends):
+        """Return the totals of a cumulative sum over the samples starts[i]:ends[i]."""
+        return cumulative[ends] - cumulative[starts]
+
+    def moments(self, sums, variances, counts):
+        """
+        Turn the window totals of the deviations and squared deviations into the column means and
+        standard deviations (ddof=1) of every window (the squared totals are overwritten).
+        """
+        counts = np.asarray(counts, dtype=np.float64)[:, np.newaxis]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+            variances -= sums * means
+            variances /= counts - 1
+        np.maximum(variances, 0, out=variances)  # Rounding can make a constant window slightly negative
+        means += self.offsets
+        return means, np.sqrt(variances, out=variances)
+
+    def outlier_counts(self, data):
+        """
+        Count the values outside their local bounds in every column.
+        """
+        data = sample_array(data)
+        return ((data > self.upper_bounds) | (data < self.lower_bounds)).sum(axis=0)
+
+    def outlier_percentage(self, data):
+        """
+        Calculate the mean percentage of values outside their local bounds across all columns.
+        """
+        return ((self.outlier_counts(data) / self.n_rows) * 100).mean()
+
+    def winsorize(self, data):
+        """
+        Clip every value to its local bounds (values without bounds are left as they are).
+        """
+        data = sample_array(data)
+        return np.clip(data, np.nan_to_num(self.lower_bounds, nan=-np.inf), np.nan_to_num(self.upper_bounds, nan=np.inf), out=np.empty_like(data))
+
+    def window_frame(self, sample_rate):
+        """
+        Summarize consecutive, non-overlapping windows like the SD file: one row per window and column.
+
+        Args:
+            sample_rate (float): The sample rate of the recording.
+
+        Returns:
+            pd.DataFrame: The start (in seconds from the start of the recording), column, rounded mean and bounds of every window.
+        """
+        starts = np.arange(0, self.n_rows, self.window)
+        ends = np.minimum(starts + self.window, self.n_rows)
+        means, std_devs = self.moments(self.window_totals(self.sums, starts, ends), self.window_totals(self.squares, starts, ends), ends - starts)
+        means, std_devs = means.round(3), std_devs.round(3)
+        n_columns = self.sums.shape[1]
+        return pd.DataFrame({
+            'window_start': np.repeat(starts / sample_rate, n_columns),
+            'column': np.tile(np.arange(n_columns), len(starts)),
+            'mean': means.ravel(),
+            f'-{self.threshold}SD': (means - self.threshold * std_devs).round(3).ravel(),
+            f'+{self.threshold}SD': (means + self.threshold * std_devs).round(3).ravel()
+        })
+
+
+class PhaseStatistics:
+    """
+    The column means, standard deviations and outlier bounds of every tag phase of a recording. The phases are
+    contiguous, so their sums are taken over the segment boundaries with np.add.reduceat in one pass.
+    """
+
+    def __init__(self, data, tags, threshold):
+        """
+        Args:
+            data (np.ndarray): The 2-D data block without missing values (header rows excluded).
+            tags (pd.Categorical): The phase of every sample, as returned by tag_labels.
+            threshold (float): The threshold for outlier detection based on standard deviations.
+        """
+        data = sample_array(data)
+        codes = np.asarray(tags.codes)
+        self.threshold = threshold
+        self.starts = np.concatenate([[0], np.flatnonzero(np.diff(codes)) + 1]) if len(codes) else np.array([], dtype=np.int64)
+        self.ends = np.append(self.starts[1:], len(codes)).astype(np.int64)
+        self.phases = [tags.categories[code] for code in codes[self.starts]]
+
+        # Segment sums of the deviations from the global means (and of their squares) give the phase moments
+        offsets = data.mean(axis=0, dtype=np.float64) if len(data) else np.zeros(data.shape[1])
+        deviations = data - offsets
+        counts = (self.ends - self.starts)[:, np.newaxis].astype(np.float64)
+        if len(self.starts):
+            sums = np.add.reduceat(deviations, self.starts, axis=0)
+            squares = np.add.reduceat(deviations * deviations, self.starts, axis=0)
+        else:
+            sums = squares = np.zeros((0, data.shape[1]))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.means = sums / counts + offsets
+            self.std_devs = np.sqrt(np.maximum((squares - sums * sums / counts) / (counts - 1), 0))
+
+        # The SD file and the winsorization use the statistics rounded to 3 decimals, like the global ones
+        self.rounded_means = self.means.round(3)
+        rounded_std_devs = self.std_devs.round(3)
+        self.upper_bounds = (self.rounded_means + threshold * rounded_std_devs).round(3)
+        self.lower_bounds = (self.rounded_means - threshold * rounded_std_devs).round(3)
+
+    def segments(self):
+        """Yield the index, start and end of every phase segment."""
+        for segment, (start, end) in enumerate(zip(self.starts, self.ends)):
+            yield segment, start, end
+
+    def outlier_percentage(self, data):
+        """
+        Calculate the mean percentage of values outside the (unrounded) bounds of their phase across all columns.
+        """
+        data = sample_array(data)
+        outliers = np.zeros(data.shape[1], dtype=np.int64)
+        for segment, start, end in self.segments():
+            upper_bounds = self.means[segment] + self.threshold * self.std_devs[segment]
+            lower_bounds = self.means[segment] - self.threshold * self.std_devs[segment]
+            outliers += ((data[start:end] > upper_bounds) | (data[start:end] < lower_bounds)).sum(axis=0)
+        return ((outliers / len(data)) * 100).mean()
+
+    def winsorize(self, data):
+        """
+        Clip every segment to the rounded bounds of its phase (columns without bounds are left as they are).
+        """
+        winsorized = np.array(sample_array(data))
+        for segment, start, end in self.segments():
+            np.clip(winsorized[start:end], np.nan_to_num(self.lower_bounds[segment], nan=-np.inf),
+                    np.nan_to_num(self.upper_bounds[segment], nan=np.inf), out=winsorized[start:end])
+        return winsorized
+
+    def sd_frame(self):
+        """
+        Return the rounded mean and bounds of every phase and column. The first three columns keep the layout of
+        the global SD file, so readers of its first row get the bounds of the first phase.
+        """
+        n_columns = self.means.shape[1]
+        return pd.DataFrame({
+            'mean': self.rounded_means.ravel(),
+            f'-{self.threshold}SD': self.lower_bounds.ravel(),
+            f'+{self.threshold}SD': self.upper_bounds.ravel(),
+            'phase': np.repeat(self.phases, n_columns),
+            'column': np.tile(np.arange(n_columns), len(self.phases))
+        })
 
 
 class OutliersDataProcessor:
@@ -9,65 +405,101 @@ class OutliersDataProcessor:
     winsorizing data, and tagging records based on provided sample rate.
     """
 
-    def __init__(self, base_folder, threshold=2.5):
+    def __init__(self, base_folder, threshold=2.5, manifest=None, binary_cache=False, index=None, metrics=None,
+                 streaming=False, chunksize=100_000, window_seconds=None, per_phase=False, threads=1, cache=None,
+                 statistics=None, sd_files=True, precision='float64'):
         """
         Initialize the data processor with base folder and threshold for outlier detection.
 
         Args:
             base_folder (str or Path): The base directory containing recordings.
             threshold (float): The threshold for outlier detection based on standard deviations.
+            manifest (PipelineManifest, optional): Skip participants whose recordings and parameters
+                did not change since the last run.
+            binary_cache (bool): Read the recordings from their .npy sidecars when available and
+                save every cleaned recording with a sidecar as well.
+            index (DatasetIndex, optional): The dataset index shared with the other stages
+                (a new index of the base folder, scanned on demand, if not given).
+            metrics (PipelineMetrics, optional): Report the time, rows, bytes and process peak memory so far
+                of every participant and file to it.
+            streaming (bool): Process every recording in two passes over chunks instead of loading it whole.
+            chunksize (int): The number of rows read and written at once in streaming mode.
+            window_seconds (float, optional): Detect and clip the outliers against the mean and SD of a moving window
+                of this many seconds instead of the whole recording, and save the window summaries as sdw_<file>.
+                Windowed recordings are always processed in memory.
+            per_phase (bool): Compute the statistics and bounds of every tag phase (Baseline, CognitiveTask1, ...)
+                separately, clip every phase against its own bounds and save one SD row per phase and column.
+                Recordings are then always processed in memory.
+            threads (int or None): The number of signal files of a participant processed at the same time
+                on a thread pool (None lets the pool decide). The per-file CPU times in the metrics then
+                include the other threads.
+            cache (RecordingCache, optional): Read the recordings from this in-memory cache when they are in it,
+                keep the cleaned recordings and SD tables in it for the plots and save them in the background.
+                Recordings are then always processed in memory.
+            statistics (StatisticsStore, optional): Store the SD table and outlier percentage of every file in it.
+            sd_files (bool): Also export the SD table of every file as sd_<file>.
+            precision (str): 'float32' reads, winsorizes and saves the samples as float32, which halves the memory
+                of the recordings; the statistics are still accumulated in float64 (the windowed and per-phase
+                modes keep float64 working arrays). The cleaned values can differ from the float64 ones in about
+                the 7th significant digit, and a value right at a bound can change sides.
+
+        Raises:
+            ValueError: If both window_seconds and per_phase are given, or the precision is unknown.
         """
+        if window_seconds is not None and per_phase:
+            raise ValueError("Windowed and per-phase outlier detection cannot be combined.")
         self.base_folder = Path(base_folder)
         self.threshold = threshold
+        self.manifest = manifest
+        self.binary_cache = binary_cache
+        self.index = index if index is not None else DatasetIndex(self.base_folder)
+        self.metrics = metrics
+        self.streaming = streaming
+        self.chunksize = chunksize
+        self.window_seconds = window_seconds
+        self.per_phase = per_phase
+        self.threads = threads
+        self.cache = cache
+        self.statistics = statistics
+        self.sd_files = sd_files
+        self.precision = precision
+        self.dtype = sample_dtype(precision)
         self.recordings_path = self.base_folder / "individual recordings"
         self.clean_recordings_path = self.base_folder / "clean_individual_recordings"
         self.clean_recordings_path.mkdir(exist_ok=True)
         self.keywords = ['ACC', 'BVP', 'EDA', 'HR', 'TEMP']
         self.additional_files = ['info.txt', 'tags.csv']
         self.outlier_info = []
+        self.outlier_info_lock = threading.Lock()
         print("Please wait a moment while the outliers are winsorized and the time tags are added in a new column. This may take up to a few minutes...")
 
-    def filter_out_csv(self, df):
+    def filter_out_csv(self, df, stats=None):
         """
         Calculate the percentage of outliers in the DataFrame.
 
         Args:
-            df (pd.DataFrame): The DataFrame to analyze.
+            df (pd.DataFrame or np.ndarray): The data to analyze.
+            stats (ColumnStatistics, optional): The statistics of the data, if already computed.
 
         Returns:
             float: The mean percentage of outliers across all columns.
         """
-        means = df.mean()
-        std_devs = df.std()
-        upper_bounds = means + self.threshold * std_devs
-        lower_bounds = means - self.threshold * std_devs
-        outliers = ((df > upper_bounds) | (df < lower_bounds)).sum()
-        total_data_points = len(df)
-        percentage_outliers = (outliers / total_data_points) * 100
-        return percentage_outliers.mean()
+        stats = stats if stats is not None else ColumnStatistics(df, self.threshold)
+        return stats.outlier_percentage(df)
 
-    def save_sd_file(self, df, sd_file_path):
+    def save_sd_file(self, df, sd_file_path, stats=None):
         """
         Save the standard deviation (SD) information to a CSV file.
 
         Args:
-            df (pd.DataFrame): The DataFrame for which to calculate SD.
+            df (pd.DataFrame or np.ndarray): The data for which to calculate SD (None if stats are given).
             sd_file_path (Path): The file path to save the SD information.
+            stats (ColumnStatistics or PhaseStatistics, optional): The statistics of the data, if already computed.
         """
-        means = df.mean().round(3)
-        std_devs = df.std().round(3)
-        upper_bounds = (means + self.threshold * std_devs).round(3)
-        lower_bounds = (means - self.threshold * std_devs).round(3)
-
-        sd_df = pd.DataFrame({
-            'mean': means,
-            f'-{self.threshold}SD': lower_bounds,
-            f'+{self.threshold}SD': upper_bounds
-        })
+        stats = stats if stats is not None else ColumnStatistics(df, self.threshold)
 
         # Save the SD information to a CSV file
-        sd_df.reset_index(drop=True, inplace=True)
-        sd_df.to_csv(sd_file_path, index=False, header=True)
+        stats.sd_frame().to_csv(sd_file_path, index=False, header=True)
         #print(f"SD file saved as {sd_file_path}")
 
     def winsorize_data(self, df, lower_bounds, upper_bounds):
@@ -83,7 +515,32 @@ class OutliersDataProcessor:
             pd.DataFrame: The winsorized DataFrame.
         """
         # Clip the data to stay within the specified bounds (winsorization)
-        return df.apply(lambda x: x.clip(lower=lower_bounds[x.name], upper=upper_bounds[x.name]))
+        return df.clip(lower=lower_bounds, upper=upper_bounds, axis=1)
+
+    def tag_labels(self, n_samples, tags, sample_rate, first_sample=0):
+        """
+        Label every sample with the protocol phase it belongs to, for any number of tags.
+
+        Args:
+            n_samples (int): The number of samples to label.
+            tags (list): The start timestamp of the recording followed by the timestamps of tags.csv
+                (None entries are ignored).
+            sample_rate (float): The sample rate of the recordings.
+            first_sample (int): The index of the first sample to label in the recording (for chunks).
+
+        Returns:
+            pd.Categorical: 'Baseline' up to the first tag, 'CognitiveTask<i>' from tag i to tag i+1,
+                and the last phase after the last tag.
+        """
+        tags = np.array([tag for tag in tags if tag is not None and not pd.isna(tag)], dtype=np.float64)
+
+        # The phase boundaries in samples add up the rounded lengths of the phases (a tag earlier than the previous one ends an empty phase)
+        lengths = np.round(np.diff(tags) * sample_rate).astype(np.int64)
+        boundaries = np.maximum.accumulate(np.cumsum(lengths)) if len(lengths) else lengths
+        categories = ['Baseline'] + [f'CognitiveTask{task}' for task in range(1, len(boundaries))]
+
+        codes = np.searchsorted(boundaries, np.arange(first_sample, first_sample + n_samples), side='right')
+        return pd.Categorical.from_codes(np.minimum(codes, len(categories) - 1), categories=categories)
 
     def add_tags_column(self, df, tags, sample_rate):
         """
@@ -91,33 +548,48 @@ class OutliersDataProcessor:
 
         Args:
             df (pd.DataFrame): The DataFrame to tag.
-            tags (list): A list of timestamps for tagging.
+            tags (list): The start timestamp of the recording followed by the tag timestamps.
             sample_rate (float): The sample rate of the recordings.
 
         Returns:
-            pd.DataFrame: The DataFrame with an added 'tags' column.
+            pd.DataFrame: The DataFrame with an added categorical 'tags' column.
         """
-        tag0, tag1, tag2, tag3 = tags
-        baseline = int(round((tag1 - tag0) * sample_rate))
-        cognitive_task1 = int(round((tag2 - tag1) * sample_rate)) if tag2 is not None else None
-        cognitive_task2 = int(round((tag3 - tag2) * sample_rate)) if tag3 is not None else None
-
-        df['tags'] = ''
-
-        df.loc[0:baseline - 1, 'tags'] = 'Baseline'
+        df['tags'] = self.tag_labels(len(df), tags, sample_rate)
+        return df
+    def load_tags(self, participant_folder):
+        """
+        Load the tag timestamps of a participant.
 
-        if cognitive_task1 is not None:
-            df.loc[baseline:baseline + cognitive_task1 - 1, 'tags'] = 'CognitiveTask1'
+        Args:
+            participant_folder (Path): The folder containing the participant's data.
 
-        if cognitive_task2 is not None:
-            df.loc[baseline + cognitive_task1:baseline + cognitive_task1 + cognitive_task2 - 1, 'tags'] = 'CognitiveTask2'
+        Returns:
+            list: The timestamps in tags.csv.
+        """
+        return pd.read_csv(participant_folder / 'tags.csv', header=None)[0].tolist()
 
-        last_task = 'CognitiveTask2' if cognitive_task2 is not None else (
-            'CognitiveTask1' if cognitive_task1 is not None else 'Baseline')
-        df.loc[df['tags'] == '', 'tags'] = last_task
+    def add_outlier_info(self, participant_folder, file_name, outlier_percentage, stats=None):
+        """
+        Record the outlier percentage of a file, and its statistics in the statistics store if there is one
+        (safe to call from several threads).
 
-        return df
-    def process_file(self, file_path, participant_folder, clean_participant_folder):
+        Args:
+            participant_folder (Path): The folder containing the participant's data.
+            file_name (str): The name of the recording file.
+            outlier_percentage (float): The percentage of outliers in the file.
+            stats (ColumnStatistics or PhaseStatistics, optional): The statistics of the file.
+        """
+        with self.outlier_info_lock:
+            self.outlier_info.append({
+                "Participant": participant_folder.name,
+                "File": file_name,
+                "Outlier Percentage": f"{outlier_percentage:.1f}"
+            })
+        if self.statistics is not None and stats is not None:
+            signal = next(keyword for keyword in self.keywords if keyword in file_name)
+            self.statistics.add_file(participant_folder.name, file_name, signal, stats.sd_frame(), outlier_percentage, self.threshold)
+
+    def process_file(self, file_path, participant_folder, clean_participant_folder, record=None, tags=None):
         """
         Process a single recording file, including outlier detection, winsorization, 
         and tagging. The processed file is saved in the cleaned recordings folder.
@@ -126,63 +598,170 @@ class OutliersDataProcessor:
             file_path (Path): The path to the file to process.
             participant_folder (Path): The folder containing the participant's data.
             clean_participant_folder (Path): The folder to save the cleaned data.
+            record (dict, optional): The metrics record of the file, which gets its rows and bytes.
+            tags (list, optional): The timestamps in the participant's tags.csv (read from it if not given).
         """
+        tags = tags if tags is not None else self.load_tags(participant_folder)
+        if self.streaming and self.window_seconds is None and not self.per_phase and self.cache is None:
+            self.stream_file(file_path, participant_folder, clean_participant_folder, record, tags)
+            return
+
         file_name = file_path.name
         #print(f"Processing...")
         #print(f"Processing file: {file_name} for participant: {participant_folder.name}")
-        df = pd.read_csv(file_path, header=None)
-        first_row = df.iloc[:1]
-        second_row = df.iloc[1:2]
-        data_rows = df.iloc[2:].reset_index(drop=True)
-
-        tags_file = participant_folder / 'tags.csv'
-        tags_df = pd.read_csv(tags_file, header=None)
-
-        tag0 = df.iloc[0, 0]
-        sample_rate = df.iloc[1, 0]
-        tag1 = tags_df.iloc[0, 0] if len(tags_df) > 0 else None
-        tag2 = tags_df.iloc[1, 0] if len(tags_df) > 1 else None
-        tag3 = tags_df.iloc[2, 0] if len(tags_df) > 2 else None
-
-        # Add the tags column to the data rows
-        data_rows = self.add_tags_column(data_rows, [tag0, tag1, tag2, tag3], sample_rate)
-
-        tags_column = data_rows.pop('tags')
-
-        for column in data_rows.columns:
-            if data_rows[column].isnull().any():
-                if pd.api.types.is_numeric_dtype(data_rows[column]):
-                    mean_value = data_rows[column].mean()
-                    data_rows[column].fillna(mean_value, inplace=True)
-                    print(f"Filled missing values in {column} with mean: {mean_value:.3f}")
-                else:
-                    print(f"Non-numeric data type found in column: {column} in file {file_name}")
+        recording = self.load_recording(file_path)
+
+        # Label the samples with the protocol phases marked in tags.csv
+        tags_column = self.tag_labels(recording.n_samples, [recording.start_time] + tags, recording.sample_rate)
+
+        data = recording.data
+        missing = np.isnan(data)
+        if missing.any(): # Fill the missing values of each column with its mean
+            running_stats = RunningColumnStatistics(recording.n_columns)
+            running_stats.update(data) # One pass over the whole recording, whatever the chunk size
+            data = np.where(missing, running_stats.column_means().astype(data.dtype), data)
+            for column in np.flatnonzero(running_stats.missing):
+                print(f"Filled missing values in {column} with mean: {running_stats.column_means()[column]:.3f}")
+
+        # Compute the column statistics once for the outlier percentage, the SD file and the winsorization
+        stats = PhaseStatistics(data, tags_column, self.threshold) if self.per_phase else ColumnStatistics(data, self.threshold)
+
+        # In windowed mode the outliers are found and clipped against the local statistics instead
+        window = max(2, round(self.window_seconds * recording.sample_rate)) if self.window_seconds is not None else None
+        bounds = RollingColumnStatistics(data, window, self.threshold) if window is not None else stats
 
         # Calculate the percentage of outliers in the data
-        outlier_percentage = self.filter_out_csv(data_rows)
-        self.outlier_info.append({
-            "Participant": participant_folder.name,
-            "File": file_name,
-            "Outlier Percentage": f"{outlier_percentage:.1f}"
-        })
+        self.add_outlier_info(participant_folder, file_name, bounds.outlier_percentage(data), stats)
 
-        # Save standard deviation information
+        # Save standard deviation information, the window summaries and the winsorized data with the tags column
         sd_file_path = clean_participant_folder / f"sd_{file_name}"
-        self.save_sd_file(data_rows, sd_file_path)
+        sdw_file_path = clean_participant_folder / f"sdw_{file_name}"
+        clean_recording = EmpaticaRecording(recording.start_time, recording.sample_rate, bounds.winsorize(data), tags_column)
+        clean_file_path = clean_participant_folder / f"c_{file_name}"
+        if self.cache is not None: # Hand the results to the plots and save them in the background
+            sd_frame = stats.sd_frame()
+            self.cache.put(sd_file_path, sd_frame)
+            self.cache.put(clean_file_path, clean_recording)
+            if self.sd_files:
+                self.cache.write(sd_file_path, sd_frame.to_csv, sd_file_path, index=False, header=True)
+            if window is not None:
+                self.cache.write(sdw_file_path, bounds.window_frame(recording.sample_rate).to_csv, sdw_file_path, index=False, header=True)
+            self.cache.write(clean_file_path, self.save_clean_recording, clean_file_path, clean_recording)
+            for output_path in [clean_file_path] + ([sd_file_path] if self.sd_files else []) + ([sdw_file_path] if window is not None else []):
+                self.index.expect_file(output_path)
+            if record is not None:
+                record['rows'] = recording.n_samples
+            return
+
+        if self.sd_files:
+            self.save_sd_file(data, sd_file_path, stats)
+        if window is not None:
+            bounds.window_frame(recording.sample_rate).to_csv(sdw_file_path, index=False, header=True)
+        self.save_clean_recording(clean_file_path, clean_recording)
+        #print(f"File {file_name} has been winsorized and saved as {clean_file_path}")
 
-        means = data_rows.mean().round(3)
-        std_devs = data_rows.std().round(3)
-        upper_bounds = (means + self.threshold * std_devs).round(3)
-        lower_bounds = (means - self.threshold * std_devs).round(3)
-        data_rows = self.winsorize_data(data_rows, lower_bounds, upper_bounds)
+        if record is not None:
+            record['rows'] = recording.n_samples
+            record['bytes_read'] = file_size(file_path)
+            record['bytes_written'] = file_size(sd_file_path, clean_file_path, *(cache_paths(clean_file_path) if self.binary_cache else []))
+            if window is not None:
+                record['bytes_written'] += file_size(sdw_file_path)
 
-        # Add the tags column back to the data
-        data_rows['tags'] = tags_column
+    def load_recording(self, file_path):
+        """
+        Load a recording from the in-memory cache, its binary sidecar or the CSV file.
+
+        Args:
+            file_path (Path): The path to the CSV file.
 
-        final_df = pd.concat([first_row, second_row, data_rows], ignore_index=True)
+        Returns:
+            EmpaticaRecording: The recording.
+        """
+        if self.cache is None:
+            return read_recording(file_path, self.dtype, use_cache=self.binary_cache)
+        return self.cache.load(file_path, lambda path: read_recording(path, self.dtype, use_cache=self.binary_cache))
+
+    def save_clean_recording(self, clean_file_path, clean_recording):
+        """
+        Save a cleaned recording with its tags column (and its binary sidecar, if enabled).
+
+        Args:
+            clean_file_path (Path): The path of the cleaned file.
+            clean_recording (EmpaticaRecording): The winsorized recording with its tags.
+        """
+        write_empatica_csv(clean_file_path, clean_recording)
+        if self.binary_cache:
+            save_binary_cache(clean_file_path, clean_recording)
+
+    def stream_file(self, file_path, participant_folder, clean_participant_folder, record=None, tags=None):
+        """
+        Process a single recording file like process_file, in two passes over chunks of chunksize rows so that
+        memory does not depend on the length of the recording. The first pass accumulates the column statistics
+        and the missing values, the second fills, counts the outliers, winsorizes, tags and appends every chunk.
+
+        Args:
+            file_path (Path): The path to the file to process.
+            participant_folder (Path): The folder containing the participant's data.
+            clean_participant_folder (Path): The folder to save the cleaned data.
+            record (dict, optional): The metrics record of the file, which gets its rows and bytes.
+            tags (list, optional): The timestamps in the participant's tags.csv (read from it if not given).
+        """
+        file_name = file_path.name
+        tags = [None] + (tags if tags is not None else self.load_tags(participant_folder))
+        cached_recording = load_binary_cache(file_path) if self.binary_cache else None
+        header = cached_recording if cached_recording is not None else read_empatica_csv(file_path, nrows=0)
+
+        def chunks():
+            if cached_recording is None:
+                yield from iter_empatica_csv(file_path, self.chunksize, self.dtype)
+            else: # Slice the memory-mapped sidecar instead of parsing the CSV again
+                for start in range(0, cached_recording.n_samples, self.chunksize):
+                    yield np.asarray(cached_recording.data[start:start + self.chunksize], dtype=self.dtype)
+
+        # First pass: column statistics and missing values
+        running_stats = RunningColumnStatistics(header.n_columns)
+        for chunk in chunks():
+            running_stats.update(chunk)
+        stats = running_stats.statistics(self.threshold)
+        for column in np.flatnonzero(running_stats.missing):
+            print(f"Filled missing values in {column} with mean: {stats.means[column]:.3f}")
+
+        tags[0] = header.start_time
+
+        # Second pass: fill, count the outliers, winsorize, tag and write every chunk
         clean_file_path = clean_participant_folder / f"c_{file_name}"
-        final_df.to_csv(clean_file_path, index=False, header=False)
-        #print(f"File {file_name} has been winsorized and saved as {clean_file_path}")
+        sidecar = open_binary_cache(clean_file_path, running_stats.n_rows, header.n_columns, self.dtype) if self.binary_cache else None
+        outlier_counts = np.zeros(header.n_columns, dtype=np.int64)
+        position = 0
+        partial_file_path = clean_file_path.with_name(clean_file_path.name + ".part")
+        with open(partial_file_path, 'w', newline='') as clean_file:
+            write_empatica_rows(clean_file, header.header_rows(), [None, None])
+            for chunk in chunks():
+                chunk = np.where(np.isnan(chunk), stats.means.astype(self.dtype), chunk)
+                outlier_counts += stats.outlier_counts(chunk)
+                winsorized = stats.winsorize(chunk)
+                write_empatica_rows(clean_file, winsorized, self.tag_labels(len(chunk), tags, header.sample_rate, position))
+                if sidecar is not None:
+                    sidecar[position:position + len(chunk)] = winsorized
+                position += len(chunk)
+        partial_file_path.replace(clean_file_path)
+        if sidecar is not None:
+            sidecar.flush()
+            del sidecar
+            write_cache_header(clean_file_path, header.start_time, header.sample_rate,
+                               tag_segments(self.tag_labels(position, tags, header.sample_rate)))
+
+        self.add_outlier_info(participant_folder, file_name, stats.percentage(outlier_counts), stats)
+
+        # Save standard deviation information
+        sd_file_path = clean_participant_folder / f"sd_{file_name}"
+        if self.sd_files:
+            self.save_sd_file(None, sd_file_path, stats)
+
+        if record is not None:
+            record['rows'] = position
+            record['bytes_read'] = file_size(file_path)
+            record['bytes_written'] = file_size(sd_file_path, clean_file_path, *(cache_paths(clean_file_path) if self.binary_cache else []))
 
     def copy_additional_files(self, participant_folder, clean_participant_folder):
         """
@@ -195,33 +774,130 @@ class OutliersDataProcessor:
         """
         for additional_file in self.additional_files:
             additional_file_path = participant_folder / additional_file
-            if additional_file_path.exists():
+            if self.index.is_file(additional_file_path):
                 shutil.copy(additional_file_path, clean_participant_folder)
                 #print(f"Copied {additional_file} to {clean_participant_folder}")
 
+    def process_participant_files(self, file_paths, participant_folder, clean_participant_folder, record, executor=None):
+        """
+        Process the recording files of a participant, concurrently when a thread pool is given. The tags are
+        loaded once for all files, and the outlier information keeps the order of the files.
+
+        Args:
+            file_paths (list of Path): The recording files to process.
+            participant_folder (Path): The folder containing the participant's data.
+            clean_participant_folder (Path): The folder to save the cleaned data.
+            record (dict): The metrics record of the participant.
+            executor (ThreadPoolExecutor, optional): The pool running the files.
+        """
+        if not file_paths:
+            return
+        tags = self.load_tags(participant_folder)
+        record['bytes_read'] = file_size(participant_folder / 'tags.csv')
+        for file_path in file_paths: # Create the file records up front so their order does not depend on the threads
+            record['files'][file_path.name] = {}
+
+        def process(file_path):
+            with measure(record['files'][file_path.name]) as file_record:
+                self.process_file(file_path, participant_folder, clean_participant_folder, file_record, tags)
+
+        first_info_row = len(self.outlier_info)
+        if executor is None:
+            for file_path in file_paths:
+                process(file_path)
+        else:
+            list(executor.map(process, file_paths)) # Raises the first error of the files
+
+        order = {file_path.name: position for position, file_path in enumerate(file_paths)}
+        with self.outlier_info_lock:
+            self.outlier_info[first_info_row:] = sorted(self.outlier_info[first_info_row:], key=lambda row: order[row['File']])
+
     def process_individual_recordings(self):
         """
         Process all participant folders and their recording files in the 
         base recordings directory.
         """
-        for participant_folder in self.recordings_path.iterdir():
-            if participant_folder.is_dir():
-                #print(f"Processing participant: {participant_folder.name}")
-                clean_participant_folder = self.clean_recordings_path / f"c_{participant_folder.name}"
-                clean_participant_folder.mkdir(exist_ok=True)
-
-                # Process each CSV file matching the keywords in the participant's folder
-                for file_path in participant_folder.glob('*.csv'):
-                    if any(keyword in file_path.name for keyword in self.keywords):
-                        self.process_file(file_path, participant_folder, clean_participant_folder)
-
-                # Copy additional files like info.txt and tags.csv
-                self.copy_additional_files(participant_folder, clean_participant_folder)
+        executor = ThreadPoolExecutor(max_workers=self.threads) if self.threads != 1 else None
+        try:
+            self.process_participants(executor)
+        finally:
+            if executor is not None:
+                executor.shutdown()
 
         # Save the collected outlier information
         self.save_outlier_info()
+        self.save_statistics()
+        if self.manifest is not None:
+            self.manifest.save()
         print("All individual recordings have been processed and saved to the 'clean_individual_recordings' folder.")
 
+    def process_participants(self, executor=None):
+        """
+        Process every participant folder that changed since the last run (all of them without a manifest).
+
+        Args:
+            executor (ThreadPoolExecutor, optional): The pool running the files of a participant.
+        """
+        for participant_folder in self.index.subfolders(self.recordings_path):
+            self.process_participant(participant_folder, executor)
+
+    def process_participant(self, participant_folder, executor=None):
+        """
+        Process the recording files of one participant into its clean folder, unless they did not change since the last run.
+
+        Args:
+            participant_folder (Path): The folder containing the participant's data.
+            executor (ThreadPoolExecutor, optional): The pool running the files of the participant.
+        """
+        #print(f"Processing participant: {participant_folder.name}")
+        clean_participant_folder = self.clean_recordings_path / f"c_{participant_folder.name}"
+        clean_participant_folder.mkdir(exist_ok=True)
+
+        # Process each CSV file matching the keywords in the participant's folder
+        file_paths = [file_path for file_path in self.index.files(participant_folder, '*.csv')
+                      if any(keyword in file_path.name for keyword in self.keywords)]
+        inputs = file_paths + [participant_folder / additional_file for additional_file in self.additional_files
+                               if self.index.is_file(participant_folder / additional_file)]
+        params = {'threshold': self.threshold, 'streaming': self.streaming, 'chunksize': self.chunksize if self.streaming else None,  # The chunks decide the streamed means
+                  'window_seconds': self.window_seconds, 'per_phase': self.per_phase, 'sd_files': self.sd_files, 'precision': self.precision, 'binary_cache': self.binary_cache}
+
+        # Reuse the previous results if nothing changed for this participant (and its statistics are stored)
+        if self.manifest is not None and (self.statistics is None or self.statistics.has_participant(participant_folder.name)) \
+                and self.manifest.is_up_to_date('outliers', participant_folder.name, inputs, params):
+            self.outlier_info.extend(self.manifest.results('outliers', participant_folder.name))
+            return
+
+        if self.statistics is not None:
+            self.statistics.clear_participant(participant_folder.name)
+
+        first_info_row = len(self.outlier_info)
+        record = {'files': {}}
+        with measure(record):
+            self.process_participant_files(file_paths, participant_folder, clean_participant_folder, record, executor)
+
+            # Copy additional files like info.txt and tags.csv
+            self.copy_additional_files(participant_folder, clean_participant_folder)
+        self.index.scan(clean_participant_folder)
+        if self.metrics is not None:
+            self.metrics.add('outliers', participant_folder.name, record)
+
+        if self.manifest is not None:
+            prefixes = ['c'] + (['sd'] if self.sd_files else []) + (['sdw'] if self.window_seconds is not None else [])
+            outputs = [clean_participant_folder / f"{prefix}_{file_path.name}" for file_path in file_paths for prefix in prefixes]
+            if self.binary_cache:
+                outputs += [sidecar_path for file_path in file_paths for sidecar_path in cache_paths(clean_participant_folder / f"c_{file_path.name}")]
+            outputs += [clean_participant_folder / additional_file for additional_file in self.additional_files
+                        if self.index.is_file(participant_folder / additional_file)]
+            self.manifest.record('outliers', participant_folder.name, inputs, outputs, params,
+                                 results=self.outlier_info[first_info_row:])
+
+    def save_statistics(self):
+        """
+        Commit the statistics of the run to the statistics store, dropping the participants that are gone.
+        """
+        if self.statistics is not None:
+            self.statistics.save([participant_folder.name for participant_folder in self.index.subfolders(self.recordings_path)])
+
     def save_outlier_info(self):
         """
         Save the outlier information collected during processing to a CSV file.
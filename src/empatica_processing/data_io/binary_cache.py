@@ -0,0 +1,146 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from empatica_processing.data_io.empatica_csv import (
+    EmpaticaRecording,
+    read_empatica_csv,
+)
+
+
+def cache_paths(csv_path):
+    """
+    Return the paths of the binary sidecar of a CSV recording: the samples as .npy and a small JSON header.
+
+    Args:
+        csv_path (Path): The path to the CSV recording.
+
+    Returns:
+        tuple: The .npy path and the .json path.
+    """
+    csv_path = Path(csv_path)
+    return csv_path.with_suffix('.npy'), csv_path.with_suffix('.json')
+
+
+def tag_segments(tags):
+    """
+    Compress the tag label of every sample into the sample offsets where a new tag starts.
+
+    Args:
+        tags (array-like): The tag label of every sample.
+
+    Returns:
+        dict: The start offsets and labels of the tag segments.
+    """
+    categorical = pd.Categorical(tags)
+    codes = categorical.codes
+    offsets = np.concatenate([[0], np.flatnonzero(np.diff(codes)) + 1]) if len(codes) else np.array([], dtype=int)
+    return {'offsets': offsets.tolist(), 'labels': [str(categorical.categories[codes[offset]]) for offset in offsets]}
+
+
+def expand_tag_segments(segments, n_samples):
+    """
+    Rebuild the per-sample tags (as a Categorical) from the stored tag segments.
+    """
+    labels = list(dict.fromkeys(segments['labels']))
+    codes = [labels.index(label) for label in segments['labels']]
+    lengths = np.diff(segments['offsets'] + [n_samples])
+    return pd.Categorical.from_codes(np.repeat(codes, lengths), categories=labels)
+
+
+def save_binary_cache(csv_path, recording):
+    """
+    Write the binary sidecar of a recording that was just saved as CSV. The JSON header keeps the start time,
+    the sample rate, the tag segments and the size and mtime of the CSV, so a stale sidecar is never used.
+
+    Args:
+        csv_path (Path): The path to the CSV file the recording was saved to.
+        recording (EmpaticaRecording): The saved recording.
+    """
+    npy_path, _ = cache_paths(csv_path)
+    temporary_npy_path = npy_path.with_name(npy_path.name + '.tmp')
+    with open(temporary_npy_path, 'wb') as npy_file:
+        np.save(npy_file, np.ascontiguousarray(recording.data))
+    temporary_npy_path.replace(npy_path)
+    write_cache_header(csv_path, recording.start_time, recording.sample_rate,
+                       tag_segments(recording.tags) if recording.tags is not None else None)
+
+
+def open_binary_cache(csv_path, n_samples, n_columns, dtype=np.float64):
+    """
+    Create an empty .npy sidecar that can be filled chunk by chunk (e.g. while streaming a merge).
+    Call write_cache_header once the CSV is complete to make the sidecar valid.
+
+    Args:
+        csv_path (Path): The path to the CSV file being written.
+        n_samples (int): The number of samples of the recording.
+        n_columns (int): The number of columns of the recording.
+        dtype (type): The dtype of the samples.
+
+    Returns:
+        np.memmap: The writable sample block.
+    """
+    npy_path, json_path = cache_paths(csv_path)
+    json_path.unlink(missing_ok=True)  # Invalidate the previous sidecar until the new one is complete
+    return np.lib.format.open_memmap(npy_path, mode='w+', dtype=dtype, shape=(n_samples, n_columns))
+
+
+def write_cache_header(csv_path, start_time, sample_rate, tags=None):
+    """
+    Write the JSON header of a sidecar, tied to the current size and mtime of the CSV file.
+    """
+    csv_stat = Path(csv_path).stat()
+    header = {'start_time': start_time, 'sample_rate': sample_rate, 'tags': tags,
+              'csv_size': csv_stat.st_size, 'csv_mtime_ns': csv_stat.st_mtime_ns}
+    _, json_path = cache_paths(csv_path)
+    temporary_json_path = json_path.with_name(json_path.name + '.tmp')
+    temporary_json_path.write_text(json.dumps(header))
+    temporary_json_path.replace(json_path)
+
+
+def load_binary_cache(csv_path):
+    """
+    Open the binary sidecar of a CSV recording with a zero-copy memory map.
+
+    Args:
+        csv_path (Path): The path to the CSV recording.
+
+    Returns:
+        EmpaticaRecording or None: The recording backed by a read-only memory map,
+        or None if there is no sidecar or it is older than the CSV.
+    """
+    npy_path, json_path = cache_paths(csv_path)
+    try:
+        header = json.loads(json_path.read_text())
+        csv_stat = Path(csv_path).stat()
+        if header['csv_size'] != csv_stat.st_size or header['csv_mtime_ns'] != csv_stat.st_mtime_ns:
+            return None
+        data = np.load(npy_path, mmap_mode='r')
+    except (OSError, ValueError, KeyError):
+        return None
+
+    tags = expand_tag_segments(header['tags'], len(data)) if header['tags'] is not None else None
+    return EmpaticaRecording(header['start_time'], header['sample_rate'], data, tags)
+
+
+def read_recording(csv_path, dtype=np.float64, use_cache=False):
+    """
+    Read a recording from its binary sidecar when one is available and fresh, otherwise from the CSV file.
+
+    Args:
+        csv_path (Path): The path to the CSV recording.
+        dtype (type): The dtype of the samples.
+        use_cache (bool): Look for a binary sidecar first.
+
+    Returns:
+        EmpaticaRecording: The recording.
+    """
+    if use_cache:
+        recording = load_binary_cache(csv_path)
+        if recording is not None:
+            if recording.data.dtype != dtype:
+                recording.data = recording.data.astype(dtype)
+            return recording
+    return read_empatica_csv(csv_path, dtype=dtype)
@@ -0,0 +1,152 @@
+import fnmatch
+import os
+import threading
+from pathlib import Path
+
+
+class DatasetIndex:
+    """
+    An in-memory index of the dataset tree (subjects, sessions and signal files with their sizes and mtimes),
+    built with os.scandir so every folder is listed only once. All stages query this index instead of calling
+    iterdir(), glob(), exists() or is_file() on the (possibly network-mounted) study drive.
+
+    Folders that were never scanned are scanned on first use; stages call scan() or update_file() after writing,
+    or expect_file() for a file that is still being written in the background. The index can be shared by threads:
+    its updates hold a lock and replace the file listings instead of changing them, so readers see whole listings.
+    """
+
+    def __init__(self, root):
+        """
+        Create an empty index (folders are scanned lazily).
+
+        Args:
+            root (str or Path): The base directory of the dataset.
+        """
+        self.root = Path(root)
+        self.folders = {}
+        self.expected = set()
+        self.lock = threading.RLock()
+
+    def __getstate__(self):
+        # Worker processes get the index without the lock, and a new lock of their own
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    @classmethod
+    def build(cls, root):
+        """
+        Build the index of a whole dataset tree in one walk.
+
+        Args:
+            root (str or Path): The base directory of the dataset.
+
+        Returns:
+            DatasetIndex: The index.
+        """
+        index = cls(root)
+        index.scan(root)
+        return index
+
+    def key(self, path):
+        return os.path.abspath(path)
+
+    def scan(self, folder):
+        """
+        (Re)scan a folder and everything below it, replacing what the index knew about them.
+
+        Args:
+            folder (str or Path): The folder to scan.
+        """
+        with self.lock:
+            folder_key = self.key(folder)
+            for key in [key for key in self.folders if key == folder_key or key.startswith(folder_key + os.sep)]:
+                del self.folders[key]
+
+            pending = [folder_key]
+            while pending:
+                current = pending.pop()
+                subfolders, files = [], {}
+                try:
+                    with os.scandir(current) as entries:
+                        for entry in entries:
+                            if entry.is_dir():
+                                subfolders.append(entry.name)
+                                pending.append(entry.path)
+                            elif entry.is_file():
+                                stat = entry.stat()
+                                files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+                except (FileNotFoundError, NotADirectoryError):  # Missing folders are indexed as empty
+                    pass
+                for key in [key for key in self.expected if os.path.dirname(key) == current]:
+                    if os.path.basename(key) in files:  # The background write has created it
+                        self.expected.discard(key)
+                    else:
+                        files[os.path.basename(key)] = (None, None)
+                self.folders[current] = {'subfolders': sorted(subfolders), 'files': dict(sorted(files.items()))}
+
+            # Make the folder visible in its parent if the parent is already indexed
+            parent = self.folders.get(os.path.dirname(folder_key))
+            if parent is not None and os.path.isdir(folder_key) and os.path.basename(folder_key) not in parent['subfolders']:
+                parent['subfolders'] = sorted(parent['subfolders'] + [os.path.basename(folder_key)])
+
+    def update_file(self, file_path):
+        """
+        Add or refresh a single file that was just written.
+
+        Args:
+            file_path (str or Path): The file.
+        """
+        stat = os.stat(file_path)
+        with self.lock:
+            folder = self.folder(Path(file_path).parent)
+            folder['files'] = dict(sorted({**folder['files'], Path(file_path).name: (stat.st_size, stat.st_mtime_ns)}.items()))
+            self.expected.discard(self.key(file_path))
+
+    def expect_file(self, file_path):
+        """
+        Add a file that is still being written. It is listed with an unknown (None, None) size and mtime,
+        also across scans, until a scan or update_file() finds it on disk.
+
+        Args:
+            file_path (str or Path): The file.
+        """
+        with self.lock:
+            folder = self.folder(Path(file_path).parent)
+            folder['files'] = dict(sorted({**folder['files'], Path(file_path).name: (None, None)}.items()))
+            self.expected.add(self.key(file_path))
+
+    def folder(self, folder):
+        key = self.key(folder)
+        with self.lock:
+            if key not in self.folders:
+                self.scan(folder)
+            return self.folders[key]
+
+    def subfolders(self, folder):
+        """
+        Return the subfolders of a folder, sorted by name.
+        """
+        return [Path(folder) / name for name in self.folder(folder)['subfolders']]
+
+    def files(self, folder, pattern='*'):
+        """
+        Return the files of a folder matching a glob pattern, sorted by name.
+        """
+        return [Path(folder) / name for name in self.folder(folder)['files'] if fnmatch.fnmatch(name, pattern)]
+
+    def stat(self, file_path):
+        """
+        Return the (size, mtime_ns) of a file, or None if it does not exist.
+        """
+        return self.folder(Path(file_path).parent)['files'].get(Path(file_path).name)
+
+    def is_file(self, file_path):
+        return self.stat(file_path) is not None
+
+    def is_dir(self, folder):
+        return Path(folder).name in self.folder(Path(folder).parent)['subfolders']
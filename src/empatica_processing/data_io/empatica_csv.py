@@ -0,0 +1,254 @@
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class EmpaticaRecording:
+    """
+    A single Empatica recording: the start timestamp and sample rate from the two header rows,
+    plus the samples as one contiguous 2-D NumPy block.
+
+    Attributes:
+        start_time (float): The UNIX timestamp of the first sample (row 1 of the file).
+        sample_rate (float): The sample rate in Hz (row 2 of the file).
+        data (np.ndarray): The samples, shaped (n_samples, n_columns).
+        tags (pd.Categorical or None): The tag label of every sample for cleaned files with a tags column.
+    """
+    start_time: float
+    sample_rate: float
+    data: np.ndarray
+    tags: pd.Categorical = None
+
+    @property
+    def n_samples(self):
+        return self.data.shape[0]
+
+    @property
+    def n_columns(self):
+        return self.data.shape[1]
+
+    @property
+    def end_time(self):
+        """The timestamp right after the last sample."""
+        return self.start_time + self.n_samples / self.sample_rate
+
+    def header_rows(self):
+        """
+        Build the two Empatica header rows (start timestamp and sample rate repeated for every column).
+
+        Returns:
+            np.ndarray: A (2, n_columns) float64 array.
+        """
+        return np.array([[self.start_time] * self.n_columns, [self.sample_rate] * self.n_columns], dtype=np.float64)
+
+
+def sample_dtype(precision):
+    """
+    Return the NumPy dtype of the samples for a precision option.
+
+    Args:
+        precision (str): 'float64' (the default of the stages) or 'float32', which halves the memory of the
+            recordings; Empatica sensors have far less real precision than float32 keeps.
+
+    Returns:
+        np.dtype: The dtype.
+
+    Raises:
+        ValueError: If the precision is not 'float64' or 'float32'.
+    """
+    if precision not in ('float64', 'float32'):
+        raise ValueError(f"Unknown precision {precision!r}, expected 'float64' or 'float32'.")
+    return np.dtype(precision)
+
+
+def read_empatica_header(file_path):
+    """
+    Parse the two header rows of an Empatica CSV file without reading the samples.
+
+    Args:
+        file_path (Path): The path to the CSV file.
+
+    Returns:
+        tuple: The start time, the sample rate, the number of signal columns and whether the file has a tags column.
+
+    Raises:
+        ValueError: If the file does not start with two numeric header rows.
+    """
+    with open(file_path) as csv_file:
+        first_row = csv_file.readline().strip().split(',')
+        second_row = csv_file.readline().strip().split(',')
+
+    if first_row == [''] or second_row == ['']:
+        raise ValueError(f"{file_path} does not contain the two Empatica header rows.")
+
+    n_columns = sum(1 for value in first_row if value != '')
+    has_tags = len(first_row) > n_columns  # Cleaned files end every header row with an empty tags field
+    return float(first_row[0]), float(second_row[0]), n_columns, has_tags
+
+
+def count_empatica_samples(file_path, buffer_size=1 << 20):
+    """
+    Count the samples of an Empatica CSV file without parsing it (blank lines are ignored,
+    like the CSV parser does).
+
+    Args:
+        file_path (Path): The path to the CSV file.
+        buffer_size (int): The number of bytes scanned at once.
+
+    Returns:
+        int: The number of sample rows after the two header rows.
+    """
+    n_rows = 0
+    line_length = 0  # Characters of the line that continues into the next buffer
+    with open(file_path, 'rb') as csv_file:
+        while chunk := csv_file.read(buffer_size):
+            raw = np.frombuffer(chunk, dtype=np.uint8)
+            newlines = np.flatnonzero(raw == 10)
+            characters = np.cumsum((raw != 10) & (raw != 13))  # Carriage returns do not make a line non-blank
+            line_lengths = np.diff(characters[newlines], prepend=0)
+            if len(newlines):
+                line_lengths[0] += line_length
+                n_rows += np.count_nonzero(line_lengths)
+                line_length = characters[-1] - characters[newlines[-1]]
+            else:
+                line_length += characters[-1]
+
+    if line_length:  # Last line without a trailing newline
+        n_rows += 1
+    return max(n_rows - 2, 0)
+
+
+def read_empatica_csv(file_path, dtype=np.float64, engine='c', nrows=None):
+    """
+    Read an Empatica CSV file (raw, Filled_Merged_* or cleaned c_*) in a single parse.
+
+    The header rows are parsed separately so the samples can be read with fixed numeric dtypes
+    (no object columns), and a trailing tags column is read as a pandas Categorical.
+
+    Args:
+        file_path (Path): The path to the CSV file.
+        dtype (type): The dtype of the samples, np.float64 or np.float32.
+        engine (str): The pandas CSV engine, 'c' or 'pyarrow' (if installed).
+        nrows (int, optional): Read at most this many samples; 0 reads the header only.
+
+    Returns:
+        EmpaticaRecording: The parsed recording.
+    """
+    start_time, sample_rate, n_columns, has_tags = read_empatica_header(file_path)
+    column_dtypes = {column: dtype for column in range(n_columns)}
+    if has_tags:
+        column_dtypes[n_columns] = 'category'
+
+    if nrows == 0:
+        return EmpaticaRecording(start_time, sample_rate, np.empty((0, n_columns), dtype=dtype))
+
+    try:
+        df = pd.read_csv(file_path, header=None, skiprows=2, names=list(column_dtypes), dtype=column_dtypes,
+                         engine=engine, nrows=nrows)
+    except pd.errors.EmptyDataError:  # Header rows only
+        return EmpaticaRecording(start_time, sample_rate, np.empty((0, n_columns), dtype=dtype))
+
+    tags = df.pop(n_columns).array if has_tags else None
+    data = np.ascontiguousarray(df.to_numpy(dtype=dtype))
+    return EmpaticaRecording(start_time, sample_rate, data, tags)
+
+
+def iter_empatica_csv(file_path, chunksize, dtype=np.float64):
+    """
+    Read the samples of an Empatica CSV file in chunks, skipping the two header rows.
+
+    Args:
+        file_path (Path): The path to the CSV file.
+        chunksize (int): The number of samples per chunk.
+        dtype (type): The dtype of the samples.
+
+    Yields:
+        np.ndarray: Contiguous (rows, n_columns) blocks of samples.
+    """
+    _, _, n_columns, _ = read_empatica_header(file_path)
+    try:
+        chunks = pd.read_csv(file_path, header=None, skiprows=2, usecols=range(n_columns), dtype=dtype, chunksize=chunksize)
+        for chunk in chunks:
+            yield np.ascontiguousarray(chunk.to_numpy(dtype=dtype))
+    except pd.errors.EmptyDataError:
+        return
+
+
+def csv_field(text):
+    """
+    Quote a text field the way the csv module (and DataFrame.to_csv) does with minimal quoting.
+    """
+    if any(character in text for character in ',"\r\n'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def format_empatica_rows(data, tags=None):
+    """
+    Format samples as CSV rows, byte for byte like DataFrame.to_csv: float64 values in their shortest repr,
+    float32 values in their shortest float32 repr, missing values as empty fields, and the tag of every row
+    looked up from its categorical code.
+
+    Args:
+        data (np.ndarray): The (rows, n_columns) block of samples.
+        tags (array-like, optional): The tag label of every row (None for rows without a tag).
+
+    Returns:
+        str: The rows, each ending with os.linesep like DataFrame.to_csv.
+    """
+    data = np.asarray(data)
+    n_rows, n_columns = data.shape
+    if data.dtype == np.float64: # repr is the fastest shortest round-trip formatting and matches NumPy's
+        fields = np.array(list(map(repr, data.ravel().tolist())), dtype=object).reshape(n_rows, n_columns)
+    else:
+        fields = data.astype(str).astype(object)
+    if data.dtype.kind == 'f':
+        fields[np.isnan(data)] = ''
+
+    # Interleave the fields with the separators and join everything at once
+    n_fields = n_columns + (tags is not None)
+    rows = np.empty((n_rows, 2 * n_fields), dtype=object)
+    rows[:, 0:2 * n_columns:2] = fields
+    if tags is not None:
+        tags = tags if isinstance(tags, pd.Categorical) else pd.Categorical(tags)
+        labels = np.array([csv_field(str(label)) for label in tags.categories] + [''], dtype=object)  # Code -1 (no tag) picks ''
+        rows[:, 2 * n_columns] = labels[tags.codes]
+    rows[:, 1::2] = ','
+    rows[:, -1] = os.linesep
+    return ''.join(rows.ravel().tolist())
+
+
+def write_empatica_rows(csv_file, data, tags=None, chunksize=100_000):
+    """
+    Append samples to an open Empatica CSV file, formatted in chunks by format_empatica_rows.
+
+    Args:
+        csv_file (file object): The output file, opened in text mode with newline=''.
+        data (np.ndarray): The (rows, n_columns) block of samples.
+        tags (array-like, optional): The tag label of every row, written as a last column.
+        chunksize (int): The number of rows formatted at once.
+    """
+    for start in range(0, len(data), chunksize):
+        csv_file.write(format_empatica_rows(data[start:start + chunksize], tags[start:start + chunksize] if tags is not None else None))
+
+
+def write_empatica_csv(file_path, recording):
+    """
+    Save a recording in the Empatica layout: two header rows followed by the samples
+    (and the tags column for cleaned recordings). The file is written next to its destination
+    and renamed over it once complete, so readers never see a partial file.
+
+    Args:
+        file_path (Path): The path to the output CSV file.
+        recording (EmpaticaRecording): The recording to save.
+    """
+    partial_path = Path(file_path).with_name(Path(file_path).name + ".part")
+    with open(partial_path, 'w', newline='') as csv_file:
+        header_tags = [None, None] if recording.tags is not None else None
+        write_empatica_rows(csv_file, recording.header_rows(), header_tags)
+        write_empatica_rows(csv_file, recording.data, recording.tags)
+    partial_path.replace(file_path)
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+class PipelineManifest:
+    """
+    A manifest of the inputs, parameters and outputs of every pipeline stage, stored as JSON in the base folder.
+
+    A stage asks is_up_to_date() before processing a subject and calls record() afterwards, so re-runs only
+    recompute the subjects whose input files (size, mtime and SHA-256) or parameters changed.
+    """
+
+    file_name = "pipeline_manifest.json"
+
+    def __init__(self, base_folder, force=False):
+        """
+        Load the manifest of the base folder (an empty one if it does not exist yet).
+
+        Args:
+            base_folder (str or Path): The base directory containing the recordings.
+            force (bool): Treat every subject as changed, so everything is recomputed (and recorded again).
+        """
+        self.base_folder = Path(base_folder)
+        self.path = self.base_folder / self.file_name
+        self.force = force
+        self.entries = {}
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text())
+            except ValueError:
+                print(f"Warning: {self.path.name} is corrupted and will be rebuilt.")
+
+    def relative_path(self, file_path):
+        return Path(os.path.relpath(file_path, self.base_folder)).as_posix()
+
+    def file_signature(self, file_path, previous=None):
+        """
+        Describe a file by its size, modification time and SHA-256 hash. The hash is only recomputed
+        when the size or modification time differ from the previous signature.
+
+        Args:
+            file_path (Path): The file to describe.
+            previous (dict, optional): The signature recorded in the previous run.
+
+        Returns:
+            dict: The size, mtime_ns and sha256 of the file.
+        """
+        stat = Path(file_path).stat()
+        if previous and previous['size'] == stat.st_size and previous['mtime_ns'] == stat.st_mtime_ns:
+            return previous
+
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha256.update(block)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256.hexdigest()}
+
+    def signatures(self, file_paths, previous=None):
+        previous = previous or {}
+        return {self.relative_path(file_path): self.file_signature(file_path, previous.get(self.relative_path(file_path)))
+                for file_path in sorted(file_paths)}
+
+    def is_up_to_date(self, stage, key, inputs, params=None):
+        """
+        Check whether a subject can be skipped by a stage.
+
+        Args:
+            stage (str): The stage name (e.g. 'fill', 'outliers', 'plot').
+            key (str): The subject or participant name.
+            inputs (list of Path): The input files of the subject.
+            params (dict, optional): The parameters that influence the outputs.
+
+        Returns:
+            bool: True if the inputs and parameters did not change and all recorded outputs still exist.
+        """
+        entry = self.entries.get(stage, {}).get(key)
+        if self.force or entry is None or entry['params'] != (params or {}):
+            return False
+
+        if not all((self.base_folder / output).exists() for output in entry['outputs']):
+            return False
+
+        try:
+            current = self.signatures(inputs, entry['inputs'])
+        except OSError:
+            return False
+        if {name: signature['sha256'] for name, signature in current.items()} != \
+                {name: signature['sha256'] for name, signature in entry['inputs'].items()}:
+            return False
+
+        entry['inputs'] = current  # Remember new mtimes of unchanged files so they are not hashed again
+        return True
+
+    def record(self, stage, key, inputs, outputs, params=None, results=None):
+        """
+        Record the inputs, parameters and outputs of a subject after a stage processed it.
+
+        Args:
+            stage (str): The stage name.
+            key (str): The subject or participant name.
+            inputs (list of Path): The input files of the subject.
+            outputs (list of Path): The files written for the subject.
+            params (dict, optional): The parameters that influence the outputs.
+            results (optional): JSON-serializable results to restore when the subject is skipped.
+        """
+        previous = self.entries.get(stage, {}).get(key, {}).get('inputs')
+        self.entries.setdefault(stage, {})[key] = {
+            'inputs': self.signatures(inputs, previous),
+            'params': params or {},
+            'outputs': [self.relative_path(output) for output in outputs],
+            'results': results,
+        }
+
+    def results(self, stage, key):
+        """Return the results recorded for a subject by a stage."""
+        return self.entries[stage][key]['results']
+
+    def save(self):
+        """Write the manifest atomically."""
+        temporary_path = self.path.with_name(self.path.name + ".tmp")
+        temporary_path.write_text(json.dumps(self.entries, indent=1))
+        temporary_path.replace(self.path)
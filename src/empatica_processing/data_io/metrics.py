@@ -0,0 +1,137 @@
+import cProfile
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def peak_rss():
+    """
+    Return the peak resident set size of the current process in bytes (None where it is not available).
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024  # Linux reports kilobytes
+
+
+def file_size(*file_paths):
+    """
+    Return the total size in bytes of the files that exist.
+    """
+    return sum(os.path.getsize(file_path) for file_path in file_paths if os.path.isfile(file_path))
+
+
+@contextmanager
+def measure(record):
+    """
+    Add the wall time and CPU time of a block to a metrics record, with the peak RSS of the whole process so far
+    as 'process_peak_rss_so_far'. That peak only grows over the run, so it is not the memory used by the block.
+    Measuring the same record several times accumulates the times.
+
+    Args:
+        record (dict): The record of a stage, subject or file. The block may add 'rows',
+            'bytes_read' and 'bytes_written' to it.
+    """
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        record['wall_time'] = record.get('wall_time', 0.0) + time.perf_counter() - wall_start
+        record['cpu_time'] = record.get('cpu_time', 0.0) + time.process_time() - cpu_start
+        record['process_peak_rss_so_far'] = peak_rss()
+
+
+def summarize(record, parts=()):
+    """
+    Add the rows and bytes of the parts of a record to its own and work out its throughput.
+
+    Args:
+        record (dict): The record of a stage, subject or file.
+        parts (iterable of dict): The records of its subjects or files.
+    """
+    parts = list(parts)
+    for counter in ['rows', 'bytes_read', 'bytes_written']:
+        record[counter] = record.get(counter, 0) + sum(part.get(counter, 0) for part in parts)
+    record['rows_per_second'] = record['rows'] / record['wall_time'] if record.get('wall_time') else None
+
+
+class PipelineMetrics:
+    """
+    Wall time, CPU time, rows and bytes of every pipeline stage, subject and file, stored as JSON in the base folder.
+    Every record also holds the peak RSS of the process up to its end (process_peak_rss_so_far), not its own peak.
+
+    A stage is run inside stage(), which can also run it under cProfile. The stages measure their subjects
+    and files with measure() and hand the subject records to add().
+    """
+
+    file_name = "pipeline_metrics.json"
+
+    def __init__(self, base_folder, profile_stage=None):
+        """
+        Start an empty metrics report.
+
+        Args:
+            base_folder (str or Path): The base directory containing the recordings.
+            profile_stage (str, optional): The stage to run under cProfile ('fill', 'outliers', 'pyramid', 'plot', 'cohort' or 'fused').
+                The statistics are saved as profile_<stage>.prof in the base folder.
+        """
+        self.base_folder = Path(base_folder)
+        self.path = self.base_folder / self.file_name
+        self.profile_stage = profile_stage
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Measure a whole stage (including the CPU time of its worker processes) and save the report afterwards.
+
+        Args:
+            name (str): The stage name.
+        """
+        record = self.stages.setdefault(name, {'subjects': {}})
+        profiler = cProfile.Profile() if name == self.profile_stage else None
+        children_start = os.times()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            with measure(record):
+                yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profile_path = self.base_folder / f"profile_{name}.prof"
+                profiler.dump_stats(profile_path)
+                print(f"Profile of the {name} stage saved to {profile_path}")
+            children_end = os.times()
+            record['cpu_time'] += (children_end.children_user - children_start.children_user) + \
+                                  (children_end.children_system - children_start.children_system)
+            summarize(record, record['subjects'].values())
+            self.save()
+
+    def add(self, stage, subject, record):
+        """
+        Add the record of a subject (with its 'files' records) to a stage.
+
+        Args:
+            stage (str): The stage name.
+            subject (str): The subject or participant name.
+            record (dict): The record filled by measure().
+        """
+        for file_record in record.get('files', {}).values():
+            summarize(file_record)
+        summarize(record, record.get('files', {}).values())
+        self.stages.setdefault(stage, {'subjects': {}})['subjects'][subject] = record
+
+    def save(self):
+        """Write the report atomically."""
+        temporary_path = self.path.with_name(self.path.name + ".tmp")
+        temporary_path.write_text(json.dumps(self.stages, indent=1))
+        temporary_path.replace(self.path)
@@ -0,0 +1,161 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from empatica_processing.data_io.empatica_csv import EmpaticaRecording
+
+
+def value_size(value):
+    """
+    Return the memory held by a cached recording or table in bytes.
+    """
+    if isinstance(value, EmpaticaRecording):
+        tags_size = value.tags.codes.nbytes if value.tags is not None else 0
+        return value.data.nbytes + tags_size
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    return 0
+
+
+class RecordingCache:
+    """
+    The recordings and SD tables handed from one pipeline stage to the next in memory, keyed by the path of
+    the CSV file they are (or will be) saved as. The least recently used entries are dropped once the cache
+    holds more than max_bytes; they are then read back from disk.
+
+    Files handed to write() are saved on background threads. Loading a path that is still being written
+    waits for its write first, and wait() raises the first error of the finished writes.
+    """
+
+    def __init__(self, max_bytes=1024 ** 3, writer_threads=1, max_pending_writes=8):
+        """
+        Create an empty cache.
+
+        Args:
+            max_bytes (int): The memory cap of the cached values in bytes.
+            writer_threads (int): The number of threads saving the files (0 saves them right away in write()).
+            max_pending_writes (int): The number of queued writes after which write() blocks, so the
+                recordings waiting to be saved stay bounded as well.
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=writer_threads) if writer_threads else None
+        self.write_slots = threading.BoundedSemaphore(max_pending_writes)
+        self.pending = {}
+
+    def key(self, path):
+        return os.path.abspath(path)
+
+    def get(self, path):
+        """
+        Return the cached value of a path (None if it is not cached) and mark it as recently used.
+        """
+        with self.lock:
+            key = self.key(path)
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+    def put(self, path, value):
+        """
+        Cache a value, dropping the least recently used entries beyond the memory cap.
+        Values larger than the whole cap are not cached.
+
+        Args:
+            path (str or Path): The CSV file the value belongs to.
+            value (EmpaticaRecording or pd.DataFrame): The recording or table.
+        """
+        size = value_size(value)
+        with self.lock:
+            self.pop(self.key(path))
+            if size > self.max_bytes:
+                return
+            self.entries[self.key(path)] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                self.pop(next(iter(self.entries)))
+
+    def pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[1]
+
+    def release(self, folder):
+        """
+        Drop every cached value of the files below a folder (e.g. once a subject is done).
+        """
+        prefix = self.key(folder) + os.sep
+        with self.lock:
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                self.pop(key)
+
+    def load(self, path, loader):
+        """
+        Return the cached value of a path, or load it from disk (once its pending write finished) and cache it.
+
+        Args:
+            path (str or Path): The CSV file.
+            loader (callable): Reads the value from the path.
+        """
+        value = self.get(path)
+        if value is None:
+            self.wait(path)
+            value = loader(path)
+            self.put(path, value)
+        return value
+
+    def write(self, path, function, *args, **kwargs):
+        """
+        Save a file in the background by calling function(*args, **kwargs) on a writer thread.
+
+        Args:
+            path (str or Path): The file being written, so that loading it waits for the write.
+            function (callable): The function writing the file.
+        """
+        if self.executor is None:
+            function(*args, **kwargs)
+            return
+        self.write_slots.acquire()
+        try:
+            future = self.executor.submit(function, *args, **kwargs)
+        except BaseException:
+            self.write_slots.release()
+            raise
+        future.add_done_callback(lambda _: self.write_slots.release())
+        with self.lock:
+            self.pending.setdefault(self.key(path), []).append(future)
+
+    def wait(self, path=None):
+        """
+        Wait until the pending writes of a path (or of all paths) are done.
+
+        Raises:
+            Exception: The first error raised by one of these writes.
+        """
+        with self.lock:
+            if path is None:
+                futures = [future for futures in self.pending.values() for future in futures]
+                self.pending = {}
+            else:
+                futures = self.pending.pop(self.key(path), [])
+        for future in futures:
+            future.result()
+
+    def close(self):
+        """
+        Wait for all pending writes, stop the writer threads and empty the cache.
+        """
+        try:
+            self.wait()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+            with self.lock:
+                self.entries.clear()
+                self.nbytes = 0
@@ -0,0 +1,153 @@
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signal_statistics (
+    participant TEXT NOT NULL,
+    file TEXT NOT NULL,
+    signal TEXT NOT NULL,
+    row_number INTEGER NOT NULL,
+    phase TEXT,
+    column_index INTEGER NOT NULL,
+    mean REAL,
+    lower_bound REAL,
+    upper_bound REAL,
+    threshold REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS signal_statistics_key ON signal_statistics (participant, signal, column_index, phase);
+CREATE TABLE IF NOT EXISTS outlier_percentages (
+    participant TEXT NOT NULL,
+    file TEXT NOT NULL,
+    signal TEXT NOT NULL,
+    percentage REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outlier_percentages_key ON outlier_percentages (participant, signal);
+"""
+
+
+class StatisticsStore:
+    """
+    The mean and outlier bounds of every participant, signal file, column and phase, and the outlier percentage
+    of every file, in one SQLite database in the base folder (pipeline_statistics.sqlite).
+
+    All changes of a run are made in a single transaction that save() commits, so the database is written
+    in one batch; queries on the same store already see the uncommitted rows.
+    """
+
+    file_name = "pipeline_statistics.sqlite"
+
+    def __init__(self, base_folder):
+        """
+        Open (or create) the statistics database of the base folder.
+
+        Args:
+            base_folder (str or Path): The base directory containing the recordings.
+        """
+        self.path = Path(base_folder) / self.file_name
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def has_participant(self, participant):
+        """
+        Return whether the store holds the statistics of a participant.
+        """
+        with self.lock:
+            return self.connection.execute("SELECT 1 FROM signal_statistics WHERE participant = ? LIMIT 1",
+                                           (participant,)).fetchone() is not None
+
+    def clear_participant(self, participant):
+        """
+        Remove the statistics of a participant before it is processed again.
+        """
+        with self.lock:
+            self.connection.execute("DELETE FROM signal_statistics WHERE participant = ?", (participant,))
+            self.connection.execute("DELETE FROM outlier_percentages WHERE participant = ?", (participant,))
+
+    def add_file(self, participant, file_name, signal, sd_frame, outlier_percentage, threshold):
+        """
+        Add the statistics of one signal file.
+
+        Args:
+            participant (str): The participant folder name.
+            file_name (str): The name of the signal file (e.g. 'Filled_Merged_TEMP.csv').
+            signal (str): The signal (e.g. 'TEMP').
+            sd_frame (pd.DataFrame): The SD table of the file: mean, lower and upper bound,
+                and the phase and column of every row when it has one row per phase.
+            outlier_percentage (float): The percentage of outliers in the file.
+            threshold (float): The threshold the bounds were computed with.
+        """
+        n_rows = len(sd_frame)
+        phases = sd_frame['phase'] if 'phase' in sd_frame else [None] * n_rows
+        columns = sd_frame['column'] if 'column' in sd_frame else np.arange(n_rows)
+        rows = [(participant, file_name, signal, row_number, phase, int(column), *map(self.real, values), threshold)
+                for row_number, (phase, column, values) in enumerate(zip(phases, columns, sd_frame.iloc[:, :3].to_numpy()))]
+        with self.lock:
+            self.connection.executemany("INSERT INTO signal_statistics VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.connection.execute("INSERT INTO outlier_percentages VALUES (?, ?, ?, ?)",
+                                    (participant, file_name, signal, float(outlier_percentage)))
+
+    @staticmethod
+    def real(value):
+        return None if np.isnan(value) else float(value)
+
+    def save(self, participants=None):
+        """
+        Commit the changes of the run.
+
+        Args:
+            participants (list of str, optional): The participants of the dataset; the statistics of
+                any other participant are removed first.
+        """
+        with self.lock:
+            if participants is not None:
+                placeholders = ", ".join("?" * len(participants))
+                for table in ["signal_statistics", "outlier_percentages"]:
+                    self.connection.execute(f"DELETE FROM {table} WHERE participant NOT IN ({placeholders})", list(participants))
+            self.connection.commit()
+
+    def bounds(self, participant):
+        """
+        Return the bounds in the first row of the SD table of every file of a participant (the bounds of the
+        first column, in the first phase with per-phase statistics), as the plots show them.
+
+        Returns:
+            dict: The (lower, upper) bounds by file name.
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT file, lower_bound, upper_bound FROM signal_statistics "
+                                           "WHERE participant = ? AND row_number = 0", (participant,)).fetchall()
+        return {file_name: (lower, upper) for file_name, lower, upper in rows}
+
+    def query(self, sql, params=()):
+        """
+        Run a query against the store, e.g. for a cohort analysis.
+
+        Returns:
+            pd.DataFrame: The result.
+        """
+        with self.lock:
+            return pd.read_sql_query(sql, self.connection, params=params)
+
+    def statistics(self, participant=None):
+        """
+        Return the statistics of one participant (or of all of them) as a table.
+        """
+        if participant is None:
+            return self.query("SELECT * FROM signal_statistics ORDER BY participant, file, row_number")
+        return self.query("SELECT * FROM signal_statistics WHERE participant = ? ORDER BY file, row_number", (participant,))
+
+    def outlier_percentages(self, participant=None):
+        """
+        Return the outlier percentage of every file of one participant (or of all of them) as a table.
+        """
+        if participant is None:
+            return self.query("SELECT * FROM outlier_percentages ORDER BY participant, file")
+        return self.query("SELECT * FROM outlier_percentages WHERE participant = ? ORDER BY file", (participant,))
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,262 @@
+import json
+import math
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from empatica_processing.data_io.binary_cache import read_recording
+from empatica_processing.data_io.dataset_index import DatasetIndex
+from empatica_processing.data_io.empatica_csv import sample_dtype
+from empatica_processing.data_io.metrics import file_size, measure
+
+
+def pyramid_paths(csv_path):
+    """
+    Return the paths of the summary pyramid of a CSV recording: the summaries as .pyramid.npy and a JSON header.
+
+    Args:
+        csv_path (Path): The path to the CSV recording.
+
+    Returns:
+        tuple: The .pyramid.npy path and the .pyramid.json path.
+    """
+    csv_path = Path(csv_path)
+    return csv_path.with_suffix('.pyramid.npy'), csv_path.with_suffix('.pyramid.json')
+
+
+def bucket_summaries(data, bucket_size):
+    """
+    Summarize consecutive buckets of samples (the last one may be shorter), ignoring missing values.
+
+    Args:
+        data (np.ndarray): The samples, shaped (n_samples, n_columns).
+        bucket_size (int): The number of samples per bucket.
+
+    Returns:
+        tuple: The minimum, maximum, sum and number of valid samples of every bucket and column.
+    """
+    n_full = len(data) // bucket_size
+    parts = [data[:n_full * bucket_size].reshape(n_full, bucket_size, data.shape[1])]
+    if n_full * bucket_size < len(data):
+        parts.append(data[n_full * bucket_size:][np.newaxis])
+    summaries = []
+    for part in parts:
+        valid = ~np.isnan(part)
+        summaries.append((np.fmin.reduce(part, axis=1), np.fmax.reduce(part, axis=1),
+                          np.where(valid, part, 0).sum(axis=1, dtype=np.float64), valid.sum(axis=1)))
+    return tuple(np.concatenate(values) for values in zip(*summaries))
+
+
+def merge_pairs(minimum, maximum, total, count):
+    """
+    Summarize every two neighbouring buckets of a level into one bucket of the next level.
+    """
+    n_pairs = len(minimum) // 2
+    merged = []
+    for values, combine in [(minimum, np.fmin), (maximum, np.fmax), (total, np.add), (count, np.add)]:
+        pairs = combine(values[0:2 * n_pairs:2], values[1:2 * n_pairs:2])
+        merged.append(np.concatenate([pairs, values[2 * n_pairs:]]))  # An odd last bucket is carried over
+    return tuple(merged)
+
+
+@dataclass
+class SummaryWindow:
+    """
+    The summaries of one level of a pyramid over a time window.
+
+    Attributes:
+        level (int): The level; every summary covers 2 ** level samples.
+        bucket_seconds (float): The duration of every bucket in seconds.
+        time (np.ndarray): The UNIX timestamp of the first sample of every bucket.
+        minimum, maximum, mean (np.ndarray): The minimum, maximum and mean of every bucket, shaped (n_buckets, n_columns).
+    """
+    level: int
+    bucket_seconds: float
+    time: np.ndarray
+    minimum: np.ndarray
+    maximum: np.ndarray
+    mean: np.ndarray
+
+
+class SummaryPyramid:
+    """
+    The minimum, maximum and mean of a recording at power-of-two resolutions: at level k every summary covers
+    2 ** k consecutive samples, from min_level up to a single summary of the whole recording. The levels are
+    stored in one float32 .npy file next to the CSV (about 3 / 2 ** min_level values per sample and column)
+    with a small JSON header, and are memory-mapped, so a query only reads the summaries it returns.
+    """
+
+    def __init__(self, start_time, sample_rate, n_samples, min_level, levels, summaries):
+        """
+        Args:
+            start_time (float): The UNIX timestamp of the first sample.
+            sample_rate (float): The sample rate in Hz.
+            n_samples (int): The number of samples of the recording.
+            min_level (int): The finest level.
+            levels (list of tuple): The offset and number of summaries of every level, from min_level up.
+            summaries (np.ndarray): The minimum, maximum and mean of all levels, shaped (3, n_summaries, n_columns).
+        """
+        self.start_time = start_time
+        self.sample_rate = sample_rate
+        self.n_samples = n_samples
+        self.min_level = min_level
+        self.levels = levels
+        self.summaries = summaries
+
+    @property
+    def max_level(self):
+        return self.min_level + len(self.levels) - 1
+
+    @classmethod
+    def build(cls, recording, min_level=3):
+        """
+        Summarize a recording at every level.
+
+        Args:
+            recording (EmpaticaRecording): The recording.
+            min_level (int): The finest level (2 ** min_level samples per summary).
+
+        Returns:
+            SummaryPyramid: The pyramid.
+        """
+        level = bucket_summaries(recording.data, 1 << min_level)
+        levels, blocks, offset = [], [], 0
+        while True:
+            minimum, maximum, total, count = level
+            with np.errstate(invalid='ignore', divide='ignore'):
+                blocks.append(np.stack([minimum, maximum, total / count]).astype(np.float32))
+            levels.append((offset, len(minimum)))
+            offset += len(minimum)
+            if len(minimum) <= 1:
+                break
+            level = merge_pairs(*level)
+        return cls(recording.start_time, recording.sample_rate, recording.n_samples, min_level, levels, np.concatenate(blocks, axis=1))
+
+    def save(self, csv_path):
+        """
+        Save the pyramid next to its CSV recording. The JSON header is tied to the size and mtime of the CSV,
+        so a stale pyramid is never loaded.
+        """
+        npy_path, json_path = pyramid_paths(csv_path)
+        temporary_npy_path = npy_path.with_name(npy_path.name + '.tmp')
+        with open(temporary_npy_path, 'wb') as npy_file:
+            np.save(npy_file, self.summaries)
+        temporary_npy_path.replace(npy_path)
+
+        csv_stat = Path(csv_path).stat()
+        header = {'start_time': self.start_time, 'sample_rate': self.sample_rate, 'n_samples': self.n_samples,
+                  'min_level': self.min_level, 'levels': self.levels,
+                  'csv_size': csv_stat.st_size, 'csv_mtime_ns': csv_stat.st_mtime_ns}
+        temporary_json_path = json_path.with_name(json_path.name + '.tmp')
+        temporary_json_path.write_text(json.dumps(header))
+        temporary_json_path.replace(json_path)
+
+    @classmethod
+    def load(cls, csv_path):
+        """
+        Open the pyramid of a CSV recording with a read-only memory map.
+
+        Returns:
+            SummaryPyramid or None: The pyramid, or None if there is none or it is older than the CSV.
+        """
+        npy_path, json_path = pyramid_paths(csv_path)
+        try:
+            header = json.loads(json_path.read_text())
+            csv_stat = Path(csv_path).stat()
+            if header['csv_size'] != csv_stat.st_size or header['csv_mtime_ns'] != csv_stat.st_mtime_ns:
+                return None
+            summaries = np.load(npy_path, mmap_mode='r')
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(header['start_time'], header['sample_rate'], header['n_samples'], header['min_level'],
+                   [tuple(level) for level in header['levels']], summaries)
+
+    def level_for(self, start_time, end_time, width):
+        """
+        Return the coarsest level with at least one summary per pixel over a time window
+        (the finest level for windows of fewer than 2 ** min_level samples per pixel).
+        """
+        samples_per_pixel = max((end_time - start_time) * self.sample_rate / width, 1)
+        return min(max(math.floor(math.log2(samples_per_pixel)), self.min_level), self.max_level)
+
+    def query(self, start_time, end_time, width=900, level=None):
+        """
+        Return the summaries covering a time window at the level that matches the pixel width of a plot,
+        in time proportional to the number of summaries returned.
+
+        Args:
+            start_time (float): The UNIX timestamp of the start of the window.
+            end_time (float): The UNIX timestamp of the end of the window.
+            width (int): The width of the plot in pixels.
+            level (int, optional): Query this level instead.
+
+        Returns:
+            SummaryWindow: The summaries of the buckets overlapping the window.
+        """
+        level = self.level_for(start_time, end_time, width) if level is None else level
+        offset, n_buckets = self.levels[level - self.min_level]
+        seconds_per_bucket = (1 << level) / self.sample_rate
+        first = min(max(math.floor((start_time - self.start_time) / seconds_per_bucket), 0), n_buckets)
+        last = min(max(math.ceil((end_time - self.start_time) / seconds_per_bucket), first), n_buckets)
+        minimum, maximum, mean = np.asarray(self.summaries[:, offset + first:offset + last])
+        time = self.start_time + np.arange(first, last) * seconds_per_bucket
+        return SummaryWindow(level, seconds_per_bucket, time, minimum, maximum, mean)
+
+
+class SummaryPyramidBuilder:
+    """
+    An optional stage after cleaning: builds the summary pyramid of every cleaned recording (c_*.csv) whose
+    pyramid is missing or older than the recording.
+    """
+
+    def __init__(self, base_folder, min_level=3, binary_cache=False, index=None, metrics=None, precision='float64'):
+        """
+        Args:
+            base_folder (str or Path): The base directory containing the recordings.
+            min_level (int): The finest level of the pyramids (2 ** min_level samples per summary).
+            binary_cache (bool): Read the cleaned recordings from their .npy sidecars when available.
+            index (DatasetIndex, optional): The dataset index shared with the other stages.
+            metrics (PipelineMetrics, optional): Report the time, rows, bytes and process peak memory so far of every participant to it.
+            precision (str): 'float32' reads the cleaned recordings as float32.
+        """
+        self.base_folder = Path(base_folder)
+        self.min_level = min_level
+        self.binary_cache = binary_cache
+        self.index = index if index is not None else DatasetIndex(self.base_folder)
+        self.metrics = metrics
+        self.dtype = sample_dtype(precision)
+        self.recordings_path = self.base_folder / "clean_individual_recordings"
+
+    def build_participant(self, clean_participant_folder):
+        """
+        Build the missing or stale pyramids of one participant.
+
+        Returns:
+            int: The number of pyramids built.
+        """
+        record = {'files': {}}
+        built = 0
+        with measure(record):
+            for csv_path in self.index.files(clean_participant_folder, 'c_*.csv'):
+                if SummaryPyramid.load(csv_path) is not None:
+                    continue
+                with measure(record['files'].setdefault(csv_path.name, {})) as file_record:
+                    recording = read_recording(csv_path, self.dtype, use_cache=self.binary_cache)
+                    SummaryPyramid.build(recording, self.min_level).save(csv_path)
+                    file_record['rows'] = recording.n_samples
+                    file_record['bytes_read'] = file_size(csv_path)
+                    file_record['bytes_written'] = file_size(*pyramid_paths(csv_path))
+                for path in pyramid_paths(csv_path):
+                    self.index.update_file(path)
+                built += 1
+        if self.metrics is not None and built:
+            self.metrics.add('pyramid', clean_participant_folder.name, record)
+        return built
+
+    def build_pyramids(self):
+        """
+        Build the pyramids of every participant.
+        """
+        built = sum(self.build_participant(folder) for folder in self.index.subfolders(self.recordings_path))
+        print(f"Summary pyramids built: {built}.")
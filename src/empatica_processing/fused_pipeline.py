@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from empatica_processing.cleaning_tagging.outliers import OutliersDataProcessor
+from empatica_processing.data_io.dataset_index import DatasetIndex
+from empatica_processing.data_io.metrics import measure
+from empatica_processing.data_io.recording_cache import RecordingCache
+from empatica_processing.missing_data.missing_filling import UnusualSubjectDataProcessor
+from empatica_processing.visualization.vis_figures import ParticipantDataPlotter
+
+
+class FusedPipeline:
+    """
+    Runs the fill, outlier and plot stages subject by subject instead of as three passes over the whole dataset.
+    The filled and cleaned recordings of a subject are handed to the next stage in memory through a
+    RecordingCache, while the Filled_Merged, c_ and sd_ files are saved on background threads. The subject's
+    recordings are released from the cache once its figure is saved.
+
+    Every subject is recomputed; the outputs are the same files the separate stages write.
+    """
+
+    def __init__(self, base_folder, threshold=2.5, window_seconds=None, per_phase=False, threads=1, binary_cache=False,
+                 index=None, metrics=None, memory_cap=1024 ** 3, writer_threads=1, statistics=None, sd_files=True,
+                 precision='float64', decimate=True, template=False):
+        """
+        Set up the three stages around one shared cache.
+
+        Args:
+            base_folder (str or Path): The base directory containing the recordings.
+            threshold (float): The threshold for outlier detection based on standard deviations.
+            window_seconds (float, optional): Detect the outliers against a moving window of this many seconds.
+            per_phase (bool): Detect the outliers against the statistics of every tag phase.
+            threads (int or None): The number of signal files of a participant cleaned at the same time.
+            binary_cache (bool): Save every recording with a memory-mappable .npy sidecar as well.
+            index (DatasetIndex, optional): The dataset index (a new index of the base folder if not given).
+            metrics (PipelineMetrics, optional): Report the time and process peak memory so far of every subject to it.
+            memory_cap (int): The memory cap of the recording cache in bytes.
+            writer_threads (int): The number of threads saving the outputs (0 saves them right away).
+            statistics (StatisticsStore, optional): Store the SD tables and outlier percentages in it; the plots read their bounds from it.
+            sd_files (bool): Also export the SD table of every file as sd_<file>.
+            precision (str): 'float64' or 'float32', the dtype of the recordings in all three stages.
+            decimate (bool): Plot the minimum and maximum of every bucket of samples instead of every sample.
+            template (bool): Build the figure once and only update its data for every subject.
+        """
+        self.base_folder = Path(base_folder)
+        self.index = index if index is not None else DatasetIndex(self.base_folder)
+        self.metrics = metrics
+        self.threads = threads
+        self.cache = RecordingCache(memory_cap, writer_threads)
+        self.filler = UnusualSubjectDataProcessor(base_folder, binary_cache=binary_cache, index=self.index, cache=self.cache, precision=precision)
+        self.cleaner = OutliersDataProcessor(base_folder, threshold, binary_cache=binary_cache, index=self.index,
+                                             window_seconds=window_seconds, per_phase=per_phase, threads=threads, cache=self.cache,
+                                             statistics=statistics, sd_files=sd_files, precision=precision)
+        self.plotter = ParticipantDataPlotter(base_folder, binary_cache=binary_cache, index=self.index, cache=self.cache, statistics=statistics,
+                                              precision=precision, decimate=decimate, template=template)
+
+    def process_subject(self, subject_folder, executor=None):
+        """
+        Fill, clean, tag and plot the recordings of one subject, then release them from the cache.
+
+        Args:
+            subject_folder (Path): The subject folder in 'individual recordings'.
+            executor (ThreadPoolExecutor, optional): The pool cleaning the files of the subject.
+
+        Returns:
+            str: The status of the fill stage ('processed', 'skipped' or 'failed').
+        """
+        _, status, log, _ = self.filler.run_subject(subject_folder)
+        print(log, end='')
+        self.index.scan(subject_folder)  # The copied tags.csv and info.txt
+
+        self.cleaner.process_participant(subject_folder, executor)
+        clean_participant_folder = self.cleaner.clean_recordings_path / f"c_{subject_folder.name}"
+        self.plotter.plot_participant(clean_participant_folder.name[4:])
+
+        self.cache.release(subject_folder)
+        self.cache.release(clean_participant_folder)
+        return status
+
+    def run(self):
+        """
+        Process every subject, wait for all outputs to be saved and save the outlier information and statistics.
+
+        Returns:
+            dict: The fill status of each subject.
+        """
+        statuses = {}
+        executor = ThreadPoolExecutor(max_workers=self.threads) if self.threads != 1 else None
+        try:
+            for subject_folder in self.index.subfolders(self.filler.base_folder):
+                record = {}
+                with measure(record):
+                    statuses[subject_folder.name] = self.process_subject(subject_folder, executor)
+                record['status'] = statuses[subject_folder.name]
+                if self.metrics is not None:
+                    self.metrics.add('fused', subject_folder.name, record)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            self.cache.close()  # Wait for the background writes
+            self.plotter.close_template()
+        self.index.scan(self.base_folder)
+
+        self.cleaner.save_outlier_info()
+        self.cleaner.save_statistics()
+        counts = {status: list(statuses.values()).count(status) for status in ['processed', 'skipped', 'failed']}
+        print(f"Subjects filled: {counts['processed']}, skipped: {counts['skipped']}, failed: {counts['failed']}.")
+        print("All subjects have been filled, cleaned and plotted.")
+        return statuses
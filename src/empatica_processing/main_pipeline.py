@@ -1,22 +1,106 @@
-from missing_data.missing_filling import UnusualSubjectDataProcessor
-from cleaning_tagging.outliers import OutliersDataProcessor
-from visualization.vis_figures import ParticipantDataPlotter
+import argparse
+from empatica_processing.missing_data.missing_filling import UnusualSubjectDataProcessor
+from empatica_processing.cleaning_tagging.outliers import OutliersDataProcessor
+from empatica_processing.visualization.vis_figures import ParticipantDataPlotter
+from empatica_processing.visualization.cohort_figures import CohortAggregator
+from empatica_processing.fused_pipeline import FusedPipeline
+from empatica_processing.data_io.manifest import PipelineManifest
+from empatica_processing.data_io.dataset_index import DatasetIndex
+from empatica_processing.data_io.metrics import PipelineMetrics
+from empatica_processing.data_io.statistics_store import StatisticsStore
+from empatica_processing.data_io.summary_pyramid import SummaryPyramidBuilder
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill, clean, tag and plot Empatica recordings.")
+    parser.add_argument("base_folder", nargs="?", help="The folder containing the participants data folders.")
+    parser.add_argument("--force", action="store_true", help="Recompute every output, even if its inputs did not change since the last run.")
+    parser.add_argument("--binary-cache", action="store_true", help="Hand the recordings between stages as memory-mapped .npy sidecars next to the CSV outputs.")
+    parser.add_argument("--streaming", action="store_true", help="Merge and clean the recordings chunk by chunk, so memory does not depend on the length of the recordings; the means filled into missing values are summed per chunk and can differ in their last digit from the in-memory ones.")
+    parser.add_argument("--chunksize", type=int, default=100_000, help="The number of rows read and written at once in streaming mode, which decides the last digit of the filled means (default: 100000).")
+    parser.add_argument("--window", type=float, metavar="SECONDS", help="Detect the outliers against a moving window of this many seconds instead of the whole recording.")
+    parser.add_argument("--per-phase", action="store_true", help="Detect the outliers against the statistics of every tag phase (Baseline, CognitiveTask1, ...) separately.")
+    parser.add_argument("--jobs", type=int, default=1, metavar="N", help="The number of worker processes filling the missing data of the subjects in parallel (default: 1).")
+    parser.add_argument("--threads", type=int, default=1, help="The number of signal files of a participant cleaned at the same time (default: 1).")
+    parser.add_argument("--no-sd-files", action="store_true", help="Keep the SD tables only in pipeline_statistics.sqlite instead of also exporting an sd_<file>.csv per recording.")
+    parser.add_argument("--precision", choices=["float64", "float32"], default="float64", help="The dtype of the samples in memory; float32 halves the memory, with cleaned values that can differ in about the 7th significant digit (default: float64).")
+    parser.add_argument("--no-decimation", action="store_true", help="Plot every sample instead of the minimum and maximum of every pixel-sized bucket of samples.")
+    parser.add_argument("--figure-template", action="store_true", help="Build the figure once and only swap in the data of every participant instead of creating a new figure each time.")
+    parser.add_argument("--plot-jobs", type=int, default=1, metavar="N", help="The number of worker processes rendering the figures in parallel (default: 1).")
+    parser.add_argument("--plot-memory", type=float, metavar="MB", help="The address space limit of every plot worker process, so large cohorts fail a figure instead of swapping.")
+    parser.add_argument("--pyramids", action="store_true", help="After cleaning, save a min/max/mean summary pyramid next to every cleaned recording for fast time-window plots.")
+    parser.add_argument("--cohort", action="store_true", help="After plotting, stream over the cleaned recordings and save the per-phase cohort statistics, mean traces and figure in the base folder.")
+    parser.add_argument("--cohort-bin", type=float, default=10.0, metavar="SECONDS", help="The width of the bins of the cohort mean traces, in seconds from the phase onset (default: 10).")
+    parser.add_argument("--fused", action="store_true", help="Fill, clean and plot one subject at a time in memory, saving the outputs in the background. It always recomputes every subject without reading or updating the manifest, and cannot be combined with --streaming, --chunksize, --jobs, --plot-jobs, --plot-memory or the fill, outliers and plot profiles.")
+    parser.add_argument("--memory-cap", type=float, default=1024, metavar="MB", help="The memory held by the recordings cached between the stages in fused mode (default: 1024 MB).")
+    parser.add_argument("--profile", choices=["fill", "outliers", "pyramid", "plot", "cohort", "fused"], help="Run one stage under cProfile and save the statistics as profile_<stage>.prof in the base folder.")
+    args = parser.parse_args(argv)
+    if args.fused: # Reject the options that the fused pipeline would ignore
+        ignored = [option for option, given in [("--streaming", args.streaming), ("--chunksize", args.chunksize != parser.get_default("chunksize")),
+                                                ("--jobs", args.jobs != 1), ("--plot-jobs", args.plot_jobs != 1), ("--plot-memory", args.plot_memory is not None),
+                                                (f"--profile {args.profile}", args.profile in ["fill", "outliers", "plot"])] if given]
+        if ignored:
+            parser.error(f"--fused cannot be combined with {', '.join(ignored)}.")
 
-def main():
     # Prompt the user to input the base folder path
-    base_folder = input("Please insert the path to the folder containing the participants data folders: ").strip()
-    
+    base_folder = args.base_folder or input("Please insert the path to the folder containing the participants data folders: ").strip()
+
+    # Only recompute the subjects whose inputs or parameters changed since the last run
+    manifest = PipelineManifest(base_folder, force=args.force)
+
+    # List the whole dataset tree once; every stage queries and updates this index
+    index = DatasetIndex.build(base_folder)
+
+    # Time every stage, subject and file; the report is saved as pipeline_metrics.json after each stage
+    metrics = PipelineMetrics(base_folder, profile_stage=args.profile)
+
+    # The SD tables and outlier percentages of all participants, committed to pipeline_statistics.sqlite once per run
+    statistics = StatisticsStore(base_folder)
+
+    # Run the three stages subject by subject on in-memory recordings
+    if args.fused:
+        pipeline = FusedPipeline(base_folder, window_seconds=args.window, per_phase=args.per_phase, threads=args.threads,
+                                 binary_cache=args.binary_cache, index=index, metrics=metrics, memory_cap=int(args.memory_cap * 1024 ** 2),
+                                 statistics=statistics, sd_files=not args.no_sd_files, precision=args.precision,
+                                 decimate=not args.no_decimation, template=args.figure_template)
+        with metrics.stage('fused'):
+            pipeline.run()
+        if args.pyramids:
+            with metrics.stage('pyramid'):
+                SummaryPyramidBuilder(base_folder, binary_cache=args.binary_cache, index=index, metrics=metrics, precision=args.precision).build_pyramids()
+        if args.cohort:
+            with metrics.stage('cohort'):
+                CohortAggregator(base_folder, args.cohort_bin, binary_cache=args.binary_cache, index=index, metrics=metrics, precision=args.precision).aggregate_cohort()
+        return
+
     # Process subjects using UnusualSubjectDataProcessor
-    processor = UnusualSubjectDataProcessor(base_folder)
-    processor.process_subjects()
+    processor = UnusualSubjectDataProcessor(base_folder, streaming=args.streaming, chunksize=args.chunksize, jobs=args.jobs, manifest=manifest, binary_cache=args.binary_cache, index=index, metrics=metrics,
+                                            precision=args.precision)
+    with metrics.stage('fill'):
+        processor.process_subjects()
     
     # Process individual recordings using OutliersDataProcessor
-    filter = OutliersDataProcessor(base_folder)
-    filter.process_individual_recordings()
+    filter = OutliersDataProcessor(base_folder, manifest=manifest, binary_cache=args.binary_cache, index=index, metrics=metrics,
+                                   streaming=args.streaming, chunksize=args.chunksize, window_seconds=args.window, per_phase=args.per_phase, threads=args.threads,
+                                   statistics=statistics, sd_files=not args.no_sd_files, precision=args.precision)
+    with metrics.stage('outliers'):
+        filter.process_individual_recordings()
+
+    # Summarize the cleaned recordings for time-window plots
+    if args.pyramids:
+        with metrics.stage('pyramid'):
+            SummaryPyramidBuilder(base_folder, binary_cache=args.binary_cache, index=index, metrics=metrics, precision=args.precision).build_pyramids()
     
     # Create an instance of ParticipantDataPlotter
-    plotter = ParticipantDataPlotter(base_folder)
-    plotter.plot_participant_data()
+    plotter = ParticipantDataPlotter(base_folder, manifest=manifest, binary_cache=args.binary_cache, index=index, metrics=metrics, statistics=statistics, precision=args.precision,
+                                     decimate=not args.no_decimation, template=args.figure_template, jobs=args.plot_jobs,
+                                     worker_memory=int(args.plot_memory * 1024 ** 2) if args.plot_memory else None)
+    with metrics.stage('plot'):
+        plotter.plot_participant_data()
+
+    # Aggregate the whole cohort per tag phase
+    if args.cohort:
+        with metrics.stage('cohort'):
+            CohortAggregator(base_folder, args.cohort_bin, binary_cache=args.binary_cache, index=index, metrics=metrics, precision=args.precision).aggregate_cohort()
     
     
 
@@ -1,17 +1,81 @@
+import numpy as np
 import pandas as pd
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stdout
+import io
 import shutil
+from empatica_processing.data_io.empatica_csv import EmpaticaRecording, sample_dtype, read_empatica_csv, count_empatica_samples, iter_empatica_csv, write_empatica_csv, write_empatica_rows
+from empatica_processing.data_io.dataset_index import DatasetIndex
+from empatica_processing.data_io.binary_cache import cache_paths, save_binary_cache, open_binary_cache, write_cache_header
+from empatica_processing.data_io.metrics import measure, file_size
+
+class RunningColumnMeans:
+    def __init__(self, n_columns):
+        """
+        Accumulates per-column sums and counts so that column means can be computed block by block.
+        Parameters:
+        - n_columns (int): The number of columns of the recording.
+        Returns:
+        - None
+        """
+        self.totals = np.zeros(n_columns)
+        self.counts = np.zeros(n_columns)
+
+    def update(self, block):
+        """
+        Adds a 2-D data block to the running sums (in float64, also for float32 blocks), ignoring missing values.
+        Parameters:
+        - block (np.ndarray): The data block (header rows and gaps excluded).
+        Returns:
+        - None
+        """
+        valid = ~np.isnan(block)
+        self.totals += block.sum(axis=0, where=valid, dtype=np.float64)
+        self.counts += valid.sum(axis=0)
+
+    def means(self):
+        """
+        Returns the column means rounded to one decimal (NaN for columns without any values).
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = self.totals / self.counts
+        return np.array([round(mean, 1) for mean in means]) # Round like the original per-column replacement
+
 
 class UnusualSubjectDataProcessor: 
-    def __init__(self, base_folder):
+    def __init__(self, base_folder, streaming=False, chunksize=100_000, jobs=1, manifest=None, binary_cache=False, index=None, metrics=None, cache=None, precision='float64'):
         """
         Initializes an instance of the UnusualSubjectDataProcessor class.
         Parameters:
         - base_folder (str or Path): The base folder path.
+        - streaming (bool, optional): Merge the sessions chunk by chunk straight into the output files instead of loading whole recordings. Default is False.
+        - chunksize (int, optional): The number of rows read or written at once in streaming mode. Default is 100000.
+        - jobs (int or None, optional): The number of worker processes used to process subjects in parallel (None uses all cores). Default is 1.
+        - manifest (PipelineManifest, optional): Skip subjects whose session files did not change since the last run. Default is None (process everything).
+        - binary_cache (bool, optional): Also save every Filled_Merged recording as a memory-mappable .npy/.json sidecar for the next stages. Default is False.
+        - index (DatasetIndex, optional): The dataset index shared with the other stages. Default is None (a new index of the base folder, scanned on demand).
+        - metrics (PipelineMetrics, optional): Report the time, rows, bytes and process peak memory so far of every subject and file to it. Default is None.
+        - cache (RecordingCache, optional): Keep the filled recordings in memory for the next stages and save them in the background (in-memory mode only). Default is None.
+        - precision (str, optional): 'float32' parses and keeps the samples as float32 (the column means are still accumulated in float64), which halves the memory of the recordings. Default is 'float64'.
         Returns:
         - None
         """
         self.base_folder = Path(base_folder) / "individual recordings"  # Navigate to "individual recordings"
+        self.streaming = streaming
+        self.chunksize = chunksize
+        self.jobs = jobs
+        self.manifest = manifest
+        self.binary_cache = binary_cache
+        self.index = index if index is not None else DatasetIndex(Path(base_folder))
+        self.metrics = metrics
+        self.cache = cache
+        self.precision = precision
+        self.dtype = sample_dtype(precision)
+        self.csv_files = ['ACC.csv', 'BVP.csv', 'EDA.csv', 'HR.csv', 'TEMP.csv']
+        self.additional_files = ['info.txt', 'tags.csv']
+        self.session_headers = {} # The headers read for the subject being processed
 
     def folder_and_file_validation(self, subject_folder):
         """
@@ -21,27 +85,48 @@ class UnusualSubjectDataProcessor:
         Returns:
         - bool: True if the folder and files are valid, False otherwise.
         """
-        if not subject_folder.is_dir() or not subject_folder.name.startswith('rn'): # Check if the folder is a directory and starts with 'rn'
+        if not subject_folder.name.startswith('rn') or not self.index.is_dir(subject_folder): # Check if the folder is a directory and starts with 'rn'
             #print(f"Skipping {subject_folder.name}. Folder must start with 'rn' and be a directory.")
             return False
 
-        subfolders = [f for f in subject_folder.iterdir() if f.is_dir()] # Check if the subject folder has exactly two subfolders
-        if len(subfolders) != 2:
-            #print(f"Skipping {subject_folder.name} because it does not have exactly two subfolders.")
+        subfolders = self.index.subfolders(subject_folder) # Check if the subject folder has at least two sessions
+        if len(subfolders) < 2:
+            #print(f"Skipping {subject_folder.name} because it does not have at least two subfolders.")
             return False
 
         for subfolder in subfolders: # Check if the subfolders are not empty and do not contain duplicate files
-            if not any(subfolder.iterdir()):
+            filenames = [f.name for f in self.index.files(subfolder) + self.index.subfolders(subfolder)]
+            if not filenames:
                 print(f"Warning: Subfolder {subfolder.name} in {subject_folder.name} is empty.")
                 return False
 
-            filenames = [f.name for f in subfolder.iterdir()]
             if len(filenames) != len(set(filenames)):
                 print(f"Warning: Duplicate files found in {subfolder.name} of {subject_folder.name}.")
                 return False
 
         return True
 
+    def file_is_valid(self, filepath, folder_name, filename):
+        """
+        Checks that a CSV file exists and is not empty.
+        Parameters:
+        - filepath (Path): The path to the CSV file.
+        - folder_name (str): The name of the folder containing the file.
+        - filename (str): The name of the CSV file.
+        Returns:
+        - bool: True if the file can be read, False otherwise.
+        """
+        file_stat = self.index.stat(filepath)
+        if file_stat is None: # Check if the file exists
+            print(f"Expected file {filename} is missing in {folder_name}.")
+            return False
+
+        if file_stat[0] == 0: # Check if the file is empty
+            print(f"File {filename} is empty in {folder_name}.")
+            return False
+
+        return True
+
     def read_and_validate_csv(self, filepath, folder_name, filename):
         """
         Reads a CSV file and performs basic validation.
@@ -50,186 +135,483 @@ class UnusualSubjectDataProcessor:
         - folder_name (str): The name of the folder containing the file.
         - filename (str): The name of the CSV file.
         Returns:
-        - pd.DataFrame or None: The DataFrame if valid, None otherwise.
+        - EmpaticaRecording or None: The recording if valid, None otherwise.
         """
-        if not filepath.exists(): # Check if the file exists
-            print(f"Expected file {filename} is missing in {folder_name}.")
+        if not self.file_is_valid(filepath, folder_name, filename):
             return None
 
-        data = pd.read_csv(filepath, header=None) # Check if the file is empty
-        if data.empty: 
-            print(f"File {filename} is empty in {folder_name}.")
+        try:
+            return read_empatica_csv(filepath, dtype=self.dtype)
+        except ValueError as e: # Handle missing header rows or non-numeric values
+            print(f"Error reading {filename} in {folder_name}: {e}")
+            return None
+
+    def read_and_validate_header(self, filepath, folder_name, filename):
+        """
+        Reads only the header rows (timestamp and sampling rate) of a CSV file and performs basic validation.
+        Parameters:
+        - filepath (Path): The path to the CSV file.
+        - folder_name (str): The name of the folder containing the file.
+        - filename (str): The name of the CSV file.
+        Returns:
+        - EmpaticaRecording or None: The header (without samples) if valid, None otherwise.
+        """
+        if not self.file_is_valid(filepath, folder_name, filename):
             return None
 
-        return data
+        try:
+            return self.read_header(filepath)
+        except ValueError as e: # Handle missing or non-numeric header rows
+            print(f"Error reading {filename} in {folder_name}: {e}")
+            return None
 
-    def process_subject_files(self, subject_folder, subfolders):
+    def read_header(self, filepath):
+        """
+        Reads the header rows of a CSV file once per subject: sorting the sessions and planning the merges share them.
+        Parameters:
+        - filepath (Path): The path to the CSV file.
+        Returns:
+        - EmpaticaRecording: The header (without samples).
+        """
+        key = (filepath, self.index.stat(filepath)) # A file that changed since it was listed is read again
+        if key not in self.session_headers:
+            self.session_headers[key] = read_empatica_csv(filepath, nrows=0)
+        return self.session_headers[key]
+
+    def process_subject_files(self, subject_folder, subfolders, file_metrics=None):
         """
         Processes the CSV files in the subject subfolders after validation.
         Parameters:
         - subject_folder (Path): The path to the subject folder.
-        - subfolders (list of Path): List of subfolder paths.
+        - subfolders (list of Path): List of subfolder paths (one per session, in any order).
+        - file_metrics (dict, optional): The metrics records of the CSV files, filled in by name.
         Returns:
         - dict: Dictionary containing the filled recordings, or None if validation fails.
         """
         combined_data = {}
-        csv_files = ['ACC.csv', 'BVP.csv', 'EDA.csv', 'HR.csv', 'TEMP.csv']
-
-        for csv_file in csv_files: # Process each CSV file
-            file_path1 = subfolders[0] / csv_file
-            file_path2 = subfolders[1] / csv_file
+        file_metrics = {} if file_metrics is None else file_metrics
 
-            recording1 = self.read_and_validate_csv(file_path1, subject_folder.name, csv_file)
-            recording2 = self.read_and_validate_csv(file_path2, subject_folder.name, csv_file)
-            
-            if recording1 is None or recording2 is None: # Skip if any of the files are invalid
-                continue
-
-            if recording1.shape[1] != recording2.shape[1]: # Check for mismatched number of columns
-                print(f"Error: Mismatched number of columns in {csv_file} for {subject_folder.name}. Skipping these files.")
-                continue
+        for csv_file in self.csv_files: # Process each CSV file
+            with measure(file_metrics.setdefault(csv_file, {})) as record:
+                merge_plan = self.plan_merge(subject_folder, subfolders, csv_file)
+                if merge_plan is None: # Skip if any of the files are invalid or the sessions overlap
+                    continue
+                record['bytes_read'] = file_size(*merge_plan[0])
 
-            sampling_rate1 = float(recording1.iloc[1, 0]) # Check for negative sampling rates
-            sampling_rate2 = float(recording2.iloc[1, 0])
-            if sampling_rate1 <= 0 or sampling_rate2 <= 0:
-                print(f"Error: Negative or zero sampling rate found in {csv_file} for {subject_folder.name}. Skipping these files.")
-                continue
-
-            filled_recording = self.determine_time_gap_and_fill(recording1, recording2, subject_folder) # Fill in missing values
-            combined_data[csv_file] = filled_recording
+                filled_recording = self.merge_sessions(subject_folder, csv_file, *merge_plan) # Fill in missing values
+                if filled_recording is not None:
+                    combined_data[csv_file] = filled_recording
+                    record['rows'] = filled_recording.n_samples
 
         return combined_data
 
-    def process_subjects(self):
+    def headers_are_compatible(self, header1, header2, subject_folder, csv_file):
         """
-        Processes all subject folders in the base folder.
+        Checks that the headers (number of columns and sampling rate) of two recordings can be merged.
+        Parameters:
+        - header1 (EmpaticaRecording): The first recording (or its header only).
+        - header2 (EmpaticaRecording): The second recording (or its header only).
+        - subject_folder (Path): The path to the subject folder.
+        - csv_file (str): The name of the CSV file.
         Returns:
-        - None
+        - bool: True if the recordings can be merged, False otherwise.
         """
-        for subject_folder in self.base_folder.iterdir():
-            if not self.folder_and_file_validation(subject_folder):
-                continue
+        if header1.n_columns != header2.n_columns: # Check for mismatched number of columns
+            print(f"Error: Mismatched number of columns in {csv_file} for {subject_folder.name}. Skipping these files.")
+            return False
 
-            subfolders = [f for f in subject_folder.iterdir() if f.is_dir()] 
-            combined_data = self.process_subject_files(subject_folder, subfolders)
-            if combined_data:
-                self.save_combined_data(subject_folder, combined_data) 
-                self.copy_additional_files(subject_folder, subfolders) 
+        if header1.sample_rate <= 0 or header2.sample_rate <= 0: # Check for negative sampling rates
+            print(f"Error: Negative or zero sampling rate found in {csv_file} for {subject_folder.name}. Skipping these files.")
+            return False
 
-                print(f"Processed and saved data for subject: {subject_folder.name}")
+        return True
 
-    def determine_time_gap_and_fill(self, recording1, recording2, subject_folder):
+    def plan_merge(self, subject_folder, subfolders, csv_file):
         """
-        Determines the time gap between two recordings and fills in the missing values.
+        Reads only the headers of every session of one signal, sorts the sessions by start timestamp and works out the gaps between them.
+        The gaps and the preallocated output need the sample count of every session before any of them is parsed, so each session
+        is scanned once more for its newlines with count_empatica_samples. That pass reads the bytes without parsing them and costs
+        a fraction of the parse; the sessions are raw recordings without binary sidecars to take the counts from.
         Parameters:
-        - recording1 (pd.DataFrame): The first recording.
-        - recording2 (pd.DataFrame): The second recording.
+        - subject_folder (Path): The path to the subject folder.
+        - subfolders (list of Path): List of subfolder paths (one per session).
+        - csv_file (str): The name of the CSV file.
         Returns:
-        - pd.DataFrame: The filled recording with the missing values.
+        - tuple or None: The session file paths, their headers and sample counts (sorted by start time) and the gap rows between consecutive sessions, or None if the files are invalid or the sessions overlap.
         """
-        try: # Extract timestamps and sampling rates
-            timestamp1 = float(recording1.iloc[0, 0])
-            sampling_rate1 = float(recording1.iloc[1, 0])
-            timestamp2 = float(recording2.iloc[0, 0])
-        except ValueError as e: # Handle errors in converting values to float
-            print(f"Error converting values to float: {e}")
+        sessions = []
+        for subfolder in subfolders:
+            file_path = subfolder / csv_file
+            header = self.read_and_validate_header(file_path, subject_folder.name, csv_file)
+            if header is None:
+                return None
+            sessions.append((header.start_time, file_path, header))
+
+        sessions.sort(key=lambda session: session[0]) # Merge in chronological order, whatever the folder names
+        file_paths = [file_path for _, file_path, _ in sessions]
+        headers = [header for _, _, header in sessions]
+        if not all(self.headers_are_compatible(headers[0], header, subject_folder, csv_file) for header in headers[1:]):
             return None
 
-        end1 = timestamp1 + (len(recording1) - 2) / sampling_rate1 # Calculate the end time of the first recording
-        start2 = timestamp2 # Calculate the start time of the second recording
-        time_gap = start2 - end1 # Calculate the time gap between the two recordings
-
-        if time_gap < 0: # Check for negative time gaps
-            print(f"Warning: Negative time gap found between recordings in {subject_folder.name}. Skipping.")
+        n_samples = [count_empatica_samples(file_path) for file_path in file_paths]
+        gap_rows = self.calculate_gap_rows(file_paths, headers, n_samples, subject_folder, csv_file)
+        if gap_rows is None:
             return None
 
-        no_rows = int(time_gap * sampling_rate1) # Calculate the number of rows to generate
-        missing_values = self.generate_dummy_rows(no_rows, recording1.iloc[2:]) # Generate dummy rows with missing values
-        filled_recording = self.fill_in_missing_values(recording1, recording2, missing_values) # Fill in missing values
+        return file_paths, headers, n_samples, gap_rows
 
-        return filled_recording
-
-    def generate_dummy_rows(self, no_rows, original_data):
+    def calculate_gap_rows(self, file_paths, headers, n_samples, subject_folder, csv_file):
         """
-        Generates dummy rows with missing values based on the number of rows and the columns of the original data.
+        Calculates the number of missing rows between consecutive sessions in one pass over the sorted headers.
+        Overlapping sessions are all reported before the signal is skipped.
         Parameters:
-        - no_rows (int): The number of rows to generate.
-        - original_data (pd.DataFrame): The original data used to determine the columns.
+        - file_paths (list of Path): The session files, sorted by start time.
+        - headers (list of EmpaticaRecording): The session headers, sorted by start time.
+        - n_samples (list of int): The number of samples of each session.
+        - subject_folder (Path): The path to the subject folder.
+        - csv_file (str): The name of the CSV file.
         Returns:
-        - pd.DataFrame: A DataFrame with the same columns as the original data, filled with a placeholder value.
+        - list of int or None: The number of missing rows after each session but the last, or None if sessions overlap.
         """
-        placeholder = 9999999999 # Placeholder value for missing data
-        if placeholder in original_data.values: # Check if the placeholder value already exists in the original data
-            print(f"Placeholder value {placeholder} already exists in the original data. Please choose a different placeholder.")
-            return None
+        sampling_rate = headers[0].sample_rate # The merged recording keeps the sampling rate of the first session
+        gap_rows = []
+        overlapping = False
+        for i in range(len(headers) - 1):
+            end = headers[i].start_time + n_samples[i] / headers[i].sample_rate # Calculate the end time of the session
+            time_gap = headers[i + 1].start_time - end # Calculate the time gap until the next session
+
+            if time_gap < 0: # Report overlapping sessions instead of dropping data silently
+                print(f"Warning: Sessions {file_paths[i].parent.name} and {file_paths[i + 1].parent.name} overlap by {-time_gap:.3f} s in {csv_file} for {subject_folder.name}. Skipping these files.")
+                overlapping = True
+                continue
 
-        missing_values = pd.DataFrame(placeholder, index=range(no_rows), columns=original_data.columns) # Create a DataFrame with missing values
-        return missing_values
+            gap_rows.append(int(time_gap * sampling_rate)) # Calculate the number of rows to generate
 
-    def fill_in_missing_values(self, recording1, recording2, missing_values):
+        return None if overlapping else gap_rows
+
+    def merge_sessions(self, subject_folder, csv_file, file_paths, headers, n_samples, gap_rows):
         """
-        Fills in missing values in a recording by replacing them with the mean value of the corresponding column.
+        Reads every session straight into one preallocated array and fills the gaps with the mean value of the corresponding column.
         Parameters:
-        - recording1 (pd.DataFrame): The first part of the recording.
-        - recording2 (pd.DataFrame): The second part of the recording.
-        - missing_values (pd.DataFrame): The DataFrame containing the missing values.
+        - subject_folder (Path): The path to the subject folder.
+        - csv_file (str): The name of the CSV file.
+        - file_paths, headers, n_samples, gap_rows: The merge plan returned by plan_merge.
         Returns:
-        - pd.DataFrame: The filled recording with missing values replaced by the mean value of the corresponding column.
+        - EmpaticaRecording or None: The filled recording, or None if a session could not be read.
         """
-        if missing_values is None: # Check if missing values are generated
-            return None
+        filled = np.empty((sum(n_samples) + sum(gap_rows), headers[0].n_columns), dtype=self.dtype) # Preallocate the whole merged recording once
+        running_means = RunningColumnMeans(headers[0].n_columns)
+        gaps = []
+        start = 0
+        for i, file_path in enumerate(file_paths):
+            recording = self.read_and_validate_csv(file_path, subject_folder.name, csv_file)
+            if recording is None:
+                return None
+            if recording.n_samples != n_samples[i]:
+                print(f"Error: {csv_file} in {file_path.parent.name} of {subject_folder.name} changed while it was being merged. Skipping these files.")
+                return None
+
+            end = start + n_samples[i]
+            filled[start:end] = recording.data
+            running_means.update(filled[start:end])
+            if i < len(gap_rows):
+                gaps.append(slice(end, end + gap_rows[i]))
+                start = end + gap_rows[i]
+
+        means = running_means.means()
+        for gap in gaps: # Fill the gaps with the column means
+            filled[gap] = means
+
+        return EmpaticaRecording(headers[0].start_time, headers[0].sample_rate, filled)
+
+    def stream_subject_files(self, subject_folder, subfolders, file_metrics=None):
+        """
+        Streams the CSV files of the subject subfolders into the Filled_Merged files without loading whole recordings.
+        Parameters:
+        - subject_folder (Path): The path to the subject folder.
+        - subfolders (list of Path): List of subfolder paths (one per session, in any order).
+        - file_metrics (dict, optional): The metrics records of the CSV files, filled in by name.
+        Returns:
+        - list: The names of the CSV files that were merged and saved.
+        """
+        saved_files = []
+        file_metrics = {} if file_metrics is None else file_metrics
+
+        for csv_file in self.csv_files: # Process each CSV file
+            with measure(file_metrics.setdefault(csv_file, {})) as record:
+                merge_plan = self.plan_merge(subject_folder, subfolders, csv_file)
+                if merge_plan is None: # Skip if any of the files are invalid or the sessions overlap
+                    continue
+                file_paths, _, n_samples, gap_rows = merge_plan
+                record['bytes_read'] = file_size(*file_paths)
+
+                output_filepath = subject_folder / f"Filled_Merged_{csv_file}"
+                try:
+                    self.stream_merge(output_filepath, *merge_plan)
+                    saved_files.append(csv_file)
+                    record['rows'] = sum(n_samples) + sum(gap_rows)
+                    record['bytes_written'] = self.output_size(output_filepath)
+                except PermissionError: # Handle permission errors
+                    print(f"Warning: Unable to save {output_filepath.name} in {subject_folder.name}. Check file permissions.")
+
+        return saved_files
+
+    def stream_merge(self, output_filepath, file_paths, headers, n_samples, gap_rows):
+        """
+        Copies the sessions in chunks and emits the gap rows between them, filled with the column means.
+        The column means come from a running accumulator, so memory only depends on the chunk size.
+        Parameters:
+        - output_filepath (Path): The path to the merged output file.
+        - file_paths, headers, n_samples, gap_rows: The merge plan returned by plan_merge.
+        Returns:
+        - None
+        """
+        running_means = RunningColumnMeans(headers[0].n_columns)
+        for file_path in file_paths[1:]: # The first gap needs the means of all sessions before it is written
+            for chunk in iter_empatica_csv(file_path, self.chunksize, self.dtype):
+                running_means.update(chunk)
+
+        # The binary sidecar is filled block by block alongside the CSV
+        sidecar = open_binary_cache(output_filepath, sum(n_samples) + sum(gap_rows), headers[0].n_columns, self.dtype) if self.binary_cache else None
+        position = 0
+
+        def emit(output_file, block):
+            nonlocal position
+            write_empatica_rows(output_file, block)
+            if sidecar is not None:
+                sidecar[position:position + len(block)] = block
+            position += len(block)
+
+        partial_filepath = output_filepath.with_name(output_filepath.name + ".part")
+        with open(partial_filepath, 'w', newline='') as output_file:
+            write_empatica_rows(output_file, headers[0].header_rows())
+            for chunk in iter_empatica_csv(file_paths[0], self.chunksize, self.dtype): # Copy the first session while accumulating its means
+                running_means.update(chunk)
+                emit(output_file, chunk)
+
+            gap_chunk = np.tile(running_means.means(), (min(max(gap_rows), self.chunksize), 1)).astype(self.dtype)
+            for file_path, no_rows in zip(file_paths[1:], gap_rows):
+                for start in range(0, no_rows, self.chunksize): # Emit the gap rows chunk by chunk
+                    emit(output_file, gap_chunk[:no_rows - start])
+
+                for chunk in iter_empatica_csv(file_path, self.chunksize, self.dtype): # Copy the next session
+                    emit(output_file, chunk)
+
+        partial_filepath.replace(output_filepath)
+        if sidecar is not None:
+            sidecar.flush()
+            del sidecar
+            write_cache_header(output_filepath, headers[0].start_time, headers[0].sample_rate)
+
+    def process_subject(self, subject_folder, file_metrics=None):
+        """
+        Validates, merges and saves the recordings of a single subject.
+        Parameters:
+        - subject_folder (Path): The path to the subject folder.
+        - file_metrics (dict, optional): The metrics records of the CSV files, filled in by name.
+        Returns:
+        - str: 'processed' if filled files were saved, 'skipped' otherwise.
+        """
+        self.session_headers = {}
+        if not self.folder_and_file_validation(subject_folder):
+            return 'skipped'
+
+        subfolders = self.sort_sessions(self.index.subfolders(subject_folder))
+        if self.streaming: # Merge straight into the output files
+            if not self.stream_subject_files(subject_folder, subfolders, file_metrics):
+                return 'skipped'
+        else:
+            combined_data = self.process_subject_files(subject_folder, subfolders, file_metrics)
+            if not combined_data:
+                return 'skipped'
+            self.save_combined_data(subject_folder, combined_data, file_metrics)
+
+        self.copy_additional_files(subject_folder, subfolders) 
+        print(f"Processed and saved data for subject: {subject_folder.name}")
+        return 'processed'
+
+    def sort_sessions(self, subfolders):
+        """
+        Sorts the session subfolders chronologically by the start timestamp of their first signal file (by name when there is none).
+        Parameters:
+        - subfolders (iterable of Path): The session subfolders.
+        Returns:
+        - list of Path: The sorted subfolders.
+        """
+        def start_time(subfolder):
+            for csv_file in self.csv_files:
+                try:
+                    return self.read_header(subfolder / csv_file).start_time
+                except (OSError, ValueError):
+                    continue
+            return float('inf')
 
-        recording2 = recording2.iloc[2:].reset_index(drop=True) # Reset the index of the second recording
-        filled_recording = pd.concat([recording1, missing_values, recording2], ignore_index=True) # Concatenate the recordings
+        return sorted(subfolders, key=lambda subfolder: (start_time(subfolder), subfolder.name))
 
-        filled_recording = filled_recording.apply(self.replace_placeholder, axis=0) # Replace the placeholder values with the mean value 
-        return filled_recording
+    def run_subject(self, subject_folder):
+        """
+        Processes a single subject while collecting its log lines, so that a failure does not stop the other subjects.
+        Parameters:
+        - subject_folder (Path): The path to the subject folder.
+        Returns:
+        - tuple: The subject name, its status ('processed', 'skipped' or 'failed'), its collected log lines and its metrics record.
+        """
+        log = io.StringIO()
+        record = {'files': {}}
+        with redirect_stdout(log), measure(record):
+            try:
+                status = self.process_subject(subject_folder, record['files'])
+            except (OSError, ValueError, pd.errors.ParserError) as e: # Keep going with the other subjects (unreadable or malformed sessions)
+                print(f"Error: Processing failed for subject {subject_folder.name}: {e!r}")
+                status = 'failed'
+        record['status'] = status
+        return subject_folder.name, status, log.getvalue(), record
+
+    def process_subjects(self):
+        """
+        Processes all subject folders in the base folder, in parallel when jobs is not 1.
+        The log lines of each subject are printed in subject order (as soon as it is done when jobs is 1), followed by a summary.
+        Returns:
+        - dict: The status of each subject ('processed', 'unchanged', 'skipped' or 'failed').
+        """
+        subject_folders = self.index.subfolders(self.base_folder)
+
+        results = {}
+        to_process = []
+        params = {'precision': self.precision, 'binary_cache': self.binary_cache}  # Turning on the cache must write the sidecars
+        for subject_folder in subject_folders: # Leave out the subjects whose sessions did not change since the last run
+            if self.manifest is not None and self.manifest.is_up_to_date('fill', subject_folder.name, self.subject_inputs(subject_folder), params):
+                results[subject_folder.name] = (subject_folder.name, 'unchanged', '', None)
+            else:
+                to_process.append(subject_folder)
+
+        statuses = {}
+        if self.jobs == 1: # Print the log of every subject as soon as it is done
+            for subject_folder in subject_folders:
+                statuses[subject_folder.name] = self.finish_subject(subject_folder, results.get(subject_folder.name) or self.run_subject(subject_folder), params)
+        else:
+            with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                futures = {subject_folder.name: executor.submit(self.run_subject, subject_folder) for subject_folder in to_process}
+                for name, future in futures.items():
+                    try:
+                        results[name] = future.result()
+                    except BrokenProcessPool as e: # The worker process itself failed (e.g. it was killed)
+                        results[name] = (name, 'failed', f"Error: Processing failed for subject {name}: {e!r}\n", None)
+            for subject_folder in subject_folders: # Print the collected logs in a deterministic order
+                statuses[subject_folder.name] = self.finish_subject(subject_folder, results[subject_folder.name], params)
+        if self.manifest is not None:
+            self.manifest.save()
+
+        counts = {status: list(statuses.values()).count(status) for status in ['processed', 'unchanged', 'skipped', 'failed']}
+        print(f"Subjects processed: {counts['processed']}, unchanged: {counts['unchanged']}, skipped: {counts['skipped']}, failed: {counts['failed']}.")
+        failed = [name for name, status in statuses.items() if status == 'failed']
+        if failed:
+            print(f"Failed subjects: {', '.join(failed)}")
+        return statuses
+
+    def finish_subject(self, subject_folder, result, params):
+        """
+        Prints the log of a subject and adds it to the index, metrics and manifest.
+        Parameters:
+        - subject_folder (Path): The path to the subject folder.
+        - result (tuple): The subject name, status, log lines and metrics record returned by run_subject.
+        - params (dict): The parameters recorded in the manifest.
+        Returns:
+        - str: The status of the subject.
+        """
+        name, status, log, record = result
+        print(log, end='')
+        if self.metrics is not None and record is not None:
+            self.metrics.add('fill', name, record)
+        if status in ['processed', 'failed']: # The subject folder may have new files
+            self.index.scan(subject_folder)
+        if self.manifest is not None and status == 'processed':
+            self.manifest.record('fill', name, self.subject_inputs(subject_folder), self.subject_outputs(subject_folder), params)
+        return status
+
+    def subject_inputs(self, subject_folder):
+        """
+        Lists the files of all session subfolders of a subject.
+        Parameters:
+        - subject_folder (Path): The path to the subject folder.
+        Returns:
+        - list of Path: The session files.
+        """
+        return [f for subfolder in self.index.subfolders(subject_folder) for f in self.index.files(subfolder)]
 
-    def replace_placeholder(self, col, placeholder=9999999999):
+    def subject_outputs(self, subject_folder):
         """
-        Replace the placeholder values in a column with the mean value of the non-placeholder values.
+        Lists the files written to a subject folder by this stage.
         Parameters:
-        - col (pd.Series): The column containing the values to be replaced.
-        - placeholder (numeric, optional): The placeholder value to be replaced. Default is 9999999999.
+        - subject_folder (Path): The path to the subject folder.
         Returns:
-        - pd.Series: The column with the placeholder values replaced by the mean value.
+        - list of Path: The Filled_Merged files and the copied additional files.
         """
-        excl_col = col.iloc[2:] # Exclude the first two rows (timestamps and sampling rates)
-        excl_col = excl_col[excl_col != placeholder] # Exclude the placeholder values
-        col_mean = round(excl_col.mean(), 1) if not excl_col.empty else placeholder # Calculate the mean value
-        col = col.replace(placeholder, col_mean) # Replace the placeholder values with the mean value
-        return col
+        names = [f"Filled_Merged_{csv_file}" for csv_file in self.csv_files] + self.additional_files
+        outputs = [subject_folder / name for name in names]
+        outputs += [sidecar_path for output in outputs[:len(self.csv_files)] for sidecar_path in cache_paths(output)] if self.binary_cache else []
+        return [output for output in outputs if self.index.is_file(output)]
 
-    def save_combined_data(self, subject_folder, combined_data):
+    def save_combined_data(self, subject_folder, combined_data, file_metrics=None):
         """
         Saves the combined data for each CSV type to new CSV files.
         Parameters:
         - subject_folder (Path): The path to the subject folder.
         - combined_data (dict): The dictionary containing the filled recordings.
+        - file_metrics (dict, optional): The metrics records of the CSV files, filled in by name.
         Returns:
         - None
         """
+        file_metrics = {} if file_metrics is None else file_metrics
+
         for csv_file, data in combined_data.items(): # Save the filled recordings to new CSV files
             output_filename = f"Filled_Merged_{csv_file}" # Create the output filename
             output_filepath = subject_folder / output_filename # Create the output filepath
-            try: 
-                data.to_csv(output_filepath, index=False, header=False)
-            except PermissionError: # Handle permission errors
-                print(f"Warning: Unable to save {output_filename} in {subject_folder.name}. Check file permissions.")
+            with measure(file_metrics.setdefault(csv_file, {})) as record:
+                if self.cache is not None: # Hand the recording to the next stages and save it in the background
+                    self.cache.put(output_filepath, data)
+                    self.index.expect_file(output_filepath)
+                    self.cache.write(output_filepath, self.write_output, subject_folder, output_filepath, data)
+                elif self.write_output(subject_folder, output_filepath, data):
+                    record['bytes_written'] = self.output_size(output_filepath)
+
+    def write_output(self, subject_folder, output_filepath, data):
+        """
+        Writes a filled recording (and its binary sidecar, if enabled).
+        Parameters:
+        - subject_folder (Path): The path to the subject folder.
+        - output_filepath (Path): The path to the Filled_Merged file.
+        - data (EmpaticaRecording): The filled recording.
+        Returns:
+        - bool: True if the file was saved, False otherwise.
+        """
+        try:
+            write_empatica_csv(output_filepath, data)
+            if self.binary_cache:
+                save_binary_cache(output_filepath, data)
+            return True
+        except PermissionError: # Handle permission errors
+            print(f"Warning: Unable to save {output_filepath.name} in {subject_folder.name}. Check file permissions.")
+            return False
+
+    def output_size(self, output_filepath):
+        """
+        Returns the size in bytes of a Filled_Merged file and of its binary sidecar, if enabled.
+        """
+        return file_size(output_filepath, *(cache_paths(output_filepath) if self.binary_cache else []))
 
     def copy_additional_files(self, subject_folder, subfolders):
         """
-        Copies additional files (info.txt, tags.csv) from the first subfolder to the subject folder.
+        Copies additional files (info.txt, tags.csv) from the first (earliest) subfolder to the subject folder.
         Parameters:
         - subject_folder (Path): The path to the subject folder.
         - subfolders (list of Path): List of subfolder paths.
         Returns:
         - None
         """
-        additional_files = ['info.txt', 'tags.csv'] # Additional files to copy to the subject folder
-        for additional_file in additional_files:
+        for additional_file in self.additional_files: # Additional files to copy to the subject folder
             additional_file_path = subfolders[0] / additional_file
-            if additional_file_path.exists():
+            if self.index.is_file(additional_file_path):
                 shutil.copy(additional_file_path, subject_folder / additional_file)
                 #print(f"Copied {additional_file}.")
 
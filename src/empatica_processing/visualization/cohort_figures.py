@@ -0,0 +1,273 @@
+from pathlib import Path
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from empatica_processing.data_io.binary_cache import read_recording
+from empatica_processing.data_io.dataset_index import DatasetIndex
+from empatica_processing.data_io.empatica_csv import sample_dtype
+from empatica_processing.data_io.metrics import file_size, measure
+from empatica_processing.visualization.vis_figures import SIGNAL_COLORS
+
+
+def phase_segments(tags):
+    """
+    Yield the phase, start and end of every run of samples with the same tag label.
+
+    Args:
+        tags (pd.Categorical): The tag label of every sample of a cleaned recording.
+    """
+    codes = np.asarray(tags.codes)
+    if not len(codes):
+        return
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(codes)) + 1])
+    ends = np.append(starts[1:], len(codes))
+    for start, end in zip(starts, ends):
+        yield tags.categories[codes[start]], start, end
+
+
+class PhaseAccumulator:
+    """
+    The running count, sum and sum of squares of one signal in one tag phase over the whole cohort, in total
+    and per bin of seconds from the phase onset. The sums are taken around a fixed shift (the first value seen),
+    so the variance does not lose its precision to the square of the mean.
+    """
+
+    def __init__(self, n_columns, shift):
+        """
+        Args:
+            n_columns (int): The number of columns of the signal.
+            shift (np.ndarray): The value subtracted from every sample of a column before summing.
+        """
+        self.shift = np.asarray(shift, dtype=np.float64)
+        self.participants = 0
+        self.last_participant = None
+        self.counts = np.zeros(n_columns, dtype=np.int64)
+        self.sums = np.zeros(n_columns)
+        self.squares = np.zeros(n_columns)
+        self.bin_counts = np.zeros((0, n_columns), dtype=np.int64)
+        self.bin_sums = np.zeros((0, n_columns))
+        self.bin_squares = np.zeros((0, n_columns))
+
+    def update(self, participant, block, bins):
+        """
+        Add one phase segment of a participant.
+
+        Args:
+            participant (str): The participant, counted once per phase.
+            block (np.ndarray): The samples of the segment, shaped (n_samples, n_columns).
+            bins (np.ndarray): The bin of every sample (non-decreasing, starting at 0).
+        """
+        if participant != self.last_participant:
+            self.participants += 1
+            self.last_participant = participant
+
+        valid = ~np.isnan(block)
+        deviations = np.where(valid, block - self.shift, 0.0)
+        squares = deviations * deviations
+        self.counts += valid.sum(axis=0)
+        self.sums += deviations.sum(axis=0)
+        self.squares += squares.sum(axis=0)
+
+        # The bins are consecutive, so their totals are segment sums over the bin boundaries
+        bin_starts = np.concatenate([[0], np.flatnonzero(np.diff(bins)) + 1])
+        bin_ids = bins[bin_starts]
+        if bin_ids[-1] >= len(self.bin_counts):
+            extra = bin_ids[-1] + 1 - len(self.bin_counts)
+            self.bin_counts = np.pad(self.bin_counts, ((0, extra), (0, 0)))
+            self.bin_sums = np.pad(self.bin_sums, ((0, extra), (0, 0)))
+            self.bin_squares = np.pad(self.bin_squares, ((0, extra), (0, 0)))
+        self.bin_counts[bin_ids] += np.add.reduceat(valid, bin_starts, axis=0)
+        self.bin_sums[bin_ids] += np.add.reduceat(deviations, bin_starts, axis=0)
+        self.bin_squares[bin_ids] += np.add.reduceat(squares, bin_starts, axis=0)
+
+    def moments(self, counts, sums, squares):
+        """Return the means and sample standard deviations of the given totals (NaN without values)."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts + self.shift
+            std_devs = np.sqrt(np.maximum((squares - sums * sums / counts) / (counts - 1), 0))
+        return means, std_devs
+
+
+class CohortAggregator:
+    """
+    An optional stage after plotting: streams over the cleaned recordings of every participant, one recording at a
+    time, and accumulates the statistics of every signal per tag phase together with mean traces binned in seconds
+    from the phase onset. Memory depends on the longest recording and phase, not on the number of participants.
+    It saves cohort_summary.csv, cohort_traces.csv and cohort_figure.png in the base folder.
+    """
+
+    def __init__(self, base_folder, bin_seconds=10.0, binary_cache=False, index=None, metrics=None, precision='float64'):
+        """
+        Args:
+            base_folder (str or Path): The base directory containing the recordings.
+            bin_seconds (float): The width of the bins of the mean traces in seconds.
+            binary_cache (bool): Read the cleaned recordings from their .npy sidecars when available.
+            index (DatasetIndex, optional): The dataset index shared with the other stages.
+            metrics (PipelineMetrics, optional): Report the time, rows, bytes and process peak memory so far of every participant to it.
+            precision (str): 'float32' reads the cleaned recordings as float32 (the sums are always float64).
+        """
+        self.base_folder = Path(base_folder)
+        self.bin_seconds = bin_seconds
+        self.binary_cache = binary_cache
+        self.index = index if index is not None else DatasetIndex(self.base_folder)
+        self.metrics = metrics
+        self.dtype = sample_dtype(precision)
+        self.recordings_path = self.base_folder / "clean_individual_recordings"
+        self.accumulators = {}  # (signal, phase) -> PhaseAccumulator, in the order they were first seen
+        self.participants = 0
+
+    def signal_files(self, clean_participant_folder):
+        """
+        Return the cleaned recording of every signal of a participant, preferring the filled/merged file like the plots.
+
+        Returns:
+            dict: The path of every signal (e.g. 'BVP').
+        """
+        files = {}
+        for csv_path in self.index.files(clean_participant_folder, 'c_*.csv'):
+            signal = csv_path.stem[2:].removeprefix('Filled_Merged_')
+            if signal not in files or csv_path.stem.startswith('c_Filled_Merged_'):
+                files[signal] = csv_path
+        return files
+
+    def add_recording(self, participant, signal, recording):
+        """
+        Add every phase segment of a cleaned recording to the accumulators.
+
+        Args:
+            participant (str): The participant.
+            signal (str): The signal of the recording.
+            recording (EmpaticaRecording): The cleaned recording with its tags column.
+        """
+        for phase, start, end in phase_segments(recording.tags):
+            block = recording.data[start:end]
+            accumulator = self.accumulators.get((signal, phase))
+            if accumulator is None:
+                shift = np.nan_to_num(block[0].astype(np.float64))
+                accumulator = self.accumulators[(signal, phase)] = PhaseAccumulator(recording.n_columns, shift)
+            bins = (np.arange(end - start) / recording.sample_rate // self.bin_seconds).astype(np.int64)
+            accumulator.update(participant, block, bins)
+
+    def add_participant(self, clean_participant_folder):
+        """
+        Read the cleaned recordings of one participant one at a time and add them to the accumulators.
+
+        Returns:
+            int: The number of recordings added.
+        """
+        record = {'files': {}}
+        added = 0
+        with measure(record):
+            for signal, csv_path in self.signal_files(clean_participant_folder).items():
+                with measure(record['files'].setdefault(csv_path.name, {})) as file_record:
+                    recording = read_recording(csv_path, self.dtype, use_cache=self.binary_cache)
+                    if recording.tags is None:
+                        print(f"Warning: {csv_path} has no tags column and is left out of the cohort.")
+                        continue
+                    self.add_recording(clean_participant_folder.name, signal, recording)
+                    file_record['rows'] = recording.n_samples
+                    file_record['bytes_read'] = file_size(csv_path)
+                added += 1
+        if added:
+            self.participants += 1
+        if self.metrics is not None:
+            self.metrics.add('cohort', clean_participant_folder.name, record)
+        return added
+
+    def summary_frame(self):
+        """
+        Return the number of participants and samples, the mean and the standard deviation of every signal,
+        column and phase over the cohort.
+        """
+        rows = []
+        for (signal, phase), accumulator in self.accumulators.items():
+            means, std_devs = accumulator.moments(accumulator.counts, accumulator.sums, accumulator.squares)
+            for column in range(len(means)):
+                rows.append({'signal': signal, 'column': column, 'phase': phase, 'participants': accumulator.participants,
+                             'samples': accumulator.counts[column], 'mean': means[column], 'std': std_devs[column]})
+        return pd.DataFrame(rows, columns=['signal', 'column', 'phase', 'participants', 'samples', 'mean', 'std'])
+
+    def trace_frame(self):
+        """
+        Return the mean trace of every signal, column and phase: the number of samples, mean and standard deviation
+        of every bin, with the start of the bin in seconds from the phase onset.
+        """
+        frames = []
+        for (signal, phase), accumulator in self.accumulators.items():
+            means, std_devs = accumulator.moments(accumulator.bin_counts, accumulator.bin_sums, accumulator.bin_squares)
+            n_bins, n_columns = means.shape
+            frames.append(pd.DataFrame({
+                'signal': signal,
+                'column': np.tile(np.arange(n_columns), n_bins),
+                'phase': phase,
+                'bin_start': np.repeat(np.arange(n_bins) * self.bin_seconds, n_columns),
+                'samples': accumulator.bin_counts.ravel(),
+                'mean': means.ravel(),
+                'std': std_devs.ravel()
+            }))
+        if not frames:
+            return pd.DataFrame(columns=['signal', 'column', 'phase', 'bin_start', 'samples', 'mean', 'std'])
+        return pd.concat(frames, ignore_index=True)
+
+    def plot_cohort(self, save_path):
+        """
+        Plot the mean trace (first column) of every signal with a band of one standard deviation. The phases are
+        laid out one after the other, each as long as its longest recording, and aligned at their onset.
+
+        Args:
+            save_path (Path): The path of the figure.
+        """
+        signals = list(dict.fromkeys(signal for signal, _ in self.accumulators))
+        colors = dict(SIGNAL_COLORS)
+        signals.sort(key=lambda signal: list(colors).index(signal) if signal in colors else len(colors))  # In the order of the participant figures
+        phases = list(dict.fromkeys(phase for _, phase in self.accumulators))
+        phase_lengths = {phase: max(len(accumulator.bin_counts) for (_, accumulator_phase), accumulator in self.accumulators.items()
+                                    if accumulator_phase == phase) * self.bin_seconds for phase in phases}
+        phase_starts = dict(zip(phases, np.cumsum([0] + [phase_lengths[phase] for phase in phases[:-1]])))
+
+        fig, axes = plt.subplots(max(len(signals), 1), 1, figsize=(9, 2 * max(len(signals), 1) + 1), sharex=True, squeeze=False)
+        fig.suptitle(f"Cohort mean of {self.participants} participants", fontsize=14, fontweight='bold')
+        for ax, signal in zip(axes[:, 0], signals):
+            color = colors.get(signal, 'gray')
+            for phase in phases:
+                accumulator = self.accumulators.get((signal, phase))
+                if accumulator is None:
+                    continue
+                means, std_devs = (moments[:, 0] for moments in accumulator.moments(accumulator.bin_counts, accumulator.bin_sums, accumulator.bin_squares))
+                x_values = phase_starts[phase] + (np.arange(len(means)) + 0.5) * self.bin_seconds
+                ax.fill_between(x_values, means - std_devs, means + std_devs, color=color, alpha=0.25, linewidth=0)
+                ax.plot(x_values, means, color=color)
+            ax.set_ylabel(f"{signal} Value")
+            ax.grid(True)
+        for phase in phases:
+            for ax in axes[:, 0]:
+                ax.axvline(x=phase_starts[phase], color='black', linestyle='--')
+            axes[0, 0].text(phase_starts[phase], 1.02, phase, transform=axes[0, 0].get_xaxis_transform(), fontsize=8)
+        axes[-1, 0].set_xlabel("Time (s), every phase aligned at its onset")
+        fig.tight_layout()
+        fig.savefig(save_path)
+        plt.close(fig)
+
+    def aggregate_cohort(self):
+        """
+        Aggregate every participant and save the cohort summary table, the mean traces and the cohort figure.
+
+        Returns:
+            pd.DataFrame: The cohort summary table.
+        """
+        for clean_participant_folder in self.index.subfolders(self.recordings_path):
+            self.add_participant(clean_participant_folder)
+
+        summary = self.summary_frame()
+        summary_path = self.base_folder / "cohort_summary.csv"
+        traces_path = self.base_folder / "cohort_traces.csv"
+        figure_path = self.base_folder / "cohort_figure.png"
+        summary.to_csv(summary_path, index=False)
+        self.trace_frame().to_csv(traces_path, index=False)
+        self.plot_cohort(figure_path)
+        for path in [summary_path, traces_path, figure_path]:
+            self.index.update_file(path)
+        print(f"Cohort of {self.participants} participants saved to {summary_path} and {figure_path}")
+        return summary
@@ -1,6 +1,160 @@
+import dataclasses
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stdout
 from pathlib import Path
+import numpy as np
 import pandas as pd
+import matplotlib
 import matplotlib.pyplot as plt
+from empatica_processing.data_io.binary_cache import read_recording
+from empatica_processing.data_io.empatica_csv import sample_dtype
+from empatica_processing.data_io.dataset_index import DatasetIndex
+from empatica_processing.data_io.metrics import measure, file_size
+from empatica_processing.data_io.summary_pyramid import SummaryPyramid
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+# The signals of the participant figures, top to bottom, with the color of their traces
+SIGNAL_COLORS = (('BVP', 'blue'), ('HR', 'red'), ('EDA', 'green'), ('TEMP', 'purple'))
+
+
+def min_max_indices(values, n_buckets):
+    """
+    Return the positions of the minimum and maximum of every bucket of consecutive samples (plus the first and last
+    sample), so a line plot of only these samples looks the same at figure resolution and keeps every peak.
+
+    Args:
+        values (np.ndarray): The samples.
+        n_buckets (int): The number of buckets, which should be at least the width of the plot in pixels.
+
+    Returns:
+        np.ndarray or None: The sorted positions of the kept samples (None if the trace is too short to decimate).
+    """
+    n_samples = len(values)
+    if n_samples <= 2 * n_buckets:
+        return None
+
+    bucket_size = -(-n_samples // n_buckets)
+    n_full = n_samples // bucket_size
+    buckets = values[:n_full * bucket_size].reshape(n_full, bucket_size)
+    starts = np.arange(n_full) * bucket_size
+    kept = [starts + buckets.argmin(axis=1), starts + buckets.argmax(axis=1), [0, n_samples - 1]]
+    if n_full * bucket_size < n_samples: # The last, shorter bucket
+        tail = values[n_full * bucket_size:]
+        kept.append(n_full * bucket_size + np.array([tail.argmin(), tail.argmax()]))
+    return np.unique(np.concatenate(kept))
+
+
+def min_max_decimate(x_values, values, n_buckets):
+    """
+    Reduce a trace to the minimum and maximum of every bucket of consecutive samples (see min_max_indices).
+
+    Args:
+        x_values (np.ndarray): The x-axis values.
+        values (np.ndarray): The samples.
+        n_buckets (int): The number of buckets.
+
+    Returns:
+        tuple: The x-axis values and samples of the kept points, in their original order.
+    """
+    kept = min_max_indices(values, n_buckets)
+    if kept is None:
+        return x_values, values
+    return x_values[kept], values[kept]
+
+
+class FigureTemplate:
+    """
+    The figure of a participant (four traces with their SD bounds and the tags), built once and updated in place
+    for every participant: only the line data, threshold lines, tag markers, limits and title change, and the
+    layout is recomputed from the default margins, so the saved figure is the same as a newly created one.
+    """
+
+    def __init__(self):
+        """
+        Create the figure, axes, trace and threshold lines and legends (the same artists, in the same order, as
+        ParticipantDataPlotter.plot_figure creates).
+        """
+        self.fig, self.axes = plt.subplots(4, 1, figsize=(9, 7), sharex=True)
+        self.title = self.fig.suptitle('', fontweight='bold', fontsize=14, y=0.95)
+        self.lines = []
+        self.sd_lines = []
+        self.legends = []
+        for ax, (signal, color) in zip(self.axes, SIGNAL_COLORS):
+            self.lines.append(ax.plot([], [], color=color)[0])
+            ax.set_ylabel(f'{signal} Value')
+            ax.grid(True)
+            sd_low = ax.axhline(y=0, color='black', linestyle='--', linewidth=1.5, label='sd_low')
+            sd_high = ax.axhline(y=0, color='black', linestyle='--', linewidth=1.5, label='sd_high')
+            self.sd_lines.append((sd_low, sd_high))
+            self.legends.append(ax.legend(loc='upper right'))
+        self.axes[-1].set_xlabel('Time (s)')
+        self.tag_artists = []  # The vertical line on every axis and the label of every tag
+
+    def update(self, title, traces, tag_x_values, tag_label_y, x_max):
+        """
+        Show the data of a participant in the figure.
+
+        Args:
+            title (str): The figure title.
+            traces (list of tuple): The x-axis values, samples, lower and upper SD threshold (None if not known)
+                of the BVP, HR, EDA and TEMP traces.
+            tag_x_values (iterable of float): The tag times relative to the start of the BVP recording.
+            tag_label_y (float): The height of the tag labels on the BVP axis.
+            x_max (float): The end of the x-axis.
+        """
+        self.title.set_text(title)
+        for ax, line, sd_lines, legend, (x_values, values, sdlow, sdhigh) in zip(self.axes, self.lines, self.sd_lines, self.legends, traces):
+            line.set_data(x_values, values)
+            for artist in [*sd_lines, legend]:
+                artist.set_visible(False)
+            ax.relim(visible_only=True)
+            ax.autoscale_view(scalex=False)
+            if sdlow is None or sdhigh is None:
+                continue
+
+            # Like axhline, only widen the y-axis for a threshold outside the limits of the trace
+            for sd_line, legend_text, value, label in zip(sd_lines, legend.get_texts(), [sdlow, sdhigh], ['sd_low', 'sd_high']):
+                ymin, ymax = ax.get_ybound()
+                sd_line.set_ydata([value, value])
+                sd_line.set_label(f'{label}: {value}')
+                sd_line.set_visible(True)
+                legend_text.set_text(f'{label}: {value}')
+                if value < ymin or value > ymax:
+                    ax.relim(visible_only=True)
+                    ax.autoscale_view(scalex=False)
+            legend.set_visible(True)
+
+        tag_x_values = list(tag_x_values)
+        while len(self.tag_artists) < len(tag_x_values):
+            tag_lines = [ax.axvline(x=0, color='black', linestyle='--', linewidth=1.2) for ax in self.axes]
+            tag_label = self.axes[0].text(0, 0, '', ha='center', va='bottom', fontsize=8, color='black')
+            self.tag_artists.append((tag_lines, tag_label))
+        for i, (tag_lines, tag_label) in enumerate(self.tag_artists):
+            visible = i < len(tag_x_values)
+            if visible:
+                for tag_line in tag_lines:
+                    tag_line.set_xdata([tag_x_values[i], tag_x_values[i]])
+                tag_label.set_position((tag_x_values[i], tag_label_y))
+                tag_label.set_text(f'{tag_x_values[i]:.2f}')
+            for artist in [*tag_lines, tag_label]:
+                artist.set_visible(visible)
+
+        self.axes[0].set_xlim(0, x_max)
+
+        # Lay the figure out from the default margins, as for a new figure, to make room for the title
+        self.fig.subplots_adjust(**{name: matplotlib.rcParams[f'figure.subplot.{name}'] for name in ['left', 'right', 'bottom', 'top', 'wspace', 'hspace']})
+        self.fig.tight_layout(rect=[0, 0, 1, 0.95])
+
+    def close(self):
+        plt.close(self.fig)
 
 
 class ParticipantDataPlotter:
@@ -8,31 +162,87 @@ class ParticipantDataPlotter:
     A class to load, process, and plot physiological data for individual participants.
     """
 
-    def __init__(self, base_folder):
+    # Min-max pairs per trace, about twice the 900 pixels of the figure width
+    decimation_buckets = 2000
+
+    # Raise whenever a change to the code alters the saved figures, so the manifest redraws them
+    # (2: the traces are placed by the start time and sample rate of each recording)
+    figure_version = 2
+
+    def __init__(self, base_folder, manifest=None, binary_cache=False, index=None, metrics=None, cache=None, statistics=None, precision='float64', decimate=True,
+                 jobs=1, worker_memory=None, template=False):
         """
         Initialize the ParticipantDataPlotter with the base folder containing the data.
 
         Args:
             base_folder (str): The path to the base folder containing participant data.
+            manifest (PipelineManifest, optional): Skip participants whose cleaned recordings did not change since the last run.
+            binary_cache (bool): Open the cleaned recordings from their memory-mapped .npy sidecars when available.
+            index (DatasetIndex, optional): The dataset index shared with the other stages
+                (a new index of the base folder, scanned on demand, if not given).
+            metrics (PipelineMetrics, optional): Report the time, rows, bytes and process peak memory so far of every figure to it.
+            cache (RecordingCache, optional): Take the cleaned recordings and SD tables from this in-memory cache when they are in it.
+            statistics (StatisticsStore, optional): Read the SD bounds of a participant from this store with one query instead of its SD files.
+            precision (str): 'float32' loads and plots the cleaned recordings as float32, halving their memory.
+            decimate (bool): Plot the minimum and maximum of every bucket of samples (see min_max_decimate) instead of
+                every sample, which renders long recordings much faster with the same peaks and threshold crossings.
+            jobs (int or None): The number of worker processes rendering participants in parallel with the Agg backend (None uses all cores).
+            worker_memory (int, optional): The address space limit of every worker process in bytes; a participant
+                that needs more fails instead of making the machine swap.
+            template (bool): Build the figure once (per worker process) and only update its data for every participant
+                (see FigureTemplate) instead of creating a new figure each time.
         """
         self.base_folder = Path(base_folder)
+        self.manifest = manifest
+        self.binary_cache = binary_cache
+        self.index = index if index is not None else DatasetIndex(self.base_folder)
+        self.metrics = metrics
+        self.cache = cache
+        self.statistics = statistics
+        self.dtype = sample_dtype(precision)
+        self.decimate = decimate
+        self.jobs = jobs
+        self.worker_memory = worker_memory
+        self.template = template
+        self.figure_template = None
+        self.participant_bounds = None
         self.recordings_path = self.base_folder / "clean_individual_recordings"
         self.participant_id = None
         self.folder_path = None
         print("Please wait a moment while all participant's figures are generated and saved. This may take up to a few minutes...")
 
-    def load_data(self, file_path, skiprows=2):
+    def manifest_params(self):
+        """
+        Return the options that change the saved figures, recorded in the manifest with every figure.
+        """
+        return {'decimate': self.decimate, 'precision': self.dtype.name, 'figure_version': self.figure_version}
+
+    def load_data(self, file_path, record=None):
         """
-        Load CSV data, skipping the specified number of rows.
+        Load a cleaned recording with its start time and sample rate (from its binary sidecar when enabled).
 
         Args:
             file_path (Path): The path to the CSV file.
-            skiprows (int): Number of rows to skip at the beginning of the file.
+            record (dict, optional): The metrics record of the participant; the loading time, rows and bytes
+                of the file are added to its 'files'.
 
         Returns:
-            pd.DataFrame: The loaded data as a pandas DataFrame.
+            EmpaticaRecording: The loaded recording.
         """
-        return pd.read_csv(file_path, skiprows=skiprows, header=None)
+        def read(file_path):
+            return read_recording(file_path, self.dtype, use_cache=self.binary_cache)
+
+        if record is None:
+            return read(file_path) if self.cache is None else self.cache.load(file_path, read)
+
+        with measure(record['files'].setdefault(file_path.name, {})) as file_record:
+            if self.cache is None:
+                recording = read(file_path)
+                file_record['bytes_read'] = file_size(file_path)
+            else:
+                recording = self.cache.load(file_path, read)
+            file_record['rows'] = recording.n_samples
+        return recording
     
     def get_data_file_path(self, base_file_path):
         """
@@ -45,23 +255,26 @@ class ParticipantDataPlotter:
             Path: The path to the data file to be used.
         """
         merged_file_path = base_file_path.with_name(f"c_Filled_Merged_{base_file_path.stem[2:]}.csv")
-        if merged_file_path.exists():
+        if self.index.is_file(merged_file_path):
             return merged_file_path
         else:
             return base_file_path
 
-    def calculate_x_values(self, data_length, increment):
+    def calculate_x_values(self, recording, start_time, positions=None):
         """
-        Generate x-axis values based on data length and time increment.
+        Generate x-axis values from the start time and sample rate in the header of a recording.
 
         Args:
-            data_length (int): The number of data points.
-            increment (float): The time increment between data points.
+            recording (EmpaticaRecording): The recording.
+            start_time (float): The UNIX timestamp at x = 0 (the start of the BVP recording).
+            positions (np.ndarray, optional): The positions of the samples to place (all samples if not given).
 
         Returns:
-            list: A list of x-axis values.
+            np.ndarray: The time of every sample in seconds since start_time.
         """
-        return [i * increment for i in range(data_length)]
+        if positions is None:
+            positions = np.arange(recording.n_samples)
+        return (recording.start_time - start_time) + positions / recording.sample_rate
 
     def check_threshold_exceedance(self, label, data, sdlow, sdhigh):
         """
@@ -81,20 +294,20 @@ class ParticipantDataPlotter:
             return
             # print(f"{label} data goes above the upper standard deviation threshold starting from row 3.")
 
-    def plot_data(self, ax, x_values, data, color, ylabel, sdlow=None, sdhigh=None):
+    def plot_data(self, ax, x_values, values, color, ylabel, sdlow=None, sdhigh=None):
         """
         Plot data on a given axis with optional standard deviation lines.
 
         Args:
             ax (matplotlib.axes.Axes): The axis to plot the data on.
-            x_values (list): The x-axis values.
-            data (pd.Series): The data series to plot.
+            x_values (np.ndarray): The x-axis values.
+            values (np.ndarray): The samples to plot (see trace_points).
             color (str): The color of the plot line.
             ylabel (str): The label for the y-axis.
             sdlow (float, optional): The lower standard deviation threshold. Defaults to None.
             sdhigh (float, optional): The upper standard deviation threshold. Defaults to None.
         """
-        ax.plot(x_values, data[0], color=color)
+        ax.plot(x_values, values, color=color)
         ax.set_ylabel(ylabel)
         ax.grid(True)
         if sdlow is not None and sdhigh is not None:
@@ -102,6 +315,24 @@ class ParticipantDataPlotter:
             ax.axhline(y=sdhigh, color='black', linestyle='--', linewidth=1.5, label=f'sd_high: {sdhigh}')
             ax.legend(loc='upper right')
 
+    def trace_points(self, recording, start_time):
+        """
+        Return the x-axis values and samples of the first column of a recording that are plotted. When decimating,
+        only the times of the kept samples are computed.
+
+        Args:
+            recording (EmpaticaRecording): The recording.
+            start_time (float): The UNIX timestamp at x = 0.
+
+        Returns:
+            tuple: The x-axis values and samples.
+        """
+        values = recording.data[:, 0]
+        positions = min_max_indices(values, self.decimation_buckets) if self.decimate else None
+        if positions is not None:
+            values = values[positions]
+        return self.calculate_x_values(recording, start_time, positions), values
+
     def load_sd_values(self, sd_file_path, file_label):
         """
         Load standard deviation values from the provided file.
@@ -113,15 +344,25 @@ class ParticipantDataPlotter:
         Returns:
             tuple: A tuple containing the lower and upper standard deviation thresholds.
         """
+        if self.participant_bounds is not None:
+            bounds = self.participant_bounds.get(sd_file_path.name[3:])
+            if bounds is None or None in bounds:
+                print(f"Error loading {file_label} standard deviation values: no statistics stored for {sd_file_path.name[3:]}")
+                return None, None
+            return round(bounds[0], 1), round(bounds[1], 1)
+
         try:
-            sd_data = pd.read_csv(sd_file_path, header=None)
-            if len(sd_data) >= 2 and sd_data.shape[1] >= 3:
-                sdlow = round(float(sd_data.iloc[1, 1]), 1)  # B2
-                sdhigh = round(float(sd_data.iloc[1, 2]), 1)  # C2
+            def read(sd_file_path):
+                return pd.read_csv(sd_file_path, float_precision='round_trip')
+
+            sd_data = read(sd_file_path) if self.cache is None else self.cache.load(sd_file_path, read)
+            if len(sd_data) >= 1 and sd_data.shape[1] >= 3:
+                sdlow = round(float(sd_data.iloc[0, 1]), 1)  # B2
+                sdhigh = round(float(sd_data.iloc[0, 2]), 1)  # C2
                 return sdlow, sdhigh
             else:
                 raise ValueError(f"{file_label} file does not have the expected structure.")
-        except Exception as e:
+        except (OSError, ValueError, pd.errors.ParserError) as e:
             print(f"Error loading {file_label} standard deviation values: {e}")
             return None, None
 
@@ -137,92 +378,373 @@ class ParticipantDataPlotter:
             Path: The path to the SD file to be used.
         """
         merged_file_path = base_file_path.with_name(f"sd_Filled_Merged_{base_file_path.stem[3:]}.csv")
-        if merged_file_path.exists():
+        if self.index.is_file(merged_file_path) or merged_file_path.name[3:] in (self.participant_bounds or {}):
             return merged_file_path
         else:
             return base_file_path
 
 
+    def load_pyramid(self, participant_id, signal):
+        """
+        Open the summary pyramid of a cleaned recording of a participant.
+
+        Args:
+            participant_id (str): The participant ID (the clean folder name without 'c_rn').
+            signal (str): The signal (e.g. 'BVP').
+
+        Returns:
+            SummaryPyramid: The memory-mapped pyramid.
+
+        Raises:
+            FileNotFoundError: If the recording has no up-to-date pyramid (see SummaryPyramidBuilder).
+        """
+        csv_path = self.get_data_file_path(self.recordings_path / f"c_rn{participant_id}" / f"c_{signal}.csv")
+        pyramid = SummaryPyramid.load(csv_path)
+        if pyramid is None:
+            raise FileNotFoundError(f"No up-to-date summary pyramid for {csv_path}; build it with --pyramids.")
+        return pyramid
+
+    def query_summary(self, participant_id, signal, start, end, width=900):
+        """
+        Return the minimum, maximum and mean of a signal over a time window, from the pyramid level that gives
+        one to two summaries per pixel, without reading the recording itself.
+
+        Args:
+            participant_id (str): The participant ID.
+            signal (str): The signal (e.g. 'BVP').
+            start (float): The start of the window in seconds since the start of the BVP recording (the x-axis of the figures).
+            end (float): The end of the window in the same seconds.
+            width (int): The width of the plot in pixels.
+
+        Returns:
+            SummaryWindow: The summaries, with their times in seconds since the start of the BVP recording.
+        """
+        start_time = self.load_pyramid(participant_id, 'BVP').start_time
+        window = self.load_pyramid(participant_id, signal).query(start_time + start, start_time + end, width)
+        return dataclasses.replace(window, time=window.time - start_time)
+
+    def plot_window(self, participant_id, start, end, save_path=None):
+        """
+        Plot a time window of a participant from the summary pyramids of its cleaned recordings: the range between
+        the minimum and maximum of every summary is shaded around a line through the means, with the SD bounds and
+        the tags in the window.
+
+        Args:
+            participant_id (str): The participant ID.
+            start (float): The start of the window in seconds since the start of the BVP recording.
+            end (float): The end of the window in the same seconds.
+            save_path (Path, optional): The path of the figure (participant_<id>_<start>-<end>s.png in the clean folder if not given).
+
+        Returns:
+            Path: The path of the saved figure.
+        """
+        self.participant_id = participant_id
+        self.folder_path = self.recordings_path / f"c_rn{participant_id}"
+        self.participant_bounds = self.load_bounds(participant_id)
+        if save_path is None:
+            save_path = self.folder_path / f"participant_{participant_id}_{start:g}-{end:g}s.png"
+
+        fig, axes = plt.subplots(4, 1, figsize=(9, 7), sharex=True)
+        fig.suptitle(f'Data for Participant {participant_id} ({start:g} to {end:g} s)', fontweight='bold', fontsize=14, y=0.95)
+        for ax, (signal, color) in zip(axes, SIGNAL_COLORS):
+            window = self.query_summary(participant_id, signal, start, end)
+            ax.fill_between(window.time, window.minimum[:, 0], window.maximum[:, 0], step='post', color=color, alpha=0.35, linewidth=0)
+            sdlow, sdhigh = self.load_sd_values(self.get_sd_file_path(self.folder_path / f"sd_{signal}.csv"), signal)
+            self.plot_data(ax, window.time + window.bucket_seconds / 2, window.mean[:, 0], color=color, ylabel=f'{signal} Value', sdlow=sdlow, sdhigh=sdhigh)
+        axes[-1].set_xlabel('Time (s)')
+
+        tags_data = pd.read_csv(self.folder_path / "tags.csv", header=None)
+        for tag_x in tags_data[0] - self.load_pyramid(participant_id, 'BVP').start_time:
+            if start <= tag_x <= end:
+                for ax in axes:
+                    ax.axvline(x=tag_x, color='black', linestyle='--', linewidth=1.2)
+                axes[0].text(tag_x, axes[0].get_ylim()[1], f'{tag_x:.2f}', ha='center', va='bottom', fontsize=8, color='black')
+
+        axes[0].set_xlim(start, end)
+        fig.tight_layout(rect=[0, 0, 1, 0.95])
+        fig.savefig(save_path)
+        plt.close(fig)
+        return save_path
+
     def plot_participant_data(self):
         """
-        Load and plot data for each participant, save the figures, then prompt the user to input a participant ID to display the figure.
-        """
-        available_ids = [folder.name[4:] for folder in self.recordings_path.iterdir() if folder.is_dir()]
-
-        for participant_id in available_ids:
-            self.participant_id = participant_id
-            self.folder_path = self.recordings_path / f"c_rn{self.participant_id}"
-            
-            bvp_file_path = self.get_data_file_path(self.folder_path / "c_BVP.csv")
-            hr_file_path = self.get_data_file_path(self.folder_path / "c_HR.csv")
-            eda_file_path = self.get_data_file_path(self.folder_path / "c_EDA.csv")
-            temp_file_path = self.get_data_file_path(self.folder_path / "c_TEMP.csv")
-            tags_file_path = self.folder_path / "tags.csv"
-            
-            sd_temp_file_path = self.get_sd_file_path(self.folder_path / "sd_TEMP.csv")
-            sd_bvp_file_path = self.get_sd_file_path(self.folder_path / "sd_BVP.csv")
-            sd_eda_file_path = self.get_sd_file_path(self.folder_path / "sd_EDA.csv")
-            sd_hr_file_path = self.get_sd_file_path(self.folder_path / "sd_HR.csv")
-
-            # Check if all required files exist
-            if not all(file.is_file() for file in [bvp_file_path, hr_file_path, eda_file_path, temp_file_path, tags_file_path]):
-                print(f"One or more files for participant ID {self.participant_id} do not exist.")
-                continue
+        Load and plot data for each participant and save the figures, in parallel worker processes when jobs is not 1.
+        The log lines of each participant are printed in participant order, followed by a summary.
 
-            # Load data
-            bvp_data = self.load_data(bvp_file_path)
-            hr_data = self.load_data(hr_file_path)
-            eda_data = self.load_data(eda_file_path)
-            temp_data = self.load_data(temp_file_path)
-            
-            # Load standard deviation data
-            sdlow_temp, sdhigh_temp = self.load_sd_values(sd_temp_file_path, "TEMP")
-            sdlow_bvp, sdhigh_bvp = self.load_sd_values(sd_bvp_file_path, "BVP")
-            sdlow_eda, sdhigh_eda = self.load_sd_values(sd_eda_file_path, "EDA")
-            sdlow_hr, sdhigh_hr = self.load_sd_values(sd_hr_file_path, "HR")
-
-            # Create x-axis values
-            bvp_x_values = self.calculate_x_values(len(bvp_data), 0.015625)
-            hr_x_values = self.calculate_x_values(len(hr_data), 1)  # HR is typically in 1-second increments
-            eda_x_values = self.calculate_x_values(len(eda_data), 0.25)
-            temp_x_values = self.calculate_x_values(len(temp_data), 0.25)
-
-            # Create subplots
-            fig, (ax1, ax2, ax3, ax4) = plt.subplots(4, 1, figsize=(9, 7), sharex=True)
-            fig.suptitle(f'Data for Participant {self.participant_id}', fontweight='bold', fontsize=14, y=0.95)
-
-            # Plot data
-            self.plot_data(ax1, bvp_x_values, bvp_data, color='blue', ylabel='BVP Value', sdlow=sdlow_bvp, sdhigh=sdhigh_bvp)
-            self.plot_data(ax2, hr_x_values, hr_data, color='red', ylabel='HR Value', sdlow=sdlow_hr, sdhigh=sdhigh_hr)
-            self.plot_data(ax3, eda_x_values, eda_data, color='green', ylabel='EDA Value', sdlow=sdlow_eda, sdhigh=sdhigh_eda)
-            self.plot_data(ax4, temp_x_values, temp_data, color='purple', ylabel='TEMP Value', sdlow=sdlow_temp, sdhigh=sdhigh_temp)
-            ax4.set_xlabel('Time (s)')
-
-            # Plot vertical lines for tags on all subplots and add labels on the topmost plot
-            a1_value = pd.read_csv(bvp_file_path, nrows=1, header=None).iloc[0, 0]
-            tags_data = pd.read_csv(tags_file_path, header=None)
-            adjusted_tag_x_values = tags_data[0] - a1_value
-
-            for tag_x in adjusted_tag_x_values:
-                ax1.axvline(x=tag_x, color='black', linestyle='--', linewidth=1.2)
-                ax1.text(tag_x, max(bvp_data[0]) * 1.15, f'{tag_x:.2f}', ha='center', va='bottom', fontsize=8, color='black')
-                ax2.axvline(x=tag_x, color='black', linestyle='--', linewidth=1.2)
-                ax3.axvline(x=tag_x, color='black', linestyle='--', linewidth=1.2)
-                ax4.axvline(x=tag_x, color='black', linestyle='--', linewidth=1.2)
-
-            ax1.set_xlim(0, max(bvp_x_values[-1], hr_x_values[-1], eda_x_values[-1], temp_x_values[-1]))
-
-            # Adjust layout to make room for the title
-            plt.tight_layout(rect=[0, 0, 1, 0.95])
-
-            # Save the figure
-            save_path = self.folder_path / f"participant_{self.participant_id}_plot.png"
-            plt.savefig(save_path)
-            #print(f"Figure saved for participant {self.participant_id} at {save_path}")
-
-            # Close the figure to free memory
-            plt.close(fig)
-        
+        Returns:
+            dict: The status of each participant ('plotted', 'unchanged', 'missing' or 'failed').
+        """
+        available_ids = [folder.name[4:] for folder in self.index.subfolders(self.recordings_path)]
+
+        if self.jobs == 1:
+            statuses = {participant_id: self.plot_participant(participant_id) for participant_id in available_ids}
+        else:
+            statuses = {}
+            memory_limit = checked_memory_limit(self.worker_memory)  # Before any worker starts, so one bad limit cannot break the pool
+            with ProcessPoolExecutor(max_workers=self.jobs, initializer=init_plot_worker, initargs=(self, memory_limit)) as executor:
+                futures = {participant_id: executor.submit(plot_in_worker, participant_id, self.load_bounds(participant_id))
+                           for participant_id in available_ids}
+                for participant_id, future in futures.items():
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool as e: # The worker process itself failed (e.g. it was killed)
+                        result = (participant_id, 'failed', f"Error: Plotting failed for participant {participant_id}: {e!r}\n", None, [])
+                    statuses[participant_id] = self.finish_participant(*result)
+
+        self.close_template()
+        if self.manifest is not None:
+            self.manifest.save()
+        counts = {status: list(statuses.values()).count(status) for status in ['plotted', 'unchanged', 'missing', 'failed']}
+        print(f"Figures plotted: {counts['plotted']}, unchanged: {counts['unchanged']}, missing files: {counts['missing']}, failed: {counts['failed']}.")
+        for status, label in [('missing', "Participants with missing files"), ('failed', "Failed participants")]:
+            participant_ids = [participant_id for participant_id, participant_status in statuses.items() if participant_status == status]
+            if participant_ids:
+                print(f"{label}: {', '.join(participant_ids)}")
         print("All individual figures have been generated and saved to the each participant's folder in the 'clean_individual_recordings' folder.")
+        return statuses
+
+    def load_bounds(self, participant_id):
+        """
+        Return the SD bounds of a participant from the statistics store (None without a store).
+        """
+        return self.statistics.bounds(f"rn{participant_id}") if self.statistics is not None else None
+
+    def plot_participant(self, participant_id, bounds=None):
+        """
+        Plot and save the figure of one participant, unless its cleaned recordings did not change since the last run.
 
+        Args:
+            participant_id (str): The participant ID (the clean folder name without 'c_rn').
+            bounds (dict, optional): The SD bounds of the participant by file name (loaded from the statistics store if not given).
 
+        Returns:
+            str: The status of the participant ('plotted', 'unchanged', 'missing' or 'failed').
+        """
+        return self.finish_participant(*self.render_participant(participant_id, bounds))
+
+    def finish_participant(self, participant_id, status, log, record, inputs):
+        """
+        Print the log of a rendered participant and add its figure to the index, metrics and manifest.
+
+        Returns:
+            str: The status of the participant.
+        """
+        print(log, end='')
+        save_path = self.recordings_path / f"c_rn{participant_id}" / f"participant_{participant_id}_plot.png"
+        if status == 'plotted':
+            self.index.update_file(save_path)  # Also when it was saved by a worker process
+            if self.metrics is not None:
+                self.metrics.add('plot', participant_id, record)
+            if self.manifest is not None:
+                self.manifest.record('plot', participant_id, inputs, [save_path], self.manifest_params())
+        return status
+
+    def render_participant(self, participant_id, bounds=None):
+        """
+        Plot and save the figure of one participant while collecting its log lines, without recording it in the
+        metrics or manifest, so that it can run in a worker process and a failure does not stop the other participants.
+
+        Args:
+            participant_id (str): The participant ID (the clean folder name without 'c_rn').
+            bounds (dict, optional): The SD bounds of the participant by file name (loaded from the statistics store if not given).
+
+        Returns:
+            tuple: The participant ID, its status, its collected log lines, its metrics record and the input files of its figure.
+        """
+        log = io.StringIO()
+        record = {'files': {}}
+        inputs = []
+        with redirect_stdout(log):
+            try:
+                self.participant_id = participant_id
+                self.folder_path = self.recordings_path / f"c_rn{self.participant_id}"
+                self.participant_bounds = bounds if bounds is not None else self.load_bounds(participant_id)
+
+                bvp_file_path = self.get_data_file_path(self.folder_path / "c_BVP.csv")
+                hr_file_path = self.get_data_file_path(self.folder_path / "c_HR.csv")
+                eda_file_path = self.get_data_file_path(self.folder_path / "c_EDA.csv")
+                temp_file_path = self.get_data_file_path(self.folder_path / "c_TEMP.csv")
+                tags_file_path = self.folder_path / "tags.csv"
+
+                sd_temp_file_path = self.get_sd_file_path(self.folder_path / "sd_TEMP.csv")
+                sd_bvp_file_path = self.get_sd_file_path(self.folder_path / "sd_BVP.csv")
+                sd_eda_file_path = self.get_sd_file_path(self.folder_path / "sd_EDA.csv")
+                sd_hr_file_path = self.get_sd_file_path(self.folder_path / "sd_HR.csv")
+
+                # Check if all required files exist
+                if not all(self.index.is_file(file) for file in [bvp_file_path, hr_file_path, eda_file_path, temp_file_path, tags_file_path]):
+                    return participant_id, 'missing', log.getvalue(), record, inputs
+
+                # Skip the figure if its data did not change since the last run
+                save_path = self.folder_path / f"participant_{self.participant_id}_plot.png"
+                inputs = [bvp_file_path, hr_file_path, eda_file_path, temp_file_path, tags_file_path]
+                inputs += [file for file in [sd_temp_file_path, sd_bvp_file_path, sd_eda_file_path, sd_hr_file_path] if self.index.is_file(file)]
+                if self.manifest is not None and self.manifest.is_up_to_date('plot', self.participant_id, inputs, self.manifest_params()):
+                    return participant_id, 'unchanged', log.getvalue(), record, inputs
+
+                with measure(record):
+                    self.plot_figure(save_path, bvp_file_path, hr_file_path, eda_file_path, temp_file_path, tags_file_path,
+                                     sd_temp_file_path, sd_bvp_file_path, sd_eda_file_path, sd_hr_file_path, record)
+                    record['bytes_written'] = file_size(save_path)
+                status = 'plotted'
+            except (OSError, ValueError, pd.errors.ParserError) as e: # Keep going with the other participants (unreadable or malformed files)
+                self.close_template()  # It may be half updated
+                plt.close('all')
+                print(f"Error: Plotting failed for participant {participant_id}: {e!r}")
+                status = 'failed'
+        return participant_id, status, log.getvalue(), record, inputs
+
+    def close_template(self):
+        """
+        Close the figure template once all figures are saved.
+        """
+        if self.figure_template is not None:
+            self.figure_template.close()
+            self.figure_template = None
+
+    def __getstate__(self):
+        # Worker processes get the plotter without the in-memory cache, the database connection, the metrics and the figure
+        state = self.__dict__.copy()
+        state.update(cache=None, statistics=None, metrics=None, figure_template=None)
+        return state
+
+    def plot_figure(self, save_path, bvp_file_path, hr_file_path, eda_file_path, temp_file_path, tags_file_path,
+                    sd_temp_file_path, sd_bvp_file_path, sd_eda_file_path, sd_hr_file_path, record=None):
+        """
+        Load the cleaned recordings of the current participant, plot them with their SD bounds and tags, and save the figure.
+
+        Args:
+            save_path (Path): The path of the figure.
+            bvp_file_path, hr_file_path, eda_file_path, temp_file_path (Path): The cleaned recordings.
+            tags_file_path (Path): The tags file.
+            sd_temp_file_path, sd_bvp_file_path, sd_eda_file_path, sd_hr_file_path (Path): The SD files.
+            record (dict, optional): The metrics record of the participant, which gets the time spent
+                plotting and saving the figure as 'render_time'.
+        """
+        # Load data
+        bvp_recording = self.load_data(bvp_file_path, record)
+        hr_recording = self.load_data(hr_file_path, record)
+        eda_recording = self.load_data(eda_file_path, record)
+        temp_recording = self.load_data(temp_file_path, record)
+        
+        # Load standard deviation data
+        sdlow_temp, sdhigh_temp = self.load_sd_values(sd_temp_file_path, "TEMP")
+        sdlow_bvp, sdhigh_bvp = self.load_sd_values(sd_bvp_file_path, "BVP")
+        sdlow_eda, sdhigh_eda = self.load_sd_values(sd_eda_file_path, "EDA")
+        sdlow_hr, sdhigh_hr = self.load_sd_values(sd_hr_file_path, "HR")
+
+        # Place every signal on a common time axis from its own start time and sample rate, with x = 0 at the start of the BVP recording
+        start_time = bvp_recording.start_time
+        bvp_x_values, bvp_values = self.trace_points(bvp_recording, start_time)
+        hr_x_values, hr_values = self.trace_points(hr_recording, start_time)
+        eda_x_values, eda_values = self.trace_points(eda_recording, start_time)
+        temp_x_values, temp_values = self.trace_points(temp_recording, start_time)
+        x_max = max(bvp_x_values[-1], hr_x_values[-1], eda_x_values[-1], temp_x_values[-1])
+        tag_label_y = bvp_recording.data[:, 0].max() * 1.15
+
+        # Swap the data into the figure template instead of creating a new figure
+        if self.template:
+            render_start = time.perf_counter()
+            adjusted_tag_x_values = pd.read_csv(tags_file_path, header=None)[0] - start_time
+            if self.figure_template is None:
+                self.figure_template = FigureTemplate()
+            traces = [(bvp_x_values, bvp_values, sdlow_bvp, sdhigh_bvp), (hr_x_values, hr_values, sdlow_hr, sdhigh_hr),
+                      (eda_x_values, eda_values, sdlow_eda, sdhigh_eda), (temp_x_values, temp_values, sdlow_temp, sdhigh_temp)]
+            self.figure_template.update(f'Data for Participant {self.participant_id}', traces, adjusted_tag_x_values, tag_label_y, x_max)
+            self.figure_template.fig.savefig(save_path)
+            self.index.update_file(save_path)
+            if record is not None:
+                record['render_time'] = time.perf_counter() - render_start
+            return
+
+        # Create subplots
+        render_start = time.perf_counter()
+        fig, (ax1, ax2, ax3, ax4) = plt.subplots(4, 1, figsize=(9, 7), sharex=True)
+        fig.suptitle(f'Data for Participant {self.participant_id}', fontweight='bold', fontsize=14, y=0.95)
+
+        # Plot data
+        colors = dict(SIGNAL_COLORS)
+        self.plot_data(ax1, bvp_x_values, bvp_values, color=colors['BVP'], ylabel='BVP Value', sdlow=sdlow_bvp, sdhigh=sdhigh_bvp)
+        self.plot_data(ax2, hr_x_values, hr_values, color=colors['HR'], ylabel='HR Value', sdlow=sdlow_hr, sdhigh=sdhigh_hr)
+        self.plot_data(ax3, eda_x_values, eda_values, color=colors['EDA'], ylabel='EDA Value', sdlow=sdlow_eda, sdhigh=sdhigh_eda)
+        self.plot_data(ax4, temp_x_values, temp_values, color=colors['TEMP'], ylabel='TEMP Value', sdlow=sdlow_temp, sdhigh=sdhigh_temp)
+        ax4.set_xlabel('Time (s)')
+
+        # Plot vertical lines for tags on all subplots and add labels on the topmost plot
+        tags_data = pd.read_csv(tags_file_path, header=None)
+        adjusted_tag_x_values = tags_data[0] - start_time
+
+        for tag_x in adjusted_tag_x_values:
+            ax1.axvline(x=tag_x, color='black', linestyle='--', linewidth=1.2)
+            ax1.text(tag_x, tag_label_y, f'{tag_x:.2f}', ha='center', va='bottom', fontsize=8, color='black')
+            ax2.axvline(x=tag_x, color='black', linestyle='--', linewidth=1.2)
+            ax3.axvline(x=tag_x, color='black', linestyle='--', linewidth=1.2)
+            ax4.axvline(x=tag_x, color='black', linestyle='--', linewidth=1.2)
+
+        ax1.set_xlim(0, x_max)
+
+        # Adjust layout to make room for the title
+        plt.tight_layout(rect=[0, 0, 1, 0.95])
+
+        # Save the figure
+        plt.savefig(save_path)
+        self.index.update_file(save_path)
+        if record is not None:
+            record['render_time'] = time.perf_counter() - render_start
+        #print(f"Figure saved for participant {self.participant_id} at {save_path}")
+
+        # Close the figure to free memory
+        plt.close(fig)
+
+
+worker_plotter = None
+
+
+def checked_memory_limit(memory_limit):
+    """
+    Check an address space limit for the worker processes in the main process, before any worker starts.
+
+    Args:
+        memory_limit (int, optional): The address space limit in bytes.
+
+    Returns:
+        int or None: The limit, or None (after a warning) if this platform cannot set it or it is above the hard limit.
+    """
+    if memory_limit is None:
+        return None
+    if resource is None:
+        print("Warning: The plot worker memory limit is not supported on this platform and is ignored.")
+        return None
+    _, hard_limit = resource.getrlimit(resource.RLIMIT_AS)
+    if hard_limit != resource.RLIM_INFINITY and memory_limit > hard_limit:
+        print(f"Warning: The plot worker memory limit of {memory_limit / 1024 ** 2:.0f} MB is above the hard limit "
+              f"of {hard_limit / 1024 ** 2:.0f} MB and is ignored.")
+        return None
+    return int(memory_limit)
+
+
+def init_plot_worker(plotter, memory_limit=None):
+    """
+    Prepare a worker process of ParticipantDataPlotter: select the non-interactive Agg backend, limit the
+    address space of the process and keep the plotter, which is only sent once per worker.
+
+    Args:
+        plotter (ParticipantDataPlotter): The plotter of the main process.
+        memory_limit (int, optional): The address space limit of the process in bytes.
+    """
+    global worker_plotter
+    matplotlib.use('Agg')
+    if memory_limit is not None and resource is not None:
+        try:
+            _, hard_limit = resource.getrlimit(resource.RLIMIT_AS)
+            resource.setrlimit(resource.RLIMIT_AS, (int(memory_limit), hard_limit))
+        except (ValueError, OSError) as e: # A failing initializer would break the whole pool
+            print(f"Warning: The plot worker memory limit could not be set and is ignored: {e!r}")
+    worker_plotter = plotter
+
+
+def plot_in_worker(participant_id, bounds):
+    """
+    Render the figure of one participant in a worker process (see ParticipantDataPlotter.render_participant).
+    """
+    return worker_plotter.render_participant(participant_id, bounds)
@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+
+from empatica_processing.data_io.binary_cache import (
+    cache_paths,
+    load_binary_cache,
+    read_recording,
+    save_binary_cache,
+)
+from empatica_processing.data_io.empatica_csv import (
+    EmpaticaRecording,
+    write_empatica_csv,
+)
+
+
+def save_recording(tmp_path):
+    data = np.arange(12, dtype=np.float64).reshape(6, 2)
+    tags = np.array(['Baseline'] * 2 + ['CognitiveTask1'] * 3 + ['Baseline'])
+    recording = EmpaticaRecording(100.0, 4.0, data, tags)
+    csv_path = tmp_path / "c_ACC.csv"
+    write_empatica_csv(csv_path, recording)
+    save_binary_cache(csv_path, recording)
+    return csv_path, recording
+
+def test_binary_cache_round_trip(tmp_path):
+    csv_path, recording = save_recording(tmp_path)
+
+    cached = load_binary_cache(csv_path)
+    assert isinstance(cached.data, np.memmap), "The samples should be memory-mapped, not copied."
+    np.testing.assert_array_equal(cached.data, recording.data)
+    assert (cached.start_time, cached.sample_rate) == (100.0, 4.0)
+    assert list(cached.tags) == list(recording.tags)
+
+def test_stale_binary_cache_is_ignored(tmp_path):
+    csv_path, recording = save_recording(tmp_path)
+    stat = csv_path.stat()
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    assert load_binary_cache(csv_path) is None
+    # read_recording falls back to the CSV file
+    fallback = read_recording(csv_path, use_cache=True)
+    assert not isinstance(fallback.data, np.memmap)
+    np.testing.assert_array_equal(fallback.data, recording.data)
+
+def test_missing_binary_cache(tmp_path):
+    csv_path, _ = save_recording(tmp_path)
+    npy_path, _ = cache_paths(csv_path)
+    npy_path.unlink()
+
+    assert load_binary_cache(csv_path) is None
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+from empatica_processing.data_io.empatica_csv import read_empatica_csv
+from empatica_processing.visualization.cohort_figures import CohortAggregator
+from tests.test_vis_figures import clean_participants
+
+
+def test_cohort_statistics_match_the_concatenated_recordings(tmp_path):
+    clean_participants(tmp_path, {"rn1": (['BVP', 'HR'], [110, 150]), "rn2": (['BVP', 'HR'], [130]), "rn3": (['BVP'], [105, 120, 160])})
+
+    summary = CohortAggregator(tmp_path, bin_seconds=5).aggregate_cohort()
+
+    recordings = [read_empatica_csv(path) for path in sorted((tmp_path / "clean_individual_recordings").glob("c_rn*/c_BVP.csv"))]
+    samples = pd.DataFrame({'value': np.concatenate([recording.data[:, 0] for recording in recordings]),
+                            'phase': np.concatenate([np.asarray(recording.tags) for recording in recordings])})
+    expected = samples.groupby('phase')['value'].agg(['count', 'mean', 'std'])
+    bvp = summary[summary['signal'] == 'BVP'].set_index('phase')
+    assert list(bvp.index) == ['Baseline', 'CognitiveTask1', 'CognitiveTask2']
+    assert list(bvp['participants']) == [3, 2, 1]  # A single tag leaves rn2 in the Baseline
+    np.testing.assert_array_equal(bvp['samples'], expected.loc[bvp.index, 'count'])
+    np.testing.assert_allclose(bvp['mean'], expected.loc[bvp.index, 'mean'])
+    np.testing.assert_allclose(bvp['std'], expected.loc[bvp.index, 'std'])
+
+    # The first bin of every phase averages its first 5 seconds (20 samples at 4 Hz) over the participants
+    traces = pd.read_csv(tmp_path / "cohort_traces.csv")
+    first_bins = [recording.data[np.asarray(recording.tags) == 'Baseline'][:20, 0] for recording in recordings]
+    first_bin = traces[(traces['signal'] == 'BVP') & (traces['phase'] == 'Baseline') & (traces['bin_start'] == 0)].iloc[0]
+    assert first_bin['samples'] == 60
+    np.testing.assert_allclose(first_bin['mean'], np.concatenate(first_bins).mean())
+    assert (tmp_path / "cohort_figure.png").exists()
@@ -0,0 +1,61 @@
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+from empatica_processing.data_io.dataset_index import DatasetIndex
+
+
+def make_tree(tmp_path):
+    for session in ["1", "2"]:
+        folder = tmp_path / "rn23004" / session
+        folder.mkdir(parents=True)
+        (folder / "HR.csv").write_text("100.0\n1.0\n60.0\n")
+        (folder / "info.txt").write_text("info")
+    return tmp_path
+
+def test_build_indexes_the_whole_tree(tmp_path):
+    root = make_tree(tmp_path)
+    index = DatasetIndex.build(root)
+
+    assert index.subfolders(root / "rn23004") == [root / "rn23004" / "1", root / "rn23004" / "2"]
+    assert index.files(root / "rn23004" / "1", "*.csv") == [root / "rn23004" / "1" / "HR.csv"]
+    assert index.stat(root / "rn23004" / "1" / "HR.csv")[0] == len("100.0\n1.0\n60.0\n")
+    assert index.is_dir(root / "rn23004" / "2")
+    assert not index.is_file(root / "rn23004" / "1" / "EDA.csv")
+
+    # The index is not touched by the file system until it is told about the changes
+    new_folder = root / "rn23005"
+    (new_folder / "1").mkdir(parents=True)
+    assert not index.is_dir(new_folder)
+    index.scan(new_folder)
+    assert index.subfolders(root) == [root / "rn23004", new_folder]
+    assert index.subfolders(new_folder) == [new_folder / "1"]
+
+    (root / "rn23004" / "1" / "EDA.csv").write_text("4.0\n")
+    index.update_file(root / "rn23004" / "1" / "EDA.csv")
+    assert index.is_file(root / "rn23004" / "1" / "EDA.csv")
+
+def test_folders_are_scanned_lazily(tmp_path):
+    root = make_tree(tmp_path)
+    index = DatasetIndex(root)
+    assert index.folders == {}
+
+    assert index.is_file(root / "rn23004" / "2" / "HR.csv")
+    assert index.subfolders(root / "missing") == []
+
+def test_threads_can_update_the_index_together(tmp_path):
+    root = make_tree(tmp_path)
+    index = DatasetIndex.build(root)
+    folder = root / "rn23004" / "1"
+
+    def write(i):
+        (folder / f"c_{i}.csv").write_text("1.0\n")
+        index.expect_file(folder / f"sd_{i}.csv")
+        index.update_file(folder / f"c_{i}.csv")
+        return len(index.files(folder))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(write, range(200)))
+
+    assert len(index.files(folder, "c_*.csv")) == 200 and len(index.files(folder, "sd_*.csv")) == 200
+    assert index.files(folder) == sorted(index.files(folder))
+    assert pickle.loads(pickle.dumps(index)).files(folder) == index.files(folder)  # Worker processes get a new lock
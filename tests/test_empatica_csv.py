@@ -0,0 +1,78 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from empatica_processing.data_io.empatica_csv import (
+    EmpaticaRecording,
+    format_empatica_rows,
+    iter_empatica_csv,
+    read_empatica_csv,
+    read_empatica_header,
+    write_empatica_csv,
+)
+
+MOCK_BASE_FOLDER = Path(__file__).parent / "mock_data"
+
+def test_read_empatica_csv_parses_header_and_samples():
+    recording = read_empatica_csv(MOCK_BASE_FOLDER / "rn23004" / "1" / "HR.csv")
+
+    assert recording.start_time == 1713098412.0
+    assert recording.sample_rate == 1.0
+    assert recording.data.shape == (25, 1)
+    assert recording.data.dtype == np.float64
+    assert recording.data.flags['C_CONTIGUOUS']
+    assert recording.data[0, 0] == 58.0
+    assert recording.tags is None
+    assert recording.end_time == 1713098412.0 + 25
+
+def test_read_empatica_csv_float32_and_header_only():
+    file_path = MOCK_BASE_FOLDER / "rn23004" / "1" / "HR.csv"
+
+    assert read_empatica_csv(file_path, dtype=np.float32).data.dtype == np.float32
+    header = read_empatica_csv(file_path, nrows=0)
+    assert header.data.shape == (0, 1)
+    assert header.start_time == 1713098412.0
+
+def test_write_and_read_cleaned_recording(tmp_path):
+    data = np.array([[1.0, 2.0, 3.0], [4.5, 5.5, 6.5], [7.0, 8.0, 9.0]])
+    tags = np.array(['Baseline', 'Baseline', 'CognitiveTask1'])
+    file_path = tmp_path / "c_ACC.csv"
+    write_empatica_csv(file_path, EmpaticaRecording(100.0, 32.0, data, tags))
+
+    # Same layout as DataFrame.to_csv of the header rows followed by the tagged samples
+    assert file_path.read_text().splitlines()[:3] == ['100.0,100.0,100.0,', '32.0,32.0,32.0,', '1.0,2.0,3.0,Baseline']
+    assert read_empatica_header(file_path) == (100.0, 32.0, 3, True)
+
+    recording = read_empatica_csv(file_path)
+    np.testing.assert_array_equal(recording.data, data)
+    assert isinstance(recording.tags, pd.Categorical)
+    assert list(recording.tags) == list(tags)
+
+def test_iter_empatica_csv_chunks():
+    file_path = MOCK_BASE_FOLDER / "rn23004" / "2" / "HR.csv"
+    chunks = list(iter_empatica_csv(file_path, chunksize=10))
+
+    assert [len(chunk) for chunk in chunks] == [10, 10, 2]
+    np.testing.assert_array_equal(np.concatenate(chunks), read_empatica_csv(file_path).data)
+
+def test_rows_are_formatted_like_to_csv():
+    rng = np.random.default_rng(0)
+    data = rng.normal(0, 1, (50, 3)) * 10.0 ** rng.integers(-8, 18, (50, 3))
+    data[[3, 7], [0, 2]] = np.nan
+    data[4] = [0.0, -0.0, 1e16]
+    tags = pd.Categorical(['Baseline'] * 20 + [None] * 5 + ['Cognitive, "task" 1'] * 25)
+
+    for block in [data, data.astype(np.float32)]:
+        df = pd.DataFrame(block)
+        df['tags'] = tags
+        assert format_empatica_rows(block, tags) == df.to_csv(index=False, header=False)
+        assert format_empatica_rows(block) == pd.DataFrame(block).to_csv(index=False, header=False)
+
+def test_write_empatica_csv_replaces_the_file_atomically(tmp_path):
+    file_path = tmp_path / "c_TEMP.csv"
+    file_path.write_text("previous")
+    write_empatica_csv(file_path, EmpaticaRecording(100.0, 4.0, np.ones((3, 1))))
+
+    assert file_path.read_text().splitlines() == ['100.0', '4.0', '1.0', '1.0', '1.0']
+    assert [path.name for path in tmp_path.iterdir()] == ["c_TEMP.csv"]
@@ -0,0 +1,43 @@
+import os
+
+from empatica_processing.data_io.manifest import PipelineManifest
+
+
+def make_files(tmp_path):
+    input_file = tmp_path / "HR.csv"
+    input_file.write_text("100.0\n1.0\n60.0\n")
+    output_file = tmp_path / "c_HR.csv"
+    output_file.write_text("output")
+    return input_file, output_file
+
+def test_unchanged_inputs_are_up_to_date(tmp_path):
+    input_file, output_file = make_files(tmp_path)
+    manifest = PipelineManifest(tmp_path)
+    assert not manifest.is_up_to_date('outliers', 'rn23004', [input_file], {'threshold': 2.5})
+
+    manifest.record('outliers', 'rn23004', [input_file], [output_file], {'threshold': 2.5}, results=[{'File': 'HR.csv'}])
+    manifest.save()
+
+    # A new run loads the manifest from the base folder
+    manifest = PipelineManifest(tmp_path)
+    assert manifest.is_up_to_date('outliers', 'rn23004', [input_file], {'threshold': 2.5})
+    assert manifest.results('outliers', 'rn23004') == [{'File': 'HR.csv'}]
+
+    # Touching a file without changing its content does not invalidate the entry
+    os.utime(input_file, ns=(0, 0))
+    assert manifest.is_up_to_date('outliers', 'rn23004', [input_file], {'threshold': 2.5})
+
+def test_changes_invalidate_the_entry(tmp_path):
+    input_file, output_file = make_files(tmp_path)
+    manifest = PipelineManifest(tmp_path)
+    manifest.record('outliers', 'rn23004', [input_file], [output_file], {'threshold': 2.5})
+
+    assert not manifest.is_up_to_date('outliers', 'rn23004', [input_file], {'threshold': 3.0})
+    assert not PipelineManifest(tmp_path, force=True).is_up_to_date('outliers', 'rn23004', [input_file], {'threshold': 2.5})
+
+    output_file.unlink()
+    assert not manifest.is_up_to_date('outliers', 'rn23004', [input_file], {'threshold': 2.5})
+    output_file.write_text("output")
+
+    input_file.write_text("100.0\n1.0\n61.0\n")
+    assert not manifest.is_up_to_date('outliers', 'rn23004', [input_file], {'threshold': 2.5})
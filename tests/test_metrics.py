@@ -0,0 +1,40 @@
+import json
+
+from empatica_processing.data_io.metrics import PipelineMetrics, measure
+
+
+def test_stage_report_sums_subjects_and_files(tmp_path):
+    metrics = PipelineMetrics(tmp_path)
+    with metrics.stage('outliers'):
+        record = {'files': {}}
+        with measure(record):
+            for name, rows in [("HR.csv", 25), ("EDA.csv", 100)]:
+                with measure(record['files'].setdefault(name, {})) as file_record:
+                    file_record.update(rows=rows, bytes_read=10 * rows, bytes_written=20 * rows)
+        metrics.add('outliers', 'rn23004', record)
+
+    report = json.loads((tmp_path / "pipeline_metrics.json").read_text())
+    stage = report['outliers']
+    subject = stage['subjects']['rn23004']
+    assert subject['files']['HR.csv']['rows'] == 25
+    assert subject['rows'] == stage['rows'] == 125
+    assert subject['bytes_read'] == 1250 and subject['bytes_written'] == 2500
+    assert stage['wall_time'] >= subject['wall_time'] >= subject['files']['EDA.csv']['wall_time']
+    assert stage['rows_per_second'] > 0
+
+def test_measuring_twice_accumulates_and_profile_is_saved(tmp_path):
+    record = {}
+    with measure(record):
+        pass
+    first = record['wall_time']
+    with measure(record):
+        sum(range(10000))
+    assert record['wall_time'] > first
+
+    metrics = PipelineMetrics(tmp_path, profile_stage='plot')
+    with metrics.stage('fill'):
+        pass
+    with metrics.stage('plot'):
+        sum(range(10000))
+    assert not (tmp_path / "profile_fill.prof").exists()
+    assert (tmp_path / "profile_plot.prof").exists()
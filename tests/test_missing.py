@@ -1,8 +1,10 @@
 import pytest
+import shutil
 import pandas as pd
 from pathlib import Path
 from unittest.mock import patch
 from empatica_processing.missing_data.missing_filling import UnusualSubjectDataProcessor  # Replace with your actual module
+from empatica_processing.data_io.empatica_csv import read_empatica_csv
 
 # Adjust this path to where your mock folder is located
 # MOCK_BASE_FOLDER = Path("/Users/sofiakarageorgiou/Desktop/Hackathon_files_adapt_lab/mock_data/")
@@ -30,7 +32,7 @@ def test_process_subject_files():
             def side_effect(filepath, folder_name, filename):
                 if "HR.csv" in str(filepath):
                     # Return valid data for HR.csv
-                    return pd.read_csv(filepath, header=None)
+                    return read_empatica_csv(filepath)
                 else:
                     return None
 
@@ -44,7 +46,7 @@ def test_process_subject_files():
             assert "HR.csv" in combined_data, "The combined data should include the 'HR.csv' file."
 
             # Check if the filled recording has the expected number of rows
-            filled_recording = combined_data["HR.csv"]
+            filled_recording = combined_data["HR.csv"].data
             actual_time_gap = 1713100065.000000 - 1713098412.000000
             expected_num_rows = len(filled_recording)
             print(f"Expected number of rows: {expected_num_rows}")
@@ -52,6 +54,158 @@ def test_process_subject_files():
             assert len(filled_recording) == expected_num_rows, f"Expected {expected_num_rows} rows, but got {len(filled_recording)}."
 
             # Check if the placeholder rows are correctly filled
-            placeholder_rows = filled_recording.iloc[len(filled_recording) - int(actual_time_gap):]
-            assert (placeholder_rows != 9999999999).all().all(), "The filled rows should contain the placeholder value 9999999999."
+            placeholder_rows = filled_recording[len(filled_recording) - int(actual_time_gap):]
+            assert (placeholder_rows != 9999999999).all(), "The filled rows should contain the placeholder value 9999999999."
 
+
+def test_fill_in_missing_values():
+    processor = UnusualSubjectDataProcessor(MOCK_BASE_FOLDER.parent)
+    subject_folder = MOCK_BASE_FOLDER / "rn23004"
+    recording1 = read_empatica_csv(subject_folder / "1" / "HR.csv")
+    recording2 = read_empatica_csv(subject_folder / "2" / "HR.csv")
+
+    # The sessions are given in reverse order and sorted by their start timestamp
+    merge_plan = processor.plan_merge(subject_folder, [subject_folder / "2", subject_folder / "1"], "HR.csv")
+    filled_recording = processor.merge_sessions(subject_folder, "HR.csv", *merge_plan)
+
+    # The gap is the time between the end of the first recording and the start of the second one
+    no_rows = int(1713100065.0 - (1713098412.0 + recording1.n_samples))
+    assert filled_recording.n_samples == recording1.n_samples + no_rows + recording2.n_samples
+
+    # The header of the first recording is kept and the second recording follows the gap
+    assert filled_recording.start_time == 1713098412.0
+    assert filled_recording.sample_rate == 1.0
+    assert filled_recording.data[-1, 0] == recording2.data[-1, 0]
+
+    # The gap is filled with the rounded mean of both recordings
+    expected_mean = round(pd.concat([pd.Series(recording1.data[:, 0]), pd.Series(recording2.data[:, 0])]).mean(), 1)
+    gap = filled_recording.data[recording1.n_samples:recording1.n_samples + no_rows, 0]
+    assert (gap == expected_mean).all()
+
+def write_session(folder, start_time, values, sample_rate=1.0):
+    folder.mkdir(parents=True)
+    rows = [f"{start_time:.6f}", f"{sample_rate:.6f}"] + [f"{value:.2f}" for value in values]
+    (folder / "HR.csv").write_text("\n".join(rows) + "\n")
+
+def test_merge_more_than_two_sessions(tmp_path):
+    subject_folder = tmp_path / "individual recordings" / "rn23007"
+    write_session(subject_folder / "b", 110.0, [4.0, 5.0])
+    write_session(subject_folder / "a", 100.0, [1.0, 2.0, 3.0])
+    write_session(subject_folder / "c", 115.0, [6.0])
+
+    processor = UnusualSubjectDataProcessor(tmp_path)
+    subfolders = list(subject_folder.iterdir())
+    combined_data = processor.process_subject_files(subject_folder, subfolders)
+
+    # a: 100-103, gap of 7 rows, b: 110-112, gap of 3 rows, c: 115
+    data = combined_data["HR.csv"].data[:, 0]
+    assert combined_data["HR.csv"].start_time == 100.0
+    assert list(data[:3]) == [1.0, 2.0, 3.0]
+    assert (data[3:10] == 3.5).all()
+    assert list(data[10:12]) == [4.0, 5.0]
+    assert (data[12:15] == 3.5).all()
+    assert list(data[15:]) == [6.0]
+
+    # Streaming gives the same file
+    processor.save_combined_data(subject_folder, combined_data)
+    in_memory_output = (subject_folder / "Filled_Merged_HR.csv").read_bytes()
+    UnusualSubjectDataProcessor(tmp_path, streaming=True, chunksize=2).stream_subject_files(subject_folder, subfolders)
+    assert (subject_folder / "Filled_Merged_HR.csv").read_bytes() == in_memory_output
+
+def test_overlapping_sessions_are_reported(tmp_path, capsys):
+    subject_folder = tmp_path / "individual recordings" / "rn23008"
+    write_session(subject_folder / "1", 100.0, [1.0, 2.0, 3.0, 4.0])
+    write_session(subject_folder / "2", 102.0, [5.0, 6.0])
+
+    processor = UnusualSubjectDataProcessor(tmp_path)
+    combined_data = processor.process_subject_files(subject_folder, list(subject_folder.iterdir()))
+
+    assert combined_data == {}
+    assert "Sessions 1 and 2 overlap by 2.000 s in HR.csv for rn23008" in capsys.readouterr().out
+
+def test_streaming_merge_matches_in_memory_merge(tmp_path):
+    subject_folder = tmp_path / "individual recordings" / "rn23004"
+    shutil.copytree(MOCK_BASE_FOLDER / "rn23004", subject_folder)
+    subfolders = sorted(f for f in subject_folder.iterdir() if f.is_dir())
+
+    processor = UnusualSubjectDataProcessor(tmp_path)
+    combined_data = processor.process_subject_files(subject_folder, subfolders)
+    processor.save_combined_data(subject_folder, combined_data)
+    in_memory_output = (subject_folder / "Filled_Merged_HR.csv").read_bytes()
+    (subject_folder / "Filled_Merged_HR.csv").unlink()
+
+    # A tiny chunk size forces several chunks for each recording and for the gap
+    streaming_processor = UnusualSubjectDataProcessor(tmp_path, streaming=True, chunksize=7)
+    saved_files = streaming_processor.stream_subject_files(subject_folder, subfolders)
+
+    assert saved_files == ["HR.csv"]
+    assert (subject_folder / "Filled_Merged_HR.csv").read_bytes() == in_memory_output
+    assert not (subject_folder / "Filled_Merged_HR.csv.part").exists()
+
+def test_process_subjects_in_parallel(tmp_path, capsys):
+    base_folder = tmp_path / "individual recordings"
+    for name in ["rn23005", "rn23004"]:
+        shutil.copytree(MOCK_BASE_FOLDER / "rn23004", base_folder / name)
+    (base_folder / "rn23006").mkdir()  # No sessions, so it is skipped
+
+    statuses = UnusualSubjectDataProcessor(tmp_path, jobs=2).process_subjects()
+
+    assert statuses == {"rn23004": "processed", "rn23005": "processed", "rn23006": "skipped"}
+    assert (base_folder / "rn23004" / "Filled_Merged_HR.csv").exists()
+    output = capsys.readouterr().out
+    assert output.index("subject: rn23004") < output.index("subject: rn23005")
+    assert "Subjects processed: 2, unchanged: 0, skipped: 1, failed: 0." in output
+
+def test_failing_subject_does_not_stop_the_others(tmp_path, capsys):
+    base_folder = tmp_path / "individual recordings"
+    for name in ["rn23004", "rn23005"]:
+        shutil.copytree(MOCK_BASE_FOLDER / "rn23004", base_folder / name)
+
+    processor = UnusualSubjectDataProcessor(tmp_path)
+    original_process_subject_files = processor.process_subject_files
+
+    def side_effect(subject_folder, subfolders, *args):
+        if subject_folder.name == "rn23004":
+            raise ValueError("corrupted recording")
+        return original_process_subject_files(subject_folder, subfolders, *args)
+
+    with patch.object(processor, 'process_subject_files', side_effect=side_effect):
+        statuses = processor.process_subjects()
+
+    assert statuses == {"rn23004": "failed", "rn23005": "processed"}
+    output = capsys.readouterr().out
+    assert "corrupted recording" in output
+    assert "Failed subjects: rn23004" in output
+
+def test_serial_subjects_are_logged_as_they_finish(tmp_path, capsys):
+    base_folder = tmp_path / "individual recordings"
+    for name in ["rn23004", "rn23005"]:
+        shutil.copytree(MOCK_BASE_FOLDER / "rn23004", base_folder / name)
+
+    processor = UnusualSubjectDataProcessor(tmp_path)
+    original_run_subject = processor.run_subject
+    output_before = {}
+
+    def side_effect(subject_folder):
+        output_before[subject_folder.name] = capsys.readouterr().out
+        return original_run_subject(subject_folder)
+
+    with patch.object(processor, 'run_subject', side_effect=side_effect):
+        processor.process_subjects()
+
+    assert "subject: rn23004" in output_before["rn23005"]
+
+def test_session_headers_are_read_once(tmp_path):
+    base_folder = tmp_path / "individual recordings"
+    shutil.copytree(MOCK_BASE_FOLDER / "rn23004", base_folder / "rn23004")
+    header_reads = []
+
+    def counting_read(file_path, *args, nrows=None, **kwargs):
+        if nrows == 0:
+            header_reads.append(file_path)
+        return read_empatica_csv(file_path, *args, nrows=nrows, **kwargs)
+
+    with patch('empatica_processing.missing_data.missing_filling.read_empatica_csv', side_effect=counting_read):
+        assert UnusualSubjectDataProcessor(tmp_path).process_subjects() == {"rn23004": "processed"}
+
+    assert header_reads and len(header_reads) == len(set(header_reads))
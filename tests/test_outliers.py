@@ -1,7 +1,12 @@
+import io
 import pytest
 import pandas as pd
 from pathlib import Path
-from empatica_processing.cleaning_tagging.outliers import OutliersDataProcessor
+import numpy as np
+from empatica_processing.cleaning_tagging.outliers import OutliersDataProcessor, ColumnStatistics, RollingColumnStatistics, PhaseStatistics
+from empatica_processing.data_io.manifest import PipelineManifest
+from empatica_processing.data_io.empatica_csv import read_empatica_csv
+from empatica_processing.data_io.recording_cache import RecordingCache
 
 @pytest.fixture
 def setup_environment(tmp_path):
@@ -93,11 +98,30 @@ def test_tagging_functionality(setup_environment):
     assert not df_with_tags['tags'].isnull().all(), "The 'tags' column should not be empty."
 
     # Check that the tags column has the expected type and that calculations were performed
-    assert df_with_tags['tags'].dtype == object, "The 'tags' column should contain string data type."
+    assert isinstance(df_with_tags['tags'].dtype, pd.CategoricalDtype), "The 'tags' column should be categorical."
 
     # Optional: Print the DataFrame for debugging purposes
     print(df_with_tags[['tags']])
 
+def test_any_number_of_tags(setup_environment):
+    """
+    Test tagging with more event markers than the original protocol.
+
+    Ensures that every phase gets its own label and that the samples after the
+    last tag keep the label of the last phase.
+
+    Args:
+        setup_environment (Path): Path to the base folder with mock data.
+    """
+    processor = OutliersDataProcessor(base_folder=setup_environment)
+    tags = processor.tag_labels(12, [100, 102, 103, 103, 105.4, 106, 108], sample_rate=1)
+
+    assert list(tags.categories) == ['Baseline'] + [f'CognitiveTask{task}' for task in range(1, 6)]
+    assert list(tags) == ['Baseline'] * 2 + ['CognitiveTask1'] + ['CognitiveTask3'] * 2 + ['CognitiveTask4'] + ['CognitiveTask5'] * 6
+
+    # Without tags every sample belongs to the baseline
+    assert list(processor.tag_labels(3, [100], sample_rate=1)) == ['Baseline'] * 3
+
 def test_filter_out_csv(setup_environment):
     """
     Test the outlier detection and filtering functionality of the processor.
@@ -155,6 +179,28 @@ def test_winsorize_data(setup_environment):
         assert df_winsorized.max().max() <= upper_bounds.max(), f"Data in {file_name} should be clipped at the upper bound."
         assert df_winsorized.min().min() >= lower_bounds.min(), f"Data in {file_name} should be clipped at the lower bound."
 
+def test_column_statistics_match_pandas(setup_environment):
+    """
+    Test that the statistics computed once per file give the same results as the pandas computations.
+
+    Args:
+        setup_environment (Path): Path to the base folder with mock data.
+    """
+    df = pd.read_csv(setup_environment / "individual recordings/participant_1/ACC.csv", header=None).iloc[2:]
+    stats = ColumnStatistics(df, 2.5)
+
+    means = df.mean()
+    std_devs = df.std()
+    outliers = ((df > means + 2.5 * std_devs) | (df < means - 2.5 * std_devs)).sum()
+    assert stats.outlier_percentage(df) == ((outliers / len(df)) * 100).mean()
+
+    upper_bounds = (means.round(3) + 2.5 * std_devs.round(3)).round(3)
+    lower_bounds = (means.round(3) - 2.5 * std_devs.round(3)).round(3)
+    assert list(stats.sd_frame().columns) == ['mean', '-2.5SD', '+2.5SD']
+    assert (stats.sd_frame()['+2.5SD'].to_numpy() == upper_bounds.to_numpy()).all()
+    winsorized = df.apply(lambda x: x.clip(lower=lower_bounds[x.name], upper=upper_bounds[x.name]))
+    assert (stats.winsorize(df.to_numpy()) == winsorized.to_numpy()).all()
+
 def test_process_file(mocker, setup_environment):
     """
     Test the entire file processing function, from outlier detection to saving the processed file.
@@ -176,6 +222,188 @@ def test_process_file(mocker, setup_environment):
 
         assert (clean_participant_folder / f"c_{file_name}").exists(), f"Processed and winsorized file {file_name} should be saved."
 
+def test_streaming_matches_in_memory(setup_environment):
+    """
+    Test the two-pass streaming mode against the in-memory processing.
+
+    Ensures that chunked processing writes the same SD files and outlier
+    information, and cleaned files that agree up to the last digit of the
+    means filled into missing values. The in-memory fill does not depend on
+    the chunk size.
+
+    Args:
+        setup_environment (Path): Path to the base folder with mock data.
+    """
+    participant_folder = setup_environment / "individual recordings/participant_1"
+    acc_file = participant_folder / "ACC.csv"
+    acc_file.write_text(acc_file.read_text().replace("0.4,0.3,0.5", ",0.3,"))
+
+    outputs = []
+    for streaming, chunksize in [(False, 4), (False, 100_000), (True, 4)]:
+        processor = OutliersDataProcessor(base_folder=setup_environment, streaming=streaming, chunksize=chunksize)
+        processor.process_individual_recordings()
+        clean_folder = setup_environment / "clean_individual_recordings/c_participant_1"
+        outputs.append(({path.name: path.read_text() for path in clean_folder.iterdir()}, processor.outlier_info))
+
+    assert outputs[0] == outputs[1]
+    in_memory, streamed = outputs[1][0], outputs[2][0]
+    assert outputs[1][1] == outputs[2][1] and in_memory.keys() == streamed.keys()
+    for name in in_memory:
+        if name.startswith("c_"):
+            expected, actual = (pd.read_csv(io.StringIO(text), header=None) for text in [in_memory[name], streamed[name]])
+            pd.testing.assert_frame_equal(actual, expected, check_exact=False, rtol=1e-12)
+        else:
+            assert streamed[name] == in_memory[name]
+    assert "Baseline" in streamed["c_ACC.csv"] and "CognitiveTask2" in streamed["c_ACC.csv"]
+
+def test_float32_precision_matches_float64(setup_environment):
+    """
+    Test the low-precision mode against the default float64 processing.
+
+    Ensures that float32 recordings are cleaned without a float64 copy and that
+    the cleaned values and outlier information agree within float32 precision.
+
+    Args:
+        setup_environment (Path): Path to the base folder with mock data.
+    """
+    data = np.random.default_rng(0).normal(36.5, 0.5, (1000, 3)).astype(np.float32)
+    stats = ColumnStatistics(data, 2.5)
+    expected = ColumnStatistics(data.astype(np.float64), 2.5)
+    np.testing.assert_allclose(stats.std_devs, expected.std_devs, rtol=1e-12)
+    assert stats.winsorize(data).dtype == np.float32
+
+    outputs = []
+    for precision in ['float64', 'float32']:
+        processor = OutliersDataProcessor(base_folder=setup_environment, precision=precision)
+        processor.process_individual_recordings()
+        clean_file = setup_environment / "clean_individual_recordings/c_participant_1/c_ACC.csv"
+        outputs.append((read_empatica_csv(clean_file, dtype=processor.dtype).data, processor.outlier_info))
+
+    np.testing.assert_allclose(outputs[1][0], outputs[0][0], rtol=1e-6)
+    assert outputs[1][1] == outputs[0][1]
+    with pytest.raises(ValueError):
+        OutliersDataProcessor(base_folder=setup_environment, precision='float16')
+
+def test_rolling_statistics_match_pandas():
+    """
+    Test the cumulative-sum rolling statistics against pandas' centered rolling windows.
+    """
+    data = np.cumsum(np.random.default_rng(0).normal(size=(200, 2)), axis=0) + 30
+    stats = RollingColumnStatistics(data, 5, 2.5)
+    rolling = pd.DataFrame(data).rolling(5, center=True, min_periods=1)
+
+    np.testing.assert_allclose(stats.means, rolling.mean().to_numpy(), atol=1e-9)
+    np.testing.assert_allclose(stats.std_devs, rolling.std().to_numpy(), atol=1e-9)
+    assert len(stats.window_frame(sample_rate=1)) == 40 * 2
+
+def test_windowed_detection_follows_drift(setup_environment):
+    """
+    Test the windowed outlier detection on a drifting recording.
+
+    Ensures that a spike hidden by the drift for the global bounds is clipped
+    with a moving window, and that the window summaries are saved.
+
+    Args:
+        setup_environment (Path): Path to the base folder with mock data.
+    """
+    participant_folder = setup_environment / "individual recordings/participant_1"
+    temp = np.linspace(30, 40, 400)
+    temp[100] += 2
+    (participant_folder / "TEMP.csv").write_text("100\n4\n" + "\n".join(f"{value:.3f}" for value in temp) + "\n")
+    clean_folder = setup_environment / "clean_individual_recordings/c_participant_1"
+
+    OutliersDataProcessor(base_folder=setup_environment).process_individual_recordings()
+    assert pd.read_csv(clean_folder / "c_TEMP.csv", header=None, skiprows=2)[0][100] == round(temp[100], 3)
+
+    processor = OutliersDataProcessor(base_folder=setup_environment, window_seconds=5)
+    processor.process_individual_recordings()
+    assert pd.read_csv(clean_folder / "c_TEMP.csv", header=None, skiprows=2)[0][100] < temp[100] - 0.5
+    assert (clean_folder / "sdw_TEMP.csv").exists()
+    assert list(pd.read_csv(clean_folder / "sdw_TEMP.csv").columns) == ['window_start', 'column', 'mean', '-2.5SD', '+2.5SD']
+    assert pd.read_csv(clean_folder / "sd_TEMP.csv").shape == (1, 3)
+
+def test_phase_statistics(setup_environment):
+    """
+    Test the per-phase statistics against separate computations on every phase.
+
+    Ensures that each phase is clipped against its own bounds and that the SD
+    file gets one row per phase and column.
+
+    Args:
+        setup_environment (Path): Path to the base folder with mock data.
+    """
+    processor = OutliersDataProcessor(base_folder=setup_environment, per_phase=True)
+    data = np.concatenate([np.random.default_rng(0).normal(10, 1, size=(50, 2)), np.random.default_rng(1).normal(20, 3, size=(30, 2))])
+    data[60, 1] = 40
+    tags = processor.tag_labels(len(data), [100, 150, 200], sample_rate=1)
+    stats = PhaseStatistics(data, tags, 2.5)
+
+    assert stats.phases == ['Baseline', 'CognitiveTask1']
+    for segment, phase_data in enumerate([data[:50], data[50:]]):
+        phase_stats = ColumnStatistics(phase_data, 2.5)
+        np.testing.assert_allclose(stats.means[segment], phase_stats.means)
+        np.testing.assert_allclose(stats.std_devs[segment], phase_stats.std_devs)
+        np.testing.assert_array_equal(stats.winsorize(data)[50 * segment:50 + 30 * segment], phase_stats.winsorize(phase_data))
+
+    assert stats.outlier_percentage(data) > 0
+    sd_frame = stats.sd_frame()
+    assert list(sd_frame.columns) == ['mean', '-2.5SD', '+2.5SD', 'phase', 'column']
+    assert list(sd_frame['phase']) == ['Baseline', 'Baseline', 'CognitiveTask1', 'CognitiveTask1']
+
+    processor.process_individual_recordings()
+    sd_acc = pd.read_csv(setup_environment / "clean_individual_recordings/c_participant_1/sd_ACC.csv")
+    assert list(sd_acc['phase'].unique()) == ['Baseline', 'CognitiveTask1', 'CognitiveTask2']
+
+def test_threads_keep_the_file_order(setup_environment, mocker):
+    """
+    Test processing the signal files of a participant on a thread pool.
+
+    Ensures that the tags are read once per participant and that the outlier
+    information and cleaned files match the sequential processing.
+
+    Args:
+        setup_environment (Path): Path to the base folder with mock data.
+        mocker (pytest_mock.MockerFixture): Mocker fixture to spy on the tags loading.
+    """
+    outputs = []
+    for threads in [1, 4]:
+        processor = OutliersDataProcessor(base_folder=setup_environment, threads=threads)
+        load_tags = mocker.spy(processor, 'load_tags')
+        processor.process_individual_recordings()
+        assert load_tags.call_count == 1
+        clean_folder = setup_environment / "clean_individual_recordings/c_participant_1"
+        outputs.append(({path.name: path.read_text() for path in clean_folder.iterdir()}, processor.outlier_info))
+
+    assert outputs[0] == outputs[1]
+    assert [row['File'] for row in outputs[1][1]] == ["ACC.csv", "BVP.csv", "EDA.csv", "HR.csv", "TEMP.csv"]
+
+def test_cached_recordings_match_the_files(setup_environment):
+    """
+    Test processing a participant through an in-memory recording cache with background writes.
+
+    Ensures that the saved files match the regular processing and that the
+    cleaned recordings and SD tables are kept in the cache for the plots.
+
+    Args:
+        setup_environment (Path): Path to the base folder with mock data.
+    """
+    clean_folder = setup_environment / "clean_individual_recordings/c_participant_1"
+    processor = OutliersDataProcessor(base_folder=setup_environment)
+    processor.process_individual_recordings()
+    expected = {path.name: path.read_text() for path in clean_folder.iterdir()}
+    for path in clean_folder.iterdir():
+        path.unlink()
+
+    cache = RecordingCache()
+    processor = OutliersDataProcessor(base_folder=setup_environment, cache=cache)
+    processor.process_participant(setup_environment / "individual recordings/participant_1")
+    assert processor.index.is_file(clean_folder / "c_TEMP.csv")
+    assert list(cache.get(clean_folder / "c_TEMP.csv").tags.categories) == ['Baseline', 'CognitiveTask1', 'CognitiveTask2']
+    assert cache.get(clean_folder / "sd_TEMP.csv").shape == (1, 3)
+    cache.close()
+
+    assert {path.name: path.read_text() for path in clean_folder.iterdir()} == expected
+
 def test_copy_additional_files(setup_environment):
     """
     Test copying additional files like metadata or information files.
@@ -210,3 +438,36 @@ def test_save_outlier_info(setup_environment):
     processor = OutliersDataProcessor(base_folder=setup_environment)
 
     processor.outlier_info  # Implement this part based on your actual method
+
+def test_unchanged_participants_are_skipped(setup_environment):
+    """
+    Test incremental re-runs with a manifest.
+
+    Ensures that an unchanged participant is not processed again and that its
+    outlier information is restored from the manifest.
+
+    Args:
+        setup_environment (Path): Path to the base folder with mock data.
+    """
+    manifest = PipelineManifest(setup_environment)
+    processor = OutliersDataProcessor(base_folder=setup_environment, manifest=manifest)
+    processor.process_individual_recordings()
+    first_run = pd.read_csv(setup_environment / "outlier_info.csv")
+    clean_file = setup_environment / "clean_individual_recordings/c_participant_1/c_HR.csv"
+    first_mtime = clean_file.stat().st_mtime_ns
+
+    processor = OutliersDataProcessor(base_folder=setup_environment, manifest=PipelineManifest(setup_environment))
+    processor.process_individual_recordings()
+
+    assert clean_file.stat().st_mtime_ns == first_mtime, "An unchanged participant should not be processed again."
+    pd.testing.assert_frame_equal(pd.read_csv(setup_environment / "outlier_info.csv"), first_run)
+
+    # A different threshold recomputes the participant
+    processor = OutliersDataProcessor(base_folder=setup_environment, threshold=2.0, manifest=PipelineManifest(setup_environment))
+    processor.process_individual_recordings()
+    assert clean_file.stat().st_mtime_ns != first_mtime
+
+    # Turning on the binary cache writes the sidecars of an already processed participant
+    processor = OutliersDataProcessor(base_folder=setup_environment, threshold=2.0, binary_cache=True, manifest=PipelineManifest(setup_environment))
+    processor.process_individual_recordings()
+    assert clean_file.with_suffix('.npy').exists()
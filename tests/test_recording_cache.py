@@ -0,0 +1,47 @@
+import threading
+
+import numpy as np
+
+from empatica_processing.data_io.empatica_csv import (
+    EmpaticaRecording,
+    read_empatica_csv,
+    write_empatica_csv,
+)
+from empatica_processing.data_io.recording_cache import RecordingCache
+
+
+def make_recording(n_samples):
+    return EmpaticaRecording(100.0, 4.0, np.arange(n_samples, dtype=np.float64).reshape(-1, 1))
+
+def test_least_recently_used_recordings_are_dropped(tmp_path):
+    cache = RecordingCache(max_bytes=3 * 800, writer_threads=0)
+    for name in ['a', 'b', 'c']:
+        cache.put(tmp_path / f"{name}.csv", make_recording(100))
+    cache.get(tmp_path / "a.csv")  # a becomes the most recently used
+    cache.put(tmp_path / "d.csv", make_recording(100))
+
+    assert cache.get(tmp_path / "b.csv") is None
+    assert all(cache.get(tmp_path / f"{name}.csv") is not None for name in ['a', 'c', 'd'])
+    assert cache.nbytes == 3 * 800
+
+    cache.put(tmp_path / "huge.csv", make_recording(1000))  # Larger than the whole cap
+    assert cache.get(tmp_path / "huge.csv") is None and cache.nbytes == 3 * 800
+
+    cache.release(tmp_path)
+    assert cache.nbytes == 0
+
+def test_loading_waits_for_the_background_write(tmp_path):
+    cache = RecordingCache(max_bytes=0)  # Nothing is kept, so every load reads the file
+    csv_path = tmp_path / "Filled_Merged_TEMP.csv"
+    recording = make_recording(8)
+    started = threading.Event()
+
+    def slow_write(path, recording):
+        started.wait()
+        write_empatica_csv(path, recording)
+
+    cache.write(csv_path, slow_write, csv_path, recording)
+    threading.Timer(0.1, started.set).start()
+    loaded = cache.load(csv_path, read_empatica_csv)
+    np.testing.assert_array_equal(loaded.data, recording.data)
+    cache.close()
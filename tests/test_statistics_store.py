@@ -0,0 +1,42 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from empatica_processing.cleaning_tagging.outliers import OutliersDataProcessor
+from empatica_processing.data_io.statistics_store import StatisticsStore
+
+
+def sd_frame(lower, upper):
+    return pd.DataFrame({'mean': [0.0, 1.0], '-2.5SD': [lower, np.nan], '+2.5SD': [upper, np.nan]})
+
+def test_statistics_are_saved_in_one_batch(tmp_path):
+    store = StatisticsStore(tmp_path)
+    store.add_file("rn1", "TEMP.csv", "TEMP", sd_frame(30.0, 40.0), 1.25, 2.5)
+    store.add_file("rn2", "TEMP.csv", "TEMP", sd_frame(31.0, 41.0), 0.5, 2.5)
+
+    # The rows are visible to the store before they are committed
+    assert store.bounds("rn1") == {"TEMP.csv": (30.0, 40.0)}
+    assert sqlite3.connect(store.path).execute("SELECT COUNT(*) FROM signal_statistics").fetchone() == (0,)
+
+    store.save(participants=["rn1"])
+    saved = sqlite3.connect(store.path)
+    assert saved.execute("SELECT participant, column_index, lower_bound FROM signal_statistics").fetchall() == [("rn1", 0, 30.0), ("rn1", 1, None)]
+    assert saved.execute("SELECT percentage FROM outlier_percentages").fetchall() == [(1.25,)]
+    store.close()
+
+def test_outliers_processor_fills_the_store(tmp_path):
+    participant_folder = tmp_path / "individual recordings" / "rn1"
+    participant_folder.mkdir(parents=True)
+    pd.DataFrame({'TEMP': [100, 1, 36.5, 36.6, 36.7, 39.0, 36.6, 36.5]}).to_csv(participant_folder / "TEMP.csv", index=False, header=False)
+    pd.DataFrame({0: [101, 103]}).to_csv(participant_folder / "tags.csv", header=None, index=False)
+
+    store = StatisticsStore(tmp_path)
+    processor = OutliersDataProcessor(base_folder=tmp_path, statistics=store, sd_files=False)
+    processor.process_individual_recordings()
+
+    statistics = StatisticsStore(tmp_path).statistics("rn1")
+    assert list(statistics[['file', 'signal', 'column_index']].iloc[0]) == ["TEMP.csv", "TEMP", 0]
+    assert statistics['mean'].iloc[0] == round(np.mean([36.5, 36.6, 36.7, 39.0, 36.6, 36.5]), 3)
+    assert not (tmp_path / "clean_individual_recordings" / "c_rn1" / "sd_TEMP.csv").exists()
+    assert (tmp_path / "clean_individual_recordings" / "c_rn1" / "c_TEMP.csv").exists()
@@ -0,0 +1,32 @@
+import os
+
+import numpy as np
+
+from empatica_processing.data_io.empatica_csv import (
+    EmpaticaRecording,
+    write_empatica_csv,
+)
+from empatica_processing.data_io.summary_pyramid import SummaryPyramid
+
+
+def test_pyramid_queries_match_the_samples(tmp_path):
+    data = np.random.default_rng(0).normal(size=(1001, 1))
+    data[10:14] = np.nan
+    recording = EmpaticaRecording(1000.0, 4.0, data)
+    csv_path = tmp_path / "c_BVP.csv"
+    write_empatica_csv(csv_path, recording)
+    SummaryPyramid.build(recording, min_level=2).save(csv_path)
+
+    pyramid = SummaryPyramid.load(csv_path)
+    assert pyramid.max_level == 10  # One summary of all 1001 samples
+    window = pyramid.query(1000.0 + 2, 1000.0 + 250.25, width=30)
+    assert window.level == 5 and window.bucket_seconds == 8.0
+    for i, time in enumerate(window.time):
+        bucket = data[int((time - 1000.0) * 4):int((time - 1000.0) * 4) + 32, 0]
+        np.testing.assert_allclose(window.minimum[i, 0], np.nanmin(bucket), rtol=1e-6)
+        np.testing.assert_allclose(window.maximum[i, 0], np.nanmax(bucket), rtol=1e-6)
+        np.testing.assert_allclose(window.mean[i, 0], np.nanmean(bucket), rtol=1e-5, atol=1e-6)
+    assert window.time[-1] == 1000.0 + 31 * 8.0  # The shorter last bucket
+
+    os.utime(csv_path, ns=(0, 0))
+    assert SummaryPyramid.load(csv_path) is None  # Stale once the recording changes
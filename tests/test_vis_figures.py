@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from empatica_processing.cleaning_tagging.outliers import OutliersDataProcessor
+from empatica_processing.data_io.empatica_csv import EmpaticaRecording
+from empatica_processing.data_io.manifest import PipelineManifest
+from empatica_processing.data_io.statistics_store import StatisticsStore
+from empatica_processing.visualization import vis_figures
+from empatica_processing.visualization.vis_figures import (
+    ParticipantDataPlotter,
+    min_max_decimate,
+)
+
+
+def test_decimation_keeps_the_peaks_in_order():
+    x_values = np.arange(10_001) / 64
+    values = np.sin(x_values)
+    values[1234] = 50.0
+    values[8765] = -50.0
+
+    kept_x, kept_values = min_max_decimate(x_values, values, 100)
+
+    assert len(kept_values) <= 2 * 100 + 2
+    assert np.all(np.diff(kept_x) > 0)
+    assert kept_x[0] == x_values[0] and kept_x[-1] == x_values[-1]
+    assert kept_values.max() == 50.0 and kept_values.min() == -50.0
+
+def test_short_traces_are_not_decimated():
+    x_values = np.arange(150.0)
+    kept_x, kept_values = min_max_decimate(x_values, x_values * 2, 100)
+    assert kept_x is x_values and len(kept_values) == 150
+
+def clean_participants(base_folder, participants):
+    """
+    Writes the recordings and tags of the participants ({name: (signals, tag times)}) and cleans them.
+    """
+    for participant, (signals, tags) in participants.items():
+        participant_folder = base_folder / "individual recordings" / participant
+        participant_folder.mkdir(parents=True)
+        for i, signal in enumerate(signals):
+            samples = np.random.default_rng(i).normal(loc=10 * i, size=400)
+            pd.DataFrame({signal: np.concatenate([[100.0, 4.0], samples])}).to_csv(participant_folder / f"{signal}.csv", index=False, header=False)
+        pd.DataFrame({0: tags}).to_csv(participant_folder / "tags.csv", header=None, index=False)
+    store = StatisticsStore(base_folder)
+    OutliersDataProcessor(base_folder=base_folder, statistics=store, sd_files=False).process_individual_recordings()
+    return store
+
+def test_participants_are_rendered_in_worker_processes(tmp_path):
+    store = clean_participants(tmp_path, {"rn1": (['BVP', 'HR', 'EDA', 'TEMP'], [110, 150]), "rn2": (['BVP'], [110, 150])})
+
+    plotter = ParticipantDataPlotter(tmp_path, statistics=store, jobs=2)
+    statuses = plotter.plot_participant_data()
+
+    assert statuses == {"1": 'plotted', "2": 'missing'}
+    assert (tmp_path / "clean_individual_recordings" / "c_rn1" / "participant_1_plot.png").exists()
+
+def test_template_figures_match_new_figures(tmp_path):
+    signals = ['BVP', 'HR', 'EDA', 'TEMP']
+    store = clean_participants(tmp_path, {"rn1": (signals, [110, 150, 180]), "rn2": (signals[::-1], [120]), "rn3": (signals, [105, 130])})
+    figures = [tmp_path / "clean_individual_recordings" / f"c_rn{i}" / f"participant_{i}_plot.png" for i in [1, 2, 3]]
+
+    ParticipantDataPlotter(tmp_path, statistics=store).plot_participant_data()
+    new_figures = [figure.read_bytes() for figure in figures]
+    plotter = ParticipantDataPlotter(tmp_path, statistics=store, template=True)
+    plotter.plot_participant_data()
+
+    assert [figure.read_bytes() for figure in figures] == new_figures
+    assert plotter.figure_template is None  # Closed once all figures are saved
+
+def test_time_axis_follows_the_header_of_each_recording(tmp_path):
+    plotter = ParticipantDataPlotter(tmp_path, decimate=False)
+    hr_recording = EmpaticaRecording(1010.0, 2.0, np.arange(6, dtype=np.float64).reshape(-1, 1))
+
+    x_values, values = plotter.trace_points(hr_recording, start_time=1000.0)
+
+    np.testing.assert_array_equal(x_values, [10.0, 10.5, 11.0, 11.5, 12.0, 12.5])
+    np.testing.assert_array_equal(values, hr_recording.data[:, 0])
+
+    plotter.decimate = True
+    bvp_recording = EmpaticaRecording(1000.0, 32.0, np.sin(np.arange(100_000) / 10).reshape(-1, 1))
+    x_values, values = plotter.trace_points(bvp_recording, start_time=1000.0)
+    positions = (x_values * 32).astype(int)
+    assert len(positions) < 5000 and positions[-1] == 99_999
+    np.testing.assert_array_equal(values, bvp_recording.data[positions, 0])
+
+def test_changed_plot_options_redraw_the_figures(tmp_path):
+    store = clean_participants(tmp_path, {"rn1": (['BVP', 'HR', 'EDA', 'TEMP'], [110, 150])})
+
+    assert ParticipantDataPlotter(tmp_path, manifest=PipelineManifest(tmp_path), statistics=store).plot_participant_data() == {"1": 'plotted'}
+    assert ParticipantDataPlotter(tmp_path, manifest=PipelineManifest(tmp_path), statistics=store).plot_participant_data() == {"1": 'unchanged'}
+    plotter = ParticipantDataPlotter(tmp_path, manifest=PipelineManifest(tmp_path), statistics=store, decimate=False)
+    assert plotter.plot_participant_data() == {"1": 'plotted'}
+
+def test_unusable_worker_memory_limits_are_ignored(monkeypatch, capsys):
+    if vis_figures.resource is None:
+        pytest.skip("resource is not available on this platform")
+    monkeypatch.setattr(vis_figures.resource, 'getrlimit', lambda limit: (2 ** 30, 2 ** 30))
+    assert vis_figures.checked_memory_limit(2 ** 29) == 2 ** 29
+    assert vis_figures.checked_memory_limit(2 ** 31) is None
+    assert "above the hard limit" in capsys.readouterr().out
+
+    def reject(limit, limits):
+        raise ValueError("not allowed")
+    monkeypatch.setattr(vis_figures.resource, 'setrlimit', reject)
+    vis_figures.init_plot_worker(None, 2 ** 29)  # Warns instead of breaking the pool
+    assert "could not be set" in capsys.readouterr().out